@@ -1,8 +1,12 @@
+import time
+
 import app_logic
 import config
 import lab_parser
+import metrics
 import uvicorn
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
 
 # Init global variables
 config.init_globals()
@@ -10,6 +14,22 @@ config.init_globals()
 app = FastAPI()
 
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Use the route template (eg. /cmd_status) instead of the raw path to keep the number of labels small
+        route = request.scope.get("route")
+        endpoint = route.path if route is not None else "unmatched"
+        metrics.REQUESTS.inc(method=request.method, endpoint=endpoint, status=status)
+        metrics.REQUEST_DURATION.observe(time.perf_counter() - start, method=request.method, endpoint=endpoint)
+
+
 @app.post("/change_lab")
 def post_change_lab(request: config.ChangeLabRequest):
     return app_logic.change_lab(request)
@@ -120,6 +140,11 @@ def post_execute(request: config.ExecuteRequest):
     return app_logic.execute(request)
 
 
+@app.post("/execute_batch")
+def post_execute_batch(request: config.ExecuteBatchRequest):
+    return app_logic.execute_batch(request)
+
+
 @app.post("/reset_bandwidth")
 def post_reset_bandwidth(request: config.RemoveChangeRequest):
     return app_logic.reset_bandwidth(request)
@@ -140,6 +165,31 @@ def post_reset_link(request: config.RemoveChangeRequest):
     return app_logic.reset_link(request)
 
 
+@app.post("/reset_links")
+def post_reset_links(request: config.ResetLinksRequest):
+    return app_logic.reset_links(request)
+
+
+@app.post("/link_down")
+def post_link_down(request: config.LinkStateRequest):
+    return app_logic.link_down(request)
+
+
+@app.post("/link_up")
+def post_link_up(request: config.LinkStateRequest):
+    return app_logic.link_up(request)
+
+
+@app.post("/loss_burst")
+def post_loss_burst(request: config.LossBurstRequest):
+    return app_logic.loss_burst(request)
+
+
+@app.post("/delay_spike")
+def post_delay_spike(request: config.DelaySpikeRequest):
+    return app_logic.delay_spike(request)
+
+
 
 @app.get("/link_state")
 def get_check_link_state(src: str, dst: str):
@@ -166,6 +216,21 @@ def get_output(cmd_id: str):
     return app_logic.get_output(cmd_id)
 
 
+@app.get("/routing_state")
+def get_routing_state(max_age: float = None):
+    return app_logic.get_routing_state(max_age)
+
+
+@app.get("/path")
+def get_path(src: str, dst: str, dst_type: str = "router", max_age: float = None):
+    return app_logic.get_path(src, dst, dst_type, max_age)
+
+
+@app.get("/all_paths")
+def get_all_paths(dst_type: str = "router", max_age: float = None):
+    return app_logic.get_all_paths(dst_type, max_age)
+
+
 @app.get("/snmp_param")
 def get_snmp_param(host: str, oid: str = ""):
     return app_logic.snmp_param(host, oid)
@@ -191,6 +256,16 @@ def get_links():
     links = [{"src": list(link)[0], "dst": list(link)[1], "details": details} for link, details in config.LAB_LINKS.items()]
     return {"links": links}
 
+
+@app.get("/lab")
+def get_lab():
+    return {"lab": config.CURR_LAB, "prefix": config.LAB_PREFIX, "routers": config.LAB_NAMES, "links": len(config.LAB_LINKS)}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/events")
 def get_events():
     return config.EVENT_DATABASE
@@ -1,21 +1,30 @@
+import functools
 import io
 import ipaddress
 import json
 import os
 import random  # alternatively use uuid, but thats one more library and its probably overkill
+import shlex
 import string
 import tarfile
 import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from random import randrange
 
 import config
 import docker
 import lab_parser
+import metrics
+import requests
+import routing
 from fastapi import FastAPI, HTTPException, Query
 
-client = docker.from_env()
+client = docker.from_env(timeout=config.DOCKER_TIMEOUT)
+# Ensures that concurrent requests for the routing state only collect it once
+routing_state_lock = threading.Lock()
 
 
 class NodeID:
@@ -27,6 +36,198 @@ class NodeID:
         self.container = supplied_container
 
 
+def docker_api_call(call: str, function, *args, **kwargs):
+    """Call a function of the docker SDK and count the call (and errors) in the metrics.
+
+    Args:
+        call: Name of the call for the metrics
+        function: docker SDK function to call
+        *args, **kwargs: Arguments for `function`
+
+    Returns:
+        The return value of `function`
+    """
+    metrics.DOCKER_API_CALLS.inc(call=call)
+    try:
+        return function(*args, **kwargs)
+    except Exception:
+        metrics.DOCKER_API_ERRORS.inc(call=call)
+        raise
+
+
+def get_container(containername: str):
+    """Get the docker container object for `containername`.
+
+    Raises:
+        ContainerNotFoundError: If the container doesn't exist
+    """
+    try:
+        return docker_api_call("containers.get", client.containers.get, containername)
+    except docker.errors.NotFound as e:  # type: ignore
+        raise ContainerNotFoundError(f"Container not found: {containername}") from e
+
+
+class ExecError(Exception):
+    """Base class of the errors raised by the exec layer, `status_code` is used for the HTTP response."""
+
+    status_code = 500
+
+    def __init__(self, detail):
+        super().__init__(detail)
+        self.detail = detail
+
+
+class CommandFailedError(ExecError):
+    """A command executed in a container returned a non-zero exit code."""
+
+    status_code = 500
+
+
+class CommandTimeoutError(ExecError):
+    """A command executed in a container did not finish before its deadline."""
+
+    status_code = 504
+
+
+class ContainerNotFoundError(ExecError):
+    """The container does not exist (e.g. the lab is not running)."""
+
+    status_code = 404
+
+
+class DockerUnavailableError(ExecError):
+    """The docker daemon could not be reached or kept failing."""
+
+    status_code = 503
+
+
+def handle_errors(function):
+    """Decorator translating the exceptions raised by request logic to HTTPExceptions.
+
+    HTTPExceptions are passed on unchanged, so request logic calling other request
+    logic keeps the original status code.
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        try:
+            return function(*args, **kwargs)
+        except HTTPException:
+            raise
+        except ExecError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)  # noqa: B904
+        except docker.errors.NotFound as e:  # type: ignore
+            raise HTTPException(status_code=404, detail="Container not found: " + str(e))  # noqa: B904
+        except docker.errors.APIError as e:  # type: ignore
+            raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
+
+    return wrapper
+
+
+# Exit codes of `timeout` when the deadline is hit (124) or the command had to be killed (137, 143)
+TIMEOUT_EXIT_CODES = (124, 137, 143)
+
+
+def is_transient_docker_error(error: Exception):
+    """Whether a failed docker call did not reach the container and can safely be retried."""
+    if isinstance(error, requests.exceptions.ConnectionError) and not isinstance(error, requests.exceptions.ReadTimeout):
+        return True
+    # 5xx errors of exec_create (e.g. daemon busy), not those caused by the request itself
+    return isinstance(error, docker.errors.APIError) and not isinstance(error, docker.errors.NotFound) and error.is_server_error()  # type: ignore
+
+
+def exec_in_container(container, cmd, timeout: float = None, retries: int = None, check: bool = False, **kwargs):
+    """Execute a command in a container with `exec_run`.
+
+    The command is wrapped in `timeout`, so it is killed inside the container once
+    its deadline is over. Calls that fail before reaching the container are retried
+    with exponential backoff. Latency, failures and `config.EXEC_HOOKS` are recorded
+    for every call.
+
+    Args:
+        container: docker container object
+        cmd: Command to execute (string or list)
+        timeout: Deadline in seconds, defaults to config.EXEC_TIMEOUT, 0 disables it
+        retries: Number of retries on transient docker errors, defaults to config.EXEC_RETRIES
+        check: Raise a CommandFailedError if the command returns a non-zero exit code
+        **kwargs: Additional arguments for `exec_run`
+
+    Returns:
+        The result of `exec_run`
+
+    Raises:
+        CommandFailedError: If `check` is set and the command failed
+        CommandTimeoutError: If the command did not finish in time
+        ContainerNotFoundError: If the container doesn't exist
+        DockerUnavailableError: If the docker daemon kept failing
+    """
+    timeout = config.EXEC_TIMEOUT if timeout is None else timeout
+    retries = config.EXEC_RETRIES if retries is None else retries
+    run_cmd = cmd
+    # Detached commands are allowed to run for longer
+    if timeout and not kwargs.get("detach"):
+        if isinstance(cmd, str):
+            run_cmd = f"timeout -k 1 {timeout} {cmd}"
+        else:
+            run_cmd = ["timeout", "-k", "1", str(timeout)] + list(cmd)
+
+    start = time.perf_counter()
+    exec_result = None
+    try:
+        for attempt in range(retries + 1):
+            try:
+                exec_result = docker_api_call("exec_run", container.exec_run, run_cmd, **kwargs)
+                break
+            except docker.errors.NotFound as e:  # type: ignore
+                raise ContainerNotFoundError(f"Container not found: {container.name}") from e
+            except requests.exceptions.ReadTimeout as e:
+                raise CommandTimeoutError({"container": container.name, "cmd": cmd, "timeout": timeout}) from e
+            except Exception as e:
+                if not is_transient_docker_error(e):
+                    raise
+                if attempt == retries:
+                    raise DockerUnavailableError(f"Docker: {e}") from e
+                time.sleep(config.EXEC_RETRY_BACKOFF * 2**attempt)
+    finally:
+        duration = time.perf_counter() - start
+        for hook in config.EXEC_HOOKS:
+            hook(container.name, cmd, duration, exec_result)
+
+    if timeout and exec_result.exit_code in TIMEOUT_EXIT_CODES and duration >= timeout:
+        raise CommandTimeoutError(
+            {
+                "container": container.name,
+                "cmd": cmd,
+                "timeout": timeout,
+                "output": exec_result.output.decode("utf-8") if isinstance(exec_result.output, bytes) else "",
+            }
+        )
+    # Detached execs don't have an exit code
+    if check and exec_result.exit_code not in (0, None):
+        raise CommandFailedError(
+            {
+                "container": container.name,
+                "cmd": cmd,
+                "output": exec_result.output.decode("utf-8"),
+                "exit_code": exec_result.exit_code,
+            }
+        )
+    return exec_result
+
+
+def record_exec_metrics(container_name: str, cmd, duration: float, exec_result):
+    """Exec hook recording the latency and failures of commands in the metrics."""
+    metrics.CONTAINER_EXEC_DURATION.observe(duration, container=container_name)
+    # exec_result is None if the exec itself failed, detached execs don't have an exit code
+    if exec_result is None or exec_result.exit_code not in (0, None):
+        metrics.CONTAINER_EXEC_FAILURES.inc(container=container_name)
+
+
+config.EXEC_HOOKS.append(record_exec_metrics)
+
+
 def calculate_endtime(duration):
     """Calculate the end time by adding duration seconds to the current time.
 
@@ -65,7 +266,7 @@ def validate_and_get_NodeID(node: str, nodetype: str):
         raise HTTPException(status_code=404, detail=f"Invalid node: {node}")
 
     node_container_name = f"{config.LAB_PREFIX}_{node}{nodetype}"
-    node_container = client.containers.get(node_container_name)
+    node_container = get_container(node_container_name)
 
     node_obj = NodeID(node, node_container_name, node_container)
     return node_obj
@@ -172,6 +373,22 @@ def parse_link_parameters(cmd_output: str, src: NodeID, dst: NodeID) -> dict:
     return result
 
 
+def parse_time_ms(time_str: str) -> float:
+    """Convert a tc time (e.g. "5ms", "2.5ms", "1s", "500us") to milliseconds.
+
+    Args:
+        time_str: Time as printed/accepted by tc, a plain number is interpreted as microseconds like tc does
+
+    Returns:
+        float: Time in milliseconds
+    """
+    time_str = str(time_str).strip()
+    for unit, factor in (("usec", 0.001), ("msec", 1), ("sec", 1000), ("us", 0.001), ("ms", 1), ("s", 1000)):
+        if time_str.endswith(unit):
+            return float(time_str[: -len(unit)]) * factor
+    return float(time_str) * 0.001
+
+
 def save_current_config(configuration, node: str):
     """Save the current configuration to a timestamped file.
 
@@ -216,7 +433,7 @@ def get_interface_from_to(src: NodeID, dst: NodeID):
     # print(command)
     # print(src.containername)
 
-    exec_result = src.container.exec_run(command)
+    exec_result = exec_in_container(src.container, command)
     result = exec_result.output.decode("utf-8").split()
     print(result)
     iface = ""
@@ -319,7 +536,8 @@ def apply_frr_config_at(node: NodeID, frr_config: str):
     # Therefore we have to resort to some ugly hack like this
     cleaned_config = clean_frr_config(frr_config)
     command = f"sh -c 'echo \"{cleaned_config}\" > /etc/frr/frr_new.conf  && /usr/lib/frr/frr-reload.py --reload /etc/frr/frr_new.conf && rm /etc/frr/frr_new.conf'"
-    result = node.container.exec_run(command, tty=True)
+    # frr-reload.py diffs the whole config, which takes a while on large routers
+    result = exec_in_container(node.container, command, timeout=config.FRR_RELOAD_TIMEOUT, tty=True)
     if result[0] != 0:
         raise Exception(f"Could not apply config in {node.name}, detail: {result[1]}")
     # print(f"File contents written to {container_file_path} in container {container_id}")
@@ -342,17 +560,8 @@ def get_IPS(nodetype: str):
         # host containers dont have dig installed, so we query on the router.
         # as a sidenote: we could also directly check the interface IPs using docker exec
         # node = validate_and_get_NodeID(device, "router")
-        result = requestnode.container.exec_run(f"dig +short {dns_name}")
+        result = exec_in_container(requestnode.container, f"dig +short {dns_name}", check=True)
         ip_list = result.output.decode("utf-8").splitlines()
-        if result.exit_code != 0:
-            raise Exception(
-                {
-                    "device": config.LAB_NAMES[4],
-                    "cmd": f"dig +short {dns_name}",
-                    "output": result.output.decode("utf-8"),
-                    "exit_code": result.exit_code,
-                }
-            )
         # NOTE: In case a device has its interfaces currently down, this way of retrieving the IP will not work
         if ip_list:
             # print(f"IPs for {device}: {ip_list}")
@@ -372,7 +581,7 @@ def get_IPS(nodetype: str):
 
 
 def extract_and_process_logs(container, archive_path, local_file_path):
-    stream, _ = container.get_archive(archive_path)
+    stream, _ = docker_api_call("get_archive", container.get_archive, archive_path)
     with tempfile.TemporaryFile() as temp_file:
         for chunk in stream:
             temp_file.write(chunk)
@@ -385,6 +594,188 @@ def extract_and_process_logs(container, archive_path, local_file_path):
             # Process the extracted file as needed
 
 
+def run_in_parallel(function, items):
+    """Call `function` on every item concurrently.
+
+    Args:
+        function: Function taking a single item
+        items: Iterable of items
+
+    Returns:
+        list: Results in the same order as `items`
+    """
+    items = list(items)
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=len(items)) as pool:
+        return list(pool.map(function, items))
+
+
+FRR_JSON_SEPARATOR = "__FRR_JSON_SEPARATOR__"
+
+
+def get_frr_json(node: NodeID, vtysh_cmds: list):
+    """Run several `... json` vtysh commands on a router and parse their outputs.
+
+    All commands are run within a single docker exec to save round trips.
+
+    Args:
+        node: NodeID of the router
+        vtysh_cmds: List of vtysh commands, each must end with `json`
+
+    Returns:
+        list: Parsed output per command, empty dict if FRR didn't print valid JSON
+        (e.g. because the daemon is not running)
+    """
+    script = f"; echo {FRR_JSON_SEPARATOR}; ".join(f'vtysh -c "{vtysh_cmd}"' for vtysh_cmd in vtysh_cmds)
+    cmd = f"/bin/bash -c '{script}'"
+    exec_result = exec_in_container(node.container, cmd, check=True)
+    outputs = []
+    for output in exec_result.output.decode("utf-8").split(FRR_JSON_SEPARATOR):
+        try:
+            outputs.append(json.loads(output))
+        except json.JSONDecodeError:
+            outputs.append({})
+    return outputs
+
+
+def get_adjacency_state(node: NodeID):
+    """Get the OSPF neighbor and BGP session state of a router.
+
+    Only the fields that change during convergence are kept (neighbor states and
+    received prefix counts), timers and counters are dropped so that two calls
+    on a converged router return the same result.
+
+    Args:
+        node: NodeID of the router
+
+    Returns:
+        dict: {"ospf": {neighbor@iface: state}, "bgp": {afi peer: (state, prefixes)}}
+    """
+    ospf, bgp = get_frr_json(node, ["show ip ospf neighbor json", "show bgp summary json"])
+
+    ospf_state = {}
+    for neighbor_id, entries in ospf.get("neighbors", {}).items():
+        # Older FRR versions return a single dict instead of a list per neighbor
+        if isinstance(entries, dict):
+            entries = [entries]
+        for entry in entries:
+            iface = entry.get("ifaceName", "")
+            ospf_state[f"{neighbor_id}@{iface}"] = entry.get("nbrState", entry.get("state"))
+
+    bgp_state = {}
+    for afi, summary in bgp.items():
+        if not isinstance(summary, dict):
+            continue
+        for peer, peer_data in summary.get("peers", {}).items():
+            bgp_state[f"{afi} {peer}"] = (
+                peer_data.get("state"),
+                peer_data.get("pfxRcd", peer_data.get("prefixReceivedCount")),
+            )
+
+    return {"ospf": ospf_state, "bgp": bgp_state}
+
+
+def get_lab_adjacency_state(routers: list):
+    """Get the adjacency state of all given routers concurrently."""
+    return dict(zip([router.name for router in routers], run_in_parallel(get_adjacency_state, routers)))
+
+
+def measure_convergence(routers: list, baseline: dict, start: float, timeout: float, poll_interval: float, stable_polls: int):
+    """Poll FRR on all routers until the routing state stops changing.
+
+    The routing state counts as converged once it differs from `baseline` and
+    `stable_polls` consecutive polls returned the same state. Polls before the
+    first change don't count, as OSPF and BGP may take seconds to react (e.g.
+    to form adjacencies after a link came up), so if nothing changes before
+    `timeout` the state is reported as not converged. The convergence time is
+    the time between `start` and the poll that first observed the final state.
+
+    Args:
+        routers: List of router NodeIDs to poll
+        baseline: Adjacency state before the change, to detect changes observed in the first poll
+        start: time.monotonic() timestamp of the change
+        timeout: Maximum number of seconds to wait for convergence
+        poll_interval: Seconds to wait between two polls
+        stable_polls: Number of unchanged polls required to consider the state converged
+
+    Returns:
+        dict: Convergence time in seconds (None if not converged), number of polls and changed routers
+    """
+    previous = baseline
+    last_change = None
+    stable = 0
+    polls = 0
+    while True:
+        state = get_lab_adjacency_state(routers)
+        polls += 1
+        now = time.monotonic()
+        if state != previous:
+            previous = state
+            last_change = now
+            stable = 0
+        elif last_change is not None:
+            stable += 1
+        if stable >= stable_polls:
+            break
+        if now - start >= timeout:
+            return {"converged": False, "convergence_time": None, "polls": polls}
+        time.sleep(poll_interval)
+
+    changed = [name for name in state if state[name] != baseline.get(name)]
+    return {
+        "converged": True,
+        "convergence_time": last_change - start,
+        "polls": polls,
+        "changed_routers": changed,
+    }
+
+
+def collect_routing_state(node: NodeID):
+    """Collect the FIB, OSPF neighbors, BGP paths and interface addresses of a router.
+
+    Args:
+        node: NodeID of the router
+
+    Returns:
+        dict: Normalized routing state, see routing.py
+    """
+    routes, ospf, bgp, interfaces = get_frr_json(
+        node,
+        ["show ip route json", "show ip ospf neighbor json", "show bgp ipv4 json", "show interface json"],
+    )
+    return {
+        "routes": routing.normalize_routes(routes),
+        "ospf_neighbors": routing.normalize_ospf_neighbors(ospf),
+        "bgp": routing.normalize_bgp_routes(bgp),
+        "interfaces": routing.normalize_interfaces(interfaces),
+    }
+
+
+def get_destination_ip(dst: str, dst_type: str):
+    """Get the address to resolve paths towards.
+
+    Args:
+        dst: Node name or IP address
+        dst_type: "router" or "host", only used if `dst` is a node name
+
+    Returns:
+        str: IP address
+    """
+    if is_valid_ip(dst):
+        return dst
+    if dst not in config.LAB_NAMES:
+        raise HTTPException(status_code=404, detail=f"Invalid node: {dst}")
+    if dst_type == "host":
+        # Getting the host IPs requires a DNS request per host, so only do it once
+        if dst not in config.HOST_IPS:
+            config.HOST_IPS.update(get_IPS("host"))
+        return config.HOST_IPS[dst]
+    elif dst_type == "router":
+        return config.IPS[dst]
+    raise Exception(f"No such nodetype: {dst_type}")
+
+
 # Begin actual request logic
 
 
@@ -408,6 +799,8 @@ def change_lab(request: config.ChangeLabRequest):
         )
         config.CURR_LAB = request.lab_name
         (config.LAB_PREFIX, config.LAB_NAMES) = (request.selected_AS, new_LAB_NAMES)
+        config.HOST_IPS = {}
+        config.ROUTING_STATE["state"] = None
         # use DNS if available
         if config.CURR_LAB == "demo":
             config.IPS = get_IPS("router")
@@ -422,6 +815,7 @@ def change_lab(request: config.ChangeLabRequest):
         raise HTTPException(status_code=404, detail="Requested lab not found")  # noqa: B904
 
 
+@handle_errors
 def add_loss(request: config.AddLossRequest):
     """Add packet loss to a network link.
 
@@ -434,46 +828,30 @@ def add_loss(request: config.AddLossRequest):
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        # Validate and get identifiers
-        src, dst = validate_and_get_NodeIDs(request.src, request.dst)
-        current_params = check_link_state(src.name, dst.name)
-
-        # TODO: error handing
-        loss_rate = request.loss_rate
-        interface = get_interface_from_to(src, dst)
-
-        cmd = f"""/bin/bash -c 'tc qdisc del dev {interface} root ; \
-        tc qdisc add dev {interface} root handle 1:0 netem delay {current_params["delay"]} loss {loss_rate}% ; \n \
-        tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {current_params["bandwidth"]} burst {current_params["burst"]} latency {current_params["buffer"]}'"""
-
-        # Execute the command in the container
-        exec_result = src.container.exec_run(cmd)
-
-        if exec_result.exit_code != 0:
-            raise Exception(
-                {   
-                    "node": src.name,
-                    "cmd": cmd,
-                    "output": exec_result.output.decode("utf-8"),
-                    "exit_code": exec_result.exit_code,
-                }
-            )
-        # Return the output of the command
-        return {
-            "output": exec_result.output.decode("utf-8"),
-            "exit_code": exec_result.exit_code,
-        }
+    # Validate and get identifiers
+    src, dst = validate_and_get_NodeIDs(request.src, request.dst)
+    current_params = check_link_state(src.name, dst.name)
+
+    # TODO: error handing
+    loss_rate = request.loss_rate
+    interface = get_interface_from_to(src, dst)
+
+    cmd = f"""/bin/bash -c 'tc qdisc del dev {interface} root ; \
+    tc qdisc add dev {interface} root handle 1:0 netem delay {current_params["delay"]} loss {loss_rate}% ; \n \
+    tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {current_params["bandwidth"]} burst {current_params["burst"]} latency {current_params["buffer"]}'"""
+
+    # Execute the command in the container
+    exec_result = exec_in_container(src.container, cmd, check=True)
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    # Return the output of the command
+    return {
+        "output": exec_result.output.decode("utf-8"),
+        "exit_code": exec_result.exit_code,
+    }
 
 
 # We could check if there already is loss on the specified link but ultimately it doesnt change the outcome so for now I don't
+@handle_errors
 def rm_loss(request: config.RemoveChangeRequest):
     """Remove packet loss from a network link.
 
@@ -486,43 +864,27 @@ def rm_loss(request: config.RemoveChangeRequest):
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        # Validate and get container names
-        src, dst = validate_and_get_NodeIDs(request.src, request.dst)
-        current_params = check_link_state(src.name, dst.name)
-        interface = get_interface_from_to(src, dst)
-
-        cmd = f"""/bin/bash -c '
-        tc qdisc del dev {interface} root ; \
-        tc qdisc add dev {interface} root handle 1:0 netem delay {current_params["delay"]}\n \
-        tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {current_params["bandwidth"]} burst {current_params["burst"]} latency {current_params["buffer"]}'"""
-
-        # Execute the command in the container
-        exec_result = src.container.exec_run(cmd)
-
-        if exec_result.exit_code != 0:
-            raise Exception(
-                {   
-                    "node": src.name,
-                    "cmd": cmd,
-                    "output": exec_result.output.decode("utf-8"),
-                    "exit_code": exec_result.exit_code,
-                }
-            )
-        # Return the output of the command
-        return {
-            "output": exec_result.output.decode("utf-8"),
-            "exit_code": exec_result.exit_code,
-        }
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    # Validate and get container names
+    src, dst = validate_and_get_NodeIDs(request.src, request.dst)
+    current_params = check_link_state(src.name, dst.name)
+    interface = get_interface_from_to(src, dst)
+
+    cmd = f"""/bin/bash -c '
+    tc qdisc del dev {interface} root ; \
+    tc qdisc add dev {interface} root handle 1:0 netem delay {current_params["delay"]}\n \
+    tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {current_params["bandwidth"]} burst {current_params["burst"]} latency {current_params["buffer"]}'"""
+
+    # Execute the command in the container
+    exec_result = exec_in_container(src.container, cmd, check=True)
+
+    # Return the output of the command
+    return {
+        "output": exec_result.output.decode("utf-8"),
+        "exit_code": exec_result.exit_code,
+    }
 
 
+@handle_errors
 def add_delay(request: config.AddDelayRequest):
     """Add delay to a network link.
 
@@ -535,45 +897,29 @@ def add_delay(request: config.AddDelayRequest):
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        # Validate and get identifiers
-        src, dst = validate_and_get_NodeIDs(request.src, request.dst)
-        current_params = check_link_state(src.name, dst.name)
-
-        # TODO: error handing
-        delay = request.delay
-        # Get the container object
-        interface = get_interface_from_to(src, dst)
-        cmd = f"""/bin/bash -c 'tc qdisc del dev {interface} root ; \
-        tc qdisc add dev {interface} root handle 1:0 netem delay {delay}ms loss {current_params["loss"]} ; \n \
-        tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {current_params["bandwidth"]} burst {current_params["burst"]} latency {current_params["buffer"]}'"""
-
-        # Execute the command in the container
-        exec_result = src.container.exec_run(cmd)
-
-        if exec_result.exit_code != 0:
-            raise Exception(
-                {   
-                    "node": src.name,
-                    "cmd": cmd,
-                    "output": exec_result.output.decode("utf-8"),
-                    "exit_code": exec_result.exit_code,
-                }
-            )
-        # Return the output of the command
-        return {
-            "output": exec_result.output.decode("utf-8"),
-            "exit_code": exec_result.exit_code,
-        }
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    # Validate and get identifiers
+    src, dst = validate_and_get_NodeIDs(request.src, request.dst)
+    current_params = check_link_state(src.name, dst.name)
+
+    # TODO: error handing
+    delay = request.delay
+    # Get the container object
+    interface = get_interface_from_to(src, dst)
+    cmd = f"""/bin/bash -c 'tc qdisc del dev {interface} root ; \
+    tc qdisc add dev {interface} root handle 1:0 netem delay {delay}ms loss {current_params["loss"]} ; \n \
+    tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {current_params["bandwidth"]} burst {current_params["burst"]} latency {current_params["buffer"]}'"""
+
+    # Execute the command in the container
+    exec_result = exec_in_container(src.container, cmd, check=True)
+
+    # Return the output of the command
+    return {
+        "output": exec_result.output.decode("utf-8"),
+        "exit_code": exec_result.exit_code,
+    }
 
 
+@handle_errors
 def rm_delay(request: config.RemoveChangeRequest):
     """Remove delay from a network link.
 
@@ -586,44 +932,28 @@ def rm_delay(request: config.RemoveChangeRequest):
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        # Validate and get container names
-        src, dst = validate_and_get_NodeIDs(request.src, request.dst)
-        current_params = check_link_state(src.name, dst.name)
-
-        # it is set in the network setup and should be parsed from there
-        interface = get_interface_from_to(src, dst)
-        cmd = f"""/bin/bash -c '
-        tc qdisc del dev {interface} root ; \
-        tc qdisc add dev {interface} root handle 1:0 netem loss {current_params["loss"]} delay {config.LAB_LINKS[frozenset({src.name, dst.name})]["delay"]}\n \
-        tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {current_params["bandwidth"]} burst {current_params["burst"]} latency {current_params["buffer"]}'"""
-
-        # Execute the command in the container
-        exec_result = src.container.exec_run(cmd)
-
-        if exec_result.exit_code != 0:
-            raise Exception(
-                {   
-                    "node": src.name,
-                    "cmd": cmd,
-                    "output": exec_result.output.decode("utf-8"),
-                    "exit_code": exec_result.exit_code,
-                }
-            )
-        # Return the output of the command
-        return {
-            "output": exec_result.output.decode("utf-8"),
-            "exit_code": exec_result.exit_code,
-        }
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    # Validate and get container names
+    src, dst = validate_and_get_NodeIDs(request.src, request.dst)
+    current_params = check_link_state(src.name, dst.name)
+
+    # it is set in the network setup and should be parsed from there
+    interface = get_interface_from_to(src, dst)
+    cmd = f"""/bin/bash -c '
+    tc qdisc del dev {interface} root ; \
+    tc qdisc add dev {interface} root handle 1:0 netem loss {current_params["loss"]} delay {config.LAB_LINKS[frozenset({src.name, dst.name})]["delay"]}\n \
+    tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {current_params["bandwidth"]} burst {current_params["burst"]} latency {current_params["buffer"]}'"""
+
+    # Execute the command in the container
+    exec_result = exec_in_container(src.container, cmd, check=True)
+
+    # Return the output of the command
+    return {
+        "output": exec_result.output.decode("utf-8"),
+        "exit_code": exec_result.exit_code,
+    }
 
 
+@handle_errors
 def single_flow(request: config.GenFlowRequest):
     """Generate a single network flow between hosts.
 
@@ -636,53 +966,39 @@ def single_flow(request: config.GenFlowRequest):
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        # Validate and get container names
-        src, dst = validate_and_get_NodeIDs(request.src, request.dst, "host")
-
-        # TODO: error handing
-        bandwidth = request.bandwidth
-        duration = request.duration
-        is_tcp = request.is_tcp
-
-        # Get an id for the caller to refer to the request
-        # use this as filename for the status
-        id = generate_random_id()
-        # Actually do the thing,
-        port = randrange(1024, 65535)
-        udp_str = "-u " if not is_tcp else ""
-        server_cmd = f"iperf3 -D -B {config.IPS[dst.name]} -s -p {port} -1"
-        client_cmd = f"iperf3 -J --logfile {id}.json -c {config.IPS[dst.name]} -t {duration}s -b {bandwidth}k -B {config.IPS[src.name]} -p {port} {udp_str}&"
-        # print(client_cmd)
-
-        exec_result = dst.container.exec_run(server_cmd)
-        if exec_result.exit_code != 0:
-            raise Exception(
-                {
-                    "output": exec_result.output.decode("utf-8"),
-                    "exit_code": exec_result.exit_code,
-                }
-            )
-
-        exec_id = client.api.exec_create(src.containername, client_cmd)
-
-        config.EVENT_DATABASE[id] = {
-            "exec_id": exec_id["Id"],
-            "container": src.containername,
-            "json": True,
-            "endtime": calculate_endtime(duration),
-        }
-        client.api.exec_start(exec_id, detach=True)
-        return {"ID": id}
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    # Validate and get container names
+    src, dst = validate_and_get_NodeIDs(request.src, request.dst, "host")
+
+    # TODO: error handing
+    bandwidth = request.bandwidth
+    duration = request.duration
+    is_tcp = request.is_tcp
+
+    # Get an id for the caller to refer to the request
+    # use this as filename for the status
+    id = generate_random_id()
+    # Actually do the thing,
+    port = randrange(1024, 65535)
+    udp_str = "-u " if not is_tcp else ""
+    server_cmd = f"iperf3 -D -B {config.IPS[dst.name]} -s -p {port} -1"
+    client_cmd = f"iperf3 -J --logfile {id}.json -c {config.IPS[dst.name]} -t {duration}s -b {bandwidth}k -B {config.IPS[src.name]} -p {port} {udp_str}&"
+    # print(client_cmd)
+
+    exec_in_container(dst.container, server_cmd, check=True)
+
+    exec_id = docker_api_call("exec_create", client.api.exec_create, src.containername, client_cmd)
+
+    config.EVENT_DATABASE[id] = {
+        "exec_id": exec_id["Id"],
+        "container": src.containername,
+        "json": True,
+        "endtime": calculate_endtime(duration),
+    }
+    docker_api_call("exec_start", client.api.exec_start, exec_id, detach=True)
+    return {"ID": id}
 
 
+@handle_errors
 def change_ospf_weight(request: config.ChangeOSPFCostRequest):
     """Change OSPF link cost between routers.
 
@@ -695,78 +1011,59 @@ def change_ospf_weight(request: config.ChangeOSPFCostRequest):
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        # Validate and get container names
-        src, dst = validate_and_get_NodeIDs(request.src, request.dst)
-        cost = request.cost
-        cmd = f'''vtysh
-        -c "configure terminal"
-        -c "interface {get_interface_from_to(src, dst)}"
-        -c "ip ospf cost {cost}"
-        -c "exit"
-        -c "exit"
-        -c "write memory"'''
-
-        exec_result = src.container.exec_run(cmd)
-        if exec_result.exit_code != 0:
-            raise Exception(
-                {
-                    "output": exec_result.output.decode("utf-8"),
-                    "exit_code": exec_result.exit_code,
-                }
-            )
-        # Get the current config and save it to disk
-        config = get_current_config(src.name)["output"]
-        save_current_config(config, src.name)
-        return {
-            "output": exec_result.output.decode("utf-8"),
-            "exit_code": exec_result.exit_code,
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    # Validate and get container names
+    src, dst = validate_and_get_NodeIDs(request.src, request.dst)
+    cost = request.cost
+    cmd = f'''vtysh
+    -c "configure terminal"
+    -c "interface {get_interface_from_to(src, dst)}"
+    -c "ip ospf cost {cost}"
+    -c "exit"
+    -c "exit"
+    -c "write memory"'''
+
+    exec_result = exec_in_container(src.container, cmd, check=True)
+    # Get the current config and save it to disk
+    config = get_current_config(src.name)["output"]
+    save_current_config(config, src.name)
+    return {
+        "output": exec_result.output.decode("utf-8"),
+        "exit_code": exec_result.exit_code,
+    }
 
 
+@handle_errors
 def execute_script_in_container(request: config.scriptRequest):
     """
     Endpoint to save a bash command to a script, copy it into a container,
     and execute it.
     """
-    try:
-        # Step 1: Save the command to a temporary script file
-        with tempfile.NamedTemporaryFile(
-            mode="w", delete=False, suffix=".sh"
-        ) as temp_script:
-            temp_script.write(f"#!/bin/bash\n{request.cmd}")
-            temp_script_path = temp_script.name
-
-        # Ensure the script is executable
-        os.chmod(temp_script_path, 0o755)
-
-        # Step 2: Archive script
-        tar_stream = archive_script(temp_script_path)
-        # Step 3: Copy the script into the container
-        container = client.containers.get(request.container_name)
-        container.put_archive(path="/tmp", data=tar_stream.read())
-        # Step 3: Execute the script inside the container
-        exec_id = container.exec_run(f"/tmp/{os.path.basename(temp_script_path)}")
-        output = exec_id.output.decode("utf-8")
-
-        # Step 4: Clean up the temporary script file
-        os.remove(temp_script_path)
-
-        return {"output": output}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    # Step 1: Save the command to a temporary script file
+    with tempfile.NamedTemporaryFile(
+        mode="w", delete=False, suffix=".sh"
+    ) as temp_script:
+        temp_script.write(f"#!/bin/bash\n{request.cmd}")
+        temp_script_path = temp_script.name
+
+    # Ensure the script is executable
+    os.chmod(temp_script_path, 0o755)
+
+    # Step 2: Archive script
+    tar_stream = archive_script(temp_script_path)
+    # Step 3: Copy the script into the container
+    container = get_container(request.container_name)
+    docker_api_call("put_archive", container.put_archive, path="/tmp", data=tar_stream.read())
+    # Step 3: Execute the script inside the container
+    exec_id = exec_in_container(container, f"/tmp/{os.path.basename(temp_script_path)}")
+    output = exec_id.output.decode("utf-8")
+
+    # Step 4: Clean up the temporary script file
+    os.remove(temp_script_path)
 
+    return {"output": output}
 
+
+@handle_errors
 def get_all_configs():
     """Get configurations for all nodes in the lab.
 
@@ -776,46 +1073,27 @@ def get_all_configs():
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        output = {}
-        for node_name in config.LAB_NAMES:
-            output[node_name] = get_current_config(node_name)["output"]
-        return {"output": output}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    output = {}
+    for node_name in config.LAB_NAMES:
+        output[node_name] = get_current_config(node_name)["output"]
+    return {"output": output}
 
 
+@handle_errors
 def get_current_config(router: str):
     """Get the currently running FRR config at the specified router"""
-    try:
-        cmd = '''vtysh -c  "show run"'''
-        node = validate_and_get_NodeID(router, "router")
-
-        exec_result = node.container.exec_run(cmd)
-        if exec_result.exit_code != 0:
-            raise Exception(
-                {
-                    "exit_code": exec_result.exit_code,
-                }
-            )
+    cmd = '''vtysh -c  "show run"'''
+    node = validate_and_get_NodeID(router, "router")
 
-        output_dict = exec_result.output.decode("utf-8")
-        # output_dict = json.loads(output_dict)
-        # output = strip_whitespace(output_dict)
-        return {"output": output_dict}
+    exec_result = exec_in_container(node.container, cmd, check=True)
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    output_dict = exec_result.output.decode("utf-8")
+    # output_dict = json.loads(output_dict)
+    # output = strip_whitespace(output_dict)
+    return {"output": output_dict}
 
 
+@handle_errors
 def get_status(cmd_id: str):
     """Get status of a command execution.
 
@@ -828,65 +1106,56 @@ def get_status(cmd_id: str):
     Raises:
         HTTPException: If command ID not found or operation fails
     """
-    try:
-        # Inspect the exec instance
-        exec_id = config.EVENT_DATABASE[cmd_id]["exec_id"]
-        # container_name = event_database[cmd_id]["container"]
-        exec_info = client.api.exec_inspect(exec_id)
-        status = exec_info["Running"]
-
-        if status:
-            return {"status": "Exec command is still running..."}
-        else:
-            return {"exit_code": exec_info["ExitCode"]}
-    except KeyError:
-        raise HTTPException(status_code=404, detail="No such ID")  # noqa: B904
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    # Inspect the exec instance
+    if cmd_id not in config.EVENT_DATABASE:
+        raise HTTPException(status_code=404, detail="No such ID")
+    exec_id = config.EVENT_DATABASE[cmd_id]["exec_id"]
+    # container_name = event_database[cmd_id]["container"]
+    exec_info = docker_api_call("exec_inspect", client.api.exec_inspect, exec_id)
+    status = exec_info["Running"]
+
+    if status:
+        return {"status": "Exec command is still running..."}
+    else:
+        return {"exit_code": exec_info["ExitCode"]}
 
 
+@handle_errors
 def get_output(cmd_id: str):
     """Returns the output of the command that is referred to by the supplied cmd_id"""
-    try:
-        # Inspect the exec instance
-        exec_id = config.EVENT_DATABASE[cmd_id]["exec_id"]
-        container_name = config.EVENT_DATABASE[cmd_id]["container"]
-        exec_info = client.api.exec_inspect(exec_id)
-
-        # Command has finished, check the output
-        container_obj = client.containers.get(container_name)
-        file_ending = "json" if config.EVENT_DATABASE[cmd_id]["json"] else "txt"
-        exec_result = container_obj.exec_run(f"cat {cmd_id}.{file_ending}")
-        # Decode the byte string to a regular string
-        output_str = exec_result[1].decode("utf-8")
-        # print(output_str)
-        # Parse the JSON string into a Python dictionary
-        output_dict = json.loads(output_str)
-
-        # Now `output_dict` contains the JSON data as a Python dictionary
-        stripped_dict = strip_whitespace(output_dict)
-        # Return the output of the command
-        # Its quite a lot now with iperf, prolly should eventually find a better way to display results(eg -J for json output)
-        return {"output": stripped_dict, "exit_code": exec_result.exit_code}
-        # Command has finished
-        return {
-            "status": "Exec command has finished",
-            "exit_code": exec_info["ExitCode"],
-        }
-    except KeyError:
-        raise HTTPException(status_code=404, detail="No such ID")  # noqa: B904
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    # Inspect the exec instance
+    if cmd_id not in config.EVENT_DATABASE:
+        raise HTTPException(status_code=404, detail="No such ID")
+    exec_id = config.EVENT_DATABASE[cmd_id]["exec_id"]
+    container_name = config.EVENT_DATABASE[cmd_id]["container"]
+    exec_info = docker_api_call("exec_inspect", client.api.exec_inspect, exec_id)
+
+    # Command has finished, check the output
+    container_obj = get_container(container_name)
+    file_ending = "json" if config.EVENT_DATABASE[cmd_id]["json"] else "txt"
+    exec_result = exec_in_container(container_obj, f"cat {cmd_id}.{file_ending}")
+    # Decode the byte string to a regular string
+    output_str = exec_result[1].decode("utf-8")
+    if not config.EVENT_DATABASE[cmd_id]["json"]:
+        # Plain text output of a detached /execute
+        return {"output": output_str, "exit_code": exec_result.exit_code}
+    # print(output_str)
+    # Parse the JSON string into a Python dictionary
+    output_dict = json.loads(output_str)
+
+    # Now `output_dict` contains the JSON data as a Python dictionary
+    stripped_dict = strip_whitespace(output_dict)
+    # Return the output of the command
+    # Its quite a lot now with iperf, prolly should eventually find a better way to display results(eg -J for json output)
+    return {"output": stripped_dict, "exit_code": exec_result.exit_code}
+    # Command has finished
+    return {
+        "status": "Exec command has finished",
+        "exit_code": exec_info["ExitCode"],
+    }
 
 
+@handle_errors
 def check_link_state(src: str, dst: str):
     """Check the current state (loss, delay, bandwidth, burst, buffer) of a network link.
 
@@ -901,48 +1170,32 @@ def check_link_state(src: str, dst: str):
         HTTPException: If operation fails
     """
     # Should be extended to also reflect new kinds of status changes, once theyre implemented
-    try:
-        # Validate and get identifiers
-        src, dst = validate_and_get_NodeIDs(src, dst, "router")  # type: ignore
-
-        # Command to check the current parameters
-        cmd = f"/bin/bash -c 'tc qdisc show dev {get_interface_from_to(src, dst)}'"  # type: ignore
-
-        # Execute the command in the container
-        exec_result = src.container.exec_run(cmd)  # type: ignore
-
-        if exec_result.exit_code != 0:
-            raise Exception(
-                {   
-                    "node": src.name,
-                    "cmd": cmd,
-                    "output": exec_result.output.decode("utf-8"),
-                    "exit_code": exec_result.exit_code,
-                }
-            )
+    # Validate and get identifiers
+    src, dst = validate_and_get_NodeIDs(src, dst, "router")  # type: ignore
 
-        # Parse the output to extract the parameters
-        output = exec_result.output.decode("utf-8")
-        # print(output)
-        link_parameters = parse_link_parameters(output, src, dst)
+    # Command to check the current parameters
+    cmd = f"/bin/bash -c 'tc qdisc show dev {get_interface_from_to(src, dst)}'"  # type: ignore
 
-        # Return the current parameters
-        return {
-            "loss": link_parameters["loss"],
-            "delay": link_parameters["delay"],
-            "bandwidth": link_parameters["bandwidth"],
-            "burst": link_parameters["burst"],
-            "buffer": link_parameters["buffer"],
-        }
+    # Execute the command in the container
+    exec_result = exec_in_container(src.container, cmd, check=True)  # type: ignore
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
 
+    # Parse the output to extract the parameters
+    output = exec_result.output.decode("utf-8")
+    # print(output)
+    link_parameters = parse_link_parameters(output, src, dst)
 
+    # Return the current parameters
+    return {
+        "loss": link_parameters["loss"],
+        "delay": link_parameters["delay"],
+        "bandwidth": link_parameters["bandwidth"],
+        "burst": link_parameters["burst"],
+        "buffer": link_parameters["buffer"],
+    }
+
+
+@handle_errors
 def start_collection():
     """Start packet collection on the netflow container.
 
@@ -952,36 +1205,30 @@ def start_collection():
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        time = datetime.now()
-        timestr = time.strftime("%Y-%m-%d_%H-%M-%S")
+    time = datetime.now()
+    timestr = time.strftime("%Y-%m-%d_%H-%M-%S")
 
-        id = generate_random_id()
+    id = generate_random_id()
 
-        cmd = f"""/bin/bash -c 'tcpdump -i any -w {timestr}.pcap\n'"""
+    cmd = f"""/bin/bash -c 'tcpdump -i any -w {timestr}.pcap\n'"""
 
-        # Get netflow contaner of current topology
-        netflow_containername = f"{config.LAB_PREFIX}_netflow"
-        exec_id = client.api.exec_create(netflow_containername, cmd)
+    # Get netflow contaner of current topology
+    netflow_containername = f"{config.LAB_PREFIX}_netflow"
+    exec_id = docker_api_call("exec_create", client.api.exec_create, netflow_containername, cmd)
 
-        config.EVENT_DATABASE[id] = {
-            "exec_id": exec_id["Id"],
-            "container": netflow_containername,
-            "json": True,
-            "endtime": "-1",
-        }
+    config.EVENT_DATABASE[id] = {
+        "exec_id": exec_id["Id"],
+        "container": netflow_containername,
+        "json": True,
+        "endtime": "-1",
+    }
 
-        client.api.exec_start(exec_id, detach=True)
+    docker_api_call("exec_start", client.api.exec_start, exec_id, detach=True)
 
-        return {"ID": id}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    return {"ID": id}
 
 
+@handle_errors
 def stop_collection():
     """Stop packet collection on the netflow container and copy the file to the host.
 
@@ -991,59 +1238,48 @@ def stop_collection():
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        # Get netflow contaner of current topology
-        container = client.containers.get(f"{config.LAB_PREFIX}_netflow")
-        cmd = """/bin/bash -c 'pkill -SIGINT tcpdump'"""
+    # Get netflow contaner of current topology
+    container = get_container(f"{config.LAB_PREFIX}_netflow")
+    cmd = """/bin/bash -c 'pkill -SIGINT tcpdump'"""
 
-        # Execute the command in the container
-        exec_result = container.exec_run(cmd)
+    # Execute the command in the container
+    exec_result = exec_in_container(container, cmd)
 
-        # Get the list of files in the container's directory
-        # FIXME: get the currently running pcap from a local variable(set when starting collection)
-        file_list_cmd = "/bin/bash -c 'ls -t /'"
-        file_list_result = container.exec_run(file_list_cmd)
+    # Get the list of files in the container's directory
+    # FIXME: get the currently running pcap from a local variable(set when starting collection)
+    file_list_cmd = "/bin/bash -c 'ls -t /'"
+    file_list_result = exec_in_container(container, file_list_cmd, check=True)
 
-        if file_list_result.exit_code != 0:
-            raise Exception(
-                f"Failed to list files in container. Command output: {file_list_result.output.decode('utf-8')}"
-            )
 
-        # Parse the output to find the latest pcap file
-        files = file_list_result.output.decode("utf-8").splitlines()
-        latest_pcap = next((file for file in files if file.endswith(".pcap")), None)
-
-        if not latest_pcap:
-            raise Exception("No pcap file found in the container.")
-
-        # Copy the latest pcap file to the host
-        archive_path = f"/{latest_pcap}"
-        local_file_path = os.path.join(config.LOGS_DIR, latest_pcap)
-
-        stream, _ = container.get_archive(archive_path)
-        with open(local_file_path, "wb") as local_file:
-            for chunk in stream:
-                local_file.write(chunk)
-        if exec_result.exit_code != 0:
-            raise Exception(
-                {
-                    "exit_code": exec_result.exit_code,
-                }
-            )
-        # Return the output of the command
-        return {
-            "output": exec_result.output.decode("utf-8"),
-            "exit_code": exec_result.exit_code,
-        }
+    # Parse the output to find the latest pcap file
+    files = file_list_result.output.decode("utf-8").splitlines()
+    latest_pcap = next((file for file in files if file.endswith(".pcap")), None)
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    if not latest_pcap:
+        raise Exception("No pcap file found in the container.")
+
+    # Copy the latest pcap file to the host
+    archive_path = f"/{latest_pcap}"
+    local_file_path = os.path.join(config.LOGS_DIR, latest_pcap)
+
+    stream, _ = docker_api_call("get_archive", container.get_archive, archive_path)
+    with open(local_file_path, "wb") as local_file:
+        for chunk in stream:
+            local_file.write(chunk)
+    if exec_result.exit_code != 0:
+        raise Exception(
+            {
+                "exit_code": exec_result.exit_code,
+            }
+        )
+    # Return the output of the command
+    return {
+        "output": exec_result.output.decode("utf-8"),
+        "exit_code": exec_result.exit_code,
+    }
 
 
+@handle_errors
 def snmp_param(host: str, oid: str = ""):
     """Query SNMP parameters from a host.
 
@@ -1057,33 +1293,21 @@ def snmp_param(host: str, oid: str = ""):
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        # Get netflow contaner of current topology
-        container = client.containers.get(f"{config.LAB_PREFIX}_netflow")
-        host_ip = lab_parser.get_snmp_ips()[host]
-        cmd = f"""/bin/bash -c 'snmpwalk -mALL -v 2c -c public {host_ip} {oid}'"""
-
-        # Execute the command in the container
-        exec_result = container.exec_run(cmd)
-        if exec_result.exit_code != 0:
-            raise Exception(
-                {
-                    "exit_code": exec_result.exit_code,
-                }
-            )
-        # Return the output of the command
-        return {
-            "output": exec_result.output.decode("utf-8"),
-            "exit_code": exec_result.exit_code,
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    # Get netflow contaner of current topology
+    container = get_container(f"{config.LAB_PREFIX}_netflow")
+    host_ip = lab_parser.get_snmp_ips()[host]
+    cmd = f"""/bin/bash -c 'snmpwalk -mALL -v 2c -c public {host_ip} {oid}'"""
+
+    # Execute the command in the container
+    exec_result = exec_in_container(container, cmd, check=True)
+    # Return the output of the command
+    return {
+        "output": exec_result.output.decode("utf-8"),
+        "exit_code": exec_result.exit_code,
+    }
 
 
+@handle_errors
 def add_static_route(request: config.staticRouteRequest):
     """Add a static route to a router.
 
@@ -1096,42 +1320,29 @@ def add_static_route(request: config.staticRouteRequest):
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        # Validate and get container
-        node = validate_and_get_NodeID(request.node, "router")
-        destination = request.destination
-        next_hop = request.next_hop
-        if not is_valid_ip(next_hop):
-            next_hop = config.IPS[next_hop]
-        cmd = f'''vtysh
-        -c "configure terminal"
-        -c "ip route {destination} {next_hop}"
-        -c "end"
-        -c "write memory"'''
-
-        exec_result = node.container.exec_run(cmd)
-        if exec_result.exit_code != 0:
-            raise Exception(
-                {
-                    "output": exec_result.output.decode("utf-8"),
-                    "exit_code": exec_result.exit_code,
-                }
-            )
-        # Get the current config and save it to disk
-        frr_config = get_current_config(node.name)["output"]
-        save_current_config(frr_config, node.name)
-        return {
-            "output": exec_result.output.decode("utf-8"),
-            "exit_code": exec_result.exit_code,
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    # Validate and get container
+    node = validate_and_get_NodeID(request.node, "router")
+    destination = request.destination
+    next_hop = request.next_hop
+    if not is_valid_ip(next_hop):
+        next_hop = config.IPS[next_hop]
+    cmd = f'''vtysh
+    -c "configure terminal"
+    -c "ip route {destination} {next_hop}"
+    -c "end"
+    -c "write memory"'''
+
+    exec_result = exec_in_container(node.container, cmd, check=True)
+    # Get the current config and save it to disk
+    frr_config = get_current_config(node.name)["output"]
+    save_current_config(frr_config, node.name)
+    return {
+        "output": exec_result.output.decode("utf-8"),
+        "exit_code": exec_result.exit_code,
+    }
 
 
+@handle_errors
 def rm_static_route(request: config.staticRouteRequest):
     """Remove a static route from a router.
 
@@ -1144,45 +1355,32 @@ def rm_static_route(request: config.staticRouteRequest):
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        # Validate and get container names
-        node = validate_and_get_NodeID(request.node, "router")
-
-        destination = request.destination
-        next_hop = request.next_hop
-        if not is_valid_ip(next_hop):
-            next_hop = config.IPS[next_hop]
-        # If the demanded static route doesnt exist frr will simply do nothing
-        # so it is fine not to check if the route actually exists
-        cmd = f'''vtysh
-        -c "configure terminal"
-        -c "no ip route {destination} {next_hop}"
-        -c "end"
-        -c "write memory"'''
-
-        exec_result = node.container.exec_run(cmd)
-        if exec_result.exit_code != 0:
-            raise Exception(
-                {
-                    "output": exec_result.output.decode("utf-8"),
-                    "exit_code": exec_result.exit_code,
-                }
-            )
-        # Get the current config and save it to disk
-        frr_config = get_current_config(node.name)["output"]
-        save_current_config(frr_config, node.name)
-        return {
-            "output": exec_result.output.decode("utf-8"),
-            "exit_code": exec_result.exit_code,
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    # Validate and get container names
+    node = validate_and_get_NodeID(request.node, "router")
+
+    destination = request.destination
+    next_hop = request.next_hop
+    if not is_valid_ip(next_hop):
+        next_hop = config.IPS[next_hop]
+    # If the demanded static route doesnt exist frr will simply do nothing
+    # so it is fine not to check if the route actually exists
+    cmd = f'''vtysh
+    -c "configure terminal"
+    -c "no ip route {destination} {next_hop}"
+    -c "end"
+    -c "write memory"'''
+
+    exec_result = exec_in_container(node.container, cmd, check=True)
+    # Get the current config and save it to disk
+    frr_config = get_current_config(node.name)["output"]
+    save_current_config(frr_config, node.name)
+    return {
+        "output": exec_result.output.decode("utf-8"),
+        "exit_code": exec_result.exit_code,
+    }
 
 
+@handle_errors
 def take_snapshot():
     """Take a snapshot of all node configurations.
 
@@ -1192,22 +1390,16 @@ def take_snapshot():
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        print("enter")
-        output = get_all_configs()["output"]
-        # add a timestamp to track when the snapshot was taken
-        output["time"] = calculate_endtime(0)
-        id = generate_random_id()
-        config.SNAPSHOTS[id] = output
-        return {"output": output, "id": id}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    print("enter")
+    output = get_all_configs()["output"]
+    # add a timestamp to track when the snapshot was taken
+    output["time"] = calculate_endtime(0)
+    id = generate_random_id()
+    config.SNAPSHOTS[id] = output
+    return {"output": output, "id": id}
 
 
+@handle_errors
 def apply_snapshot(request: config.ApplySnapshotRequest):
     """Apply a previously taken snapshot.
 
@@ -1217,89 +1409,76 @@ def apply_snapshot(request: config.ApplySnapshotRequest):
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        # obtain the snapshot dict
-        snapshot = config.SNAPSHOTS[request.snapshot_id]
-
-        ### possible optimization: (However if theres just a couple of nodes and many changes
-        # , applying to all is more efficient)
-        # only apply the changed configs, however if we repedeatly apply the snapshot we need some way to account for this
-        # Maybe just change the saved timestamp after applying a config
-
-        # initial_timestamp = datetime.strptime(snapshot["time"], "%Y-%m-%d %H:%M:%S")
-        # # Initialize a set to store unique node names
-        # nodes_after_timestamp = set()
-
-        # # Iterate over the files in the folder
-        # for filename in os.listdir(config.LOGS_DIR):
-        #     if filename.endswith(".txt"):
-        #         # Split the filename to extract the timestamp and node name
-        #         try:
-        #             timestr, node_with_extension = filename.split("_")
-        #             node = node_with_extension.split(".")[0]
-        #             file_timestamp = datetime.strptime(timestr, "%Y-%m-%d %H:%M:%S"):%M:     #      :%M:           # Check if the file's timestamp is after the initial timestamp
-        #             if file_timestamp > initial_timestamp:
-        #                 nodes_after_timestamp.add(node)
-        #         except ValueError:
-        #             # Skip files that don't match the expected format
-        #             continue
-
-        # # Print the nodes that have files created after the initial timestamp
-        # print("Nodes with files created after the initial timestamp:")
-        # for node in nodes_after_timestamp:
-        #     print(node)
-        #     node = validate_and_get_NodeID(node, "router")
-        #     apply_frr_config_at(node, snapshot[node.name])
-        # # set the time to now
-        # snapshot["time"] = calculate_endtime(0)
-
-        ###alternative impl. :
-        # print(snapshot)
-        # for entry in snapshot:
-        #     print(type(entry))
-        #     print(entry)
-        #     print("\n\n\n")
-        for key, value in snapshot.items():
-            if key != "time" and key != "id":
-                node = validate_and_get_NodeID(key, "router")
-                apply_frr_config_at(node, value)
-        snapshot["time"] = calculate_endtime(0)
-        # if we get here everything was fine and we can return success
-        return
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    # obtain the snapshot dict
+    snapshot = config.SNAPSHOTS[request.snapshot_id]
+
+    ### possible optimization: (However if theres just a couple of nodes and many changes
+    # , applying to all is more efficient)
+    # only apply the changed configs, however if we repedeatly apply the snapshot we need some way to account for this
+    # Maybe just change the saved timestamp after applying a config
+
+    # initial_timestamp = datetime.strptime(snapshot["time"], "%Y-%m-%d %H:%M:%S")
+    # # Initialize a set to store unique node names
+    # nodes_after_timestamp = set()
+
+    # # Iterate over the files in the folder
+    # for filename in os.listdir(config.LOGS_DIR):
+    #     if filename.endswith(".txt"):
+    #         # Split the filename to extract the timestamp and node name
+    #         try:
+    #             timestr, node_with_extension = filename.split("_")
+    #             node = node_with_extension.split(".")[0]
+    #             file_timestamp = datetime.strptime(timestr, "%Y-%m-%d %H:%M:%S"):%M:     #      :%M:           # Check if the file's timestamp is after the initial timestamp
+    #             if file_timestamp > initial_timestamp:
+    #                 nodes_after_timestamp.add(node)
+    #         except ValueError:
+    #             # Skip files that don't match the expected format
+    #             continue
+
+    # # Print the nodes that have files created after the initial timestamp
+    # print("Nodes with files created after the initial timestamp:")
+    # for node in nodes_after_timestamp:
+    #     print(node)
+    #     node = validate_and_get_NodeID(node, "router")
+    #     apply_frr_config_at(node, snapshot[node.name])
+    # # set the time to now
+    # snapshot["time"] = calculate_endtime(0)
+
+    ###alternative impl. :
+    # print(snapshot)
+    # for entry in snapshot:
+    #     print(type(entry))
+    #     print(entry)
+    #     print("\n\n\n")
+    # The routers are independent, so their configs are applied concurrently
+    def apply_at(item):
+        key, value = item
+        apply_frr_config_at(validate_and_get_NodeID(key, "router"), value)
+
+    run_in_parallel(apply_at, [(key, value) for key, value in snapshot.items() if key != "time" and key != "id"])
+    snapshot["time"] = calculate_endtime(0)
+    # if we get here everything was fine and we can return success
+    return
 
 
+@handle_errors
 def disconnect_router(request: config.DisconnectContainerRequest):
     # alternatively use iptables to drop all traffic:
     """Disconnect a router by blocking all traffic using iptables."""
-    try:
-        # Validate and get container
-        node_obj = validate_and_get_NodeID(request.node, "router")
-
-        # Apply iptables rules to drop all incoming and outgoing traffic
-        block_all_traffic_command = """
-        iptables -A INPUT -j DROP && iptables -A OUTPUT -j DROP
-        """
-        exec_result = node_obj.container.exec_run(
-            f'/bin/bash -c "{block_all_traffic_command}"'
-        )
+    # Validate and get container
+    node_obj = validate_and_get_NodeID(request.node, "router")
 
-        if exec_result.exit_code != 0:
-            raise Exception(
-                f"Failed to block all traffic for router {request.node}. "
-                f"Command output: {exec_result.output.decode('utf-8')}"
-            )
+    # Apply iptables rules to drop all incoming and outgoing traffic
+    block_all_traffic_command = """
+    iptables -A INPUT -j DROP && iptables -A OUTPUT -j DROP
+    """
+    exec_in_container(node_obj.container, f'/bin/bash -c "{block_all_traffic_command}"', check=True)
 
-        return {
-            "status": "disconnected",
-            "name": node_obj.name,
-            "id": node_obj.container.id,
-        }
+    return {
+        "status": "disconnected",
+        "name": node_obj.name,
+        "id": node_obj.container.id,
+    }
     # """Disconnect a router by bringing down all its network interfaces."""
     # try:
     #     # Validate and get container
@@ -1344,42 +1523,28 @@ def disconnect_router(request: config.DisconnectContainerRequest):
     #         "id": node_obj.container.id,
     #     }
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
-
 
+@handle_errors
 def connect_router(request: config.DisconnectContainerRequest):
     # alternatively use iptables to unblock all traffic:
     """Reconnect a router by removing iptables rules that block traffic."""
-    try:
-        # Validate and get container
-        node_obj = validate_and_get_NodeID(request.node, "router")
-
-        # Remove iptables rules to unblock all traffic
-        unblock_all_traffic_command = """
-        iptables -D INPUT -j DROP && iptables -D OUTPUT -j DROP
-        """
-        exec_result = node_obj.container.exec_run(
-            f'/bin/bash -c "{unblock_all_traffic_command}"'
-        )
+    # Validate and get container
+    node_obj = validate_and_get_NodeID(request.node, "router")
 
-        if exec_result.exit_code != 0:
-            raise Exception(
-                f"Failed to unblock all traffic for router {request.node}. "
-                f"Command output: {exec_result.output.decode('utf-8')}"
-            )
-        # if we want to ensure that shortly following commands are executed sucessfully we need to wait a bit
-        # otherwise commands like ip route get fail (when changing link params)
-        # time.sleep(20)
-        return {
-            "status": "connected",
-            "name": node_obj.name,
-            "id": node_obj.container.id,
-        }
+    # Remove iptables rules to unblock all traffic
+    unblock_all_traffic_command = """
+    iptables -D INPUT -j DROP && iptables -D OUTPUT -j DROP
+    """
+    exec_in_container(node_obj.container, f'/bin/bash -c "{unblock_all_traffic_command}"', check=True)
+
+    # if we want to ensure that shortly following commands are executed sucessfully we need to wait a bit
+    # otherwise commands like ip route get fail (when changing link params)
+    # time.sleep(20)
+    return {
+        "status": "connected",
+        "name": node_obj.name,
+        "id": node_obj.container.id,
+    }
     # """Reconnect a router by bringing up all its network interfaces."""
     # try:
     #     # Validate and get container
@@ -1424,55 +1589,36 @@ def connect_router(request: config.DisconnectContainerRequest):
     #         "id": node_obj.container.id,
     #     }
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
-
 
+@handle_errors
 def change_FRR_config(request: config.ChangeFRRConfigRequest):
     """Execute a given, valid vtysh command on the specified router
     The command must contain any exit commands to return from submenus,
     it should not include entering and exiting the configuration terminal in vtysh.
     """
-    try:
-        # Validate and get container names
-        node_obj = validate_and_get_NodeID(request.node, "router")
-        raw_vytsh_cmd = request.cmd
-
-        cmd = """vtysh
-        -c "configure terminal"\n"""
-        for line in raw_vytsh_cmd.split("\n"):
-            cmd += f'''-c "{line}"\n'''
-        cmd += '''-c "exit"
-        -c "write memory"'''
-        # print(cmd)
-
-        exec_result = node_obj.container.exec_run(cmd)
-        if exec_result.exit_code != 0:
-            raise Exception(
-                {
-                    "output": exec_result.output.decode("utf-8"),
-                    "exit_code": exec_result.exit_code,
-                }
-            )
-        # Get the current config and save it to disk
-        config = get_current_config(node_obj.name)["output"]
-        save_current_config(config, node_obj.name)
-        return {
-            "output": exec_result.output.decode("utf-8"),
-            "exit_code": exec_result.exit_code,
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    # Validate and get container names
+    node_obj = validate_and_get_NodeID(request.node, "router")
+    raw_vytsh_cmd = request.cmd
+
+    cmd = """vtysh
+    -c "configure terminal"\n"""
+    for line in raw_vytsh_cmd.split("\n"):
+        cmd += f'''-c "{line}"\n'''
+    cmd += '''-c "exit"
+    -c "write memory"'''
+    # print(cmd)
+
+    exec_result = exec_in_container(node_obj.container, cmd, check=True)
+    # Get the current config and save it to disk
+    config = get_current_config(node_obj.name)["output"]
+    save_current_config(config, node_obj.name)
+    return {
+        "output": exec_result.output.decode("utf-8"),
+        "exit_code": exec_result.exit_code,
+    }
 
 
+@handle_errors
 def copy_syslogs():
     """Copy syslogs from a specific container to the local logs folder, appending only new lines if the file already exists.
 
@@ -1482,69 +1628,63 @@ def copy_syslogs():
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        # Validate and get the container
-        l1_2host = validate_and_get_NodeID("l1-2", "host")
-        stream, _ = l1_2host.container.get_archive("/var/log/all_frr_logs.log")
-
-        local_file_path = os.path.join(config.LOGS_DIR, "all_frr_logs.log")
-
-        # Use tarfile to extract the actual file content
-        with tarfile.open(fileobj=io.BytesIO(b"".join(stream))) as tar:
-            # Get the first file in the tar archive
-            member = tar.getmembers()[0]
-            with tar.extractfile(member) as extracted_file:
-                file_content = extracted_file.read().decode("utf-8", errors="ignore")
-
-        # Write the extracted content to the local file
-        with open(local_file_path, "w", encoding="utf-8") as local_file:
-            local_file.write(file_content)
-
-        # # Get the number of lines in the existing file if it exists
-        # existing_lines = 0
-        # if os.path.exists(local_file_path):
-        #     with open(local_file_path, encoding="utf-8", errors="ignore") as local_file:
-        #         existing_lines = sum(1 for _ in local_file)
-
-        # # Write new content starting from the offset
-        # with open(local_file_path, "a", encoding="utf-8") as local_file:
-        #     current_lines = 0
-        #     buffer = ""  # Buffer to handle incomplete lines
-        #     for chunk in stream:
-        #         # Decode the chunk to a string
-        #         decoded_chunk = chunk.decode("utf-8", errors="ignore")
-        #         # Add the chunk to the buffer
-        #         buffer += decoded_chunk
-        #         # Split the buffer into lines
-        #         lines = buffer.splitlines(keepends=True)
-
-        #         # Check if the last line is incomplete
-        #         if not lines[-1].endswith("\n"):
-        #             buffer = lines.pop()  # Keep the incomplete line in the buffer
-        #         else:
-        #             buffer = ""  # Clear the buffer if all lines are complete
-
-        #         # Write only new lines that contain valid characters
-        #         for line in lines:
-        #             current_lines += 1
-        #             if current_lines > existing_lines + 1:  # noqa: SIM102
-        #                 # Check if the line contains only valid characters
-        #                 # Necessary because otherwise the first and last lines contain invalid characters
-        #                 if all(c.isprintable() or c == "\n" for c in line):
-        #                     local_file.write(line)
-
-        return {
-            "message": "File copied successfully",
-            "local_file_path": local_file_path,
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error copying syslogs: {str(e)}")  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail=f"Docker API error: {str(e)}")  # noqa: B904
+    # Validate and get the container
+    l1_2host = validate_and_get_NodeID("l1-2", "host")
+    stream, _ = docker_api_call("get_archive", l1_2host.container.get_archive, "/var/log/all_frr_logs.log")
+
+    local_file_path = os.path.join(config.LOGS_DIR, "all_frr_logs.log")
+
+    # Use tarfile to extract the actual file content
+    with tarfile.open(fileobj=io.BytesIO(b"".join(stream))) as tar:
+        # Get the first file in the tar archive
+        member = tar.getmembers()[0]
+        with tar.extractfile(member) as extracted_file:
+            file_content = extracted_file.read().decode("utf-8", errors="ignore")
+
+    # Write the extracted content to the local file
+    with open(local_file_path, "w", encoding="utf-8") as local_file:
+        local_file.write(file_content)
+
+    # # Get the number of lines in the existing file if it exists
+    # existing_lines = 0
+    # if os.path.exists(local_file_path):
+    #     with open(local_file_path, encoding="utf-8", errors="ignore") as local_file:
+    #         existing_lines = sum(1 for _ in local_file)
+
+    # # Write new content starting from the offset
+    # with open(local_file_path, "a", encoding="utf-8") as local_file:
+    #     current_lines = 0
+    #     buffer = ""  # Buffer to handle incomplete lines
+    #     for chunk in stream:
+    #         # Decode the chunk to a string
+    #         decoded_chunk = chunk.decode("utf-8", errors="ignore")
+    #         # Add the chunk to the buffer
+    #         buffer += decoded_chunk
+    #         # Split the buffer into lines
+    #         lines = buffer.splitlines(keepends=True)
+
+    #         # Check if the last line is incomplete
+    #         if not lines[-1].endswith("\n"):
+    #             buffer = lines.pop()  # Keep the incomplete line in the buffer
+    #         else:
+    #             buffer = ""  # Clear the buffer if all lines are complete
+
+    #         # Write only new lines that contain valid characters
+    #         for line in lines:
+    #             current_lines += 1
+    #             if current_lines > existing_lines + 1:  # noqa: SIM102
+    #                 # Check if the line contains only valid characters
+    #                 # Necessary because otherwise the first and last lines contain invalid characters
+    #                 if all(c.isprintable() or c == "\n" for c in line):
+    #                     local_file.write(line)
+
+    return {
+        "message": "File copied successfully",
+        "local_file_path": local_file_path,
+    }
 
 
+@handle_errors
 def set_bandwidth(request: config.SetBandwidthRequest):
     """Set the bandwidth of a network link.
 
@@ -1557,52 +1697,35 @@ def set_bandwidth(request: config.SetBandwidthRequest):
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        print("set bandwidth")
-        # Validate and get identifiers
-        src, dst = validate_and_get_NodeIDs(request.src, request.dst)
-
-        # Get the container object and interface
-        interface = get_interface_from_to(src, dst)
-
-        # Check the current link state to preserve existing values
-        current_params = check_link_state(src.name, dst.name)
-        print(current_params)
-        # Command to configure bandwidth while preserving existing values
-        cmd = f"""/bin/bash -c '
-        tc qdisc del dev {interface} root || true; \
-        tc qdisc add dev {interface} root handle 1:0 netem delay {current_params["delay"]} loss {current_params["loss"]} ; \
-        tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {request.bandwidth}mbit burst {current_params["burst"]} latency {current_params["buffer"]}'"""
-
-        # print(cmd)
-        # Execute the command in the container
-        exec_result = src.container.exec_run(cmd)
-
-        if exec_result.exit_code != 0:
-            # TODO: Reset link to default values if the command fails
-            raise Exception(
-                {   
-                    "node": src.name,
-                    "cmd": cmd,
-                    "output": exec_result.output.decode("utf-8"),
-                    "exit_code": exec_result.exit_code,
-                }
-            )
-
-        # Return the output of the command
-        return {
-            "output": exec_result.output.decode("utf-8"),
-            "exit_code": exec_result.exit_code,
-        }
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    print("set bandwidth")
+    # Validate and get identifiers
+    src, dst = validate_and_get_NodeIDs(request.src, request.dst)
+
+    # Get the container object and interface
+    interface = get_interface_from_to(src, dst)
+
+    # Check the current link state to preserve existing values
+    current_params = check_link_state(src.name, dst.name)
+    print(current_params)
+    # Command to configure bandwidth while preserving existing values
+    cmd = f"""/bin/bash -c '
+    tc qdisc del dev {interface} root || true; \
+    tc qdisc add dev {interface} root handle 1:0 netem delay {current_params["delay"]} loss {current_params["loss"]} ; \
+    tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {request.bandwidth}mbit burst {current_params["burst"]} latency {current_params["buffer"]}'"""
+
+    # print(cmd)
+    # Execute the command in the container
+    # TODO: Reset link to default values if the command fails
+    exec_result = exec_in_container(src.container, cmd, check=True)
+
+    # Return the output of the command
+    return {
+        "output": exec_result.output.decode("utf-8"),
+        "exit_code": exec_result.exit_code,
+    }
 
 
+@handle_errors
 def set_buffer(request: config.SetBufferRequest):
     """Set the buffer of a network link.
 
@@ -1615,49 +1738,35 @@ def set_buffer(request: config.SetBufferRequest):
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        # Validate and get identifiers
-        src, dst = validate_and_get_NodeIDs(request.src, request.dst)
+    # Validate and get identifiers
+    src, dst = validate_and_get_NodeIDs(request.src, request.dst)
 
-        # Get the container object and interface
-        interface = get_interface_from_to(src, dst)
-        
+    # Get the container object and interface
+    interface = get_interface_from_to(src, dst)
+    
 
-        # Check the current link state to preserve existing values
-        current_params = check_link_state(src.name, dst.name)
-
-        # Command to configure buffer while preserving existing values
-        cmd = f"""/bin/bash -c '
-        tc qdisc del dev {interface} root || true; \
-        tc qdisc add dev {interface} root handle 1:0 netem delay {current_params["delay"]} loss {current_params["loss"]} ; \
-        tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {current_params["bandwidth"]} burst {current_params["burst"]} latency {request.buffer}ms'"""
-
-        # print(cmd)
-        # Execute the command in the container
-        exec_result = src.container.exec_run(cmd)
-
-        if exec_result.exit_code != 0:
-            raise Exception(
-                {
-                    "output": exec_result.output.decode("utf-8"),
-                    "exit_code": exec_result.exit_code,
-                }
-            )
+    # Check the current link state to preserve existing values
+    current_params = check_link_state(src.name, dst.name)
 
-        # Return the output of the command
-        return {
-            "output": exec_result.output.decode("utf-8"),
-            "exit_code": exec_result.exit_code,
-        }
+    # Command to configure buffer while preserving existing values
+    cmd = f"""/bin/bash -c '
+    tc qdisc del dev {interface} root || true; \
+    tc qdisc add dev {interface} root handle 1:0 netem delay {current_params["delay"]} loss {current_params["loss"]} ; \
+    tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {current_params["bandwidth"]} burst {current_params["burst"]} latency {request.buffer}ms'"""
+
+    # print(cmd)
+    # Execute the command in the container
+    exec_result = exec_in_container(src.container, cmd, check=True)
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+
+    # Return the output of the command
+    return {
+        "output": exec_result.output.decode("utf-8"),
+        "exit_code": exec_result.exit_code,
+    }
 
 
+@handle_errors
 def set_burst(request: config.SetBurstRequest):
     """Set the burst of a network link.
 
@@ -1670,33 +1779,69 @@ def set_burst(request: config.SetBurstRequest):
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        # Validate and get identifiers
-        src, dst = validate_and_get_NodeIDs(request.src, request.dst)
-
-        # Get the container object and interface
-        interface = get_interface_from_to(src, dst)
-
-        # Check the current link state to preserve existing values
-        current_params = check_link_state(src.name, dst.name)
-
-        # Command to configure burst while preserving existing values
-        cmd = f"""/bin/bash -c '
-        tc qdisc del dev {interface} root || true; \
-        tc qdisc add dev {interface} root handle 1:0 netem delay {current_params["delay"]} loss {current_params["loss"]} ; \
-        tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {current_params["bandwidth"]} burst {request.burst}b latency {current_params["buffer"]}'"""
-
-        # print(cmd)
-        # Execute the command in the container
-        exec_result = src.container.exec_run(cmd)
-
-        if exec_result.exit_code != 0:
-            raise Exception(
-                {
-                    "output": exec_result.output.decode("utf-8"),
-                    "exit_code": exec_result.exit_code,
-                }
-            )
+    # Validate and get identifiers
+    src, dst = validate_and_get_NodeIDs(request.src, request.dst)
+
+    # Get the container object and interface
+    interface = get_interface_from_to(src, dst)
+
+    # Check the current link state to preserve existing values
+    current_params = check_link_state(src.name, dst.name)
+
+    # Command to configure burst while preserving existing values
+    cmd = f"""/bin/bash -c '
+    tc qdisc del dev {interface} root || true; \
+    tc qdisc add dev {interface} root handle 1:0 netem delay {current_params["delay"]} loss {current_params["loss"]} ; \
+    tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {current_params["bandwidth"]} burst {request.burst}b latency {current_params["buffer"]}'"""
+
+    # print(cmd)
+    # Execute the command in the container
+    exec_result = exec_in_container(src.container, cmd, check=True)
+
+
+    # Return the output of the command
+    return {
+        "output": exec_result.output.decode("utf-8"),
+        "exit_code": exec_result.exit_code,
+    }
+
+
+@handle_errors
+def execute(request: config.ExecuteRequest):
+    """Execute a command on a container.
+
+    Commands that aren't detached are killed after `request.timeout` seconds
+    (default config.EXEC_TIMEOUT, 0 disables the deadline), detached commands run without deadline.
+    """
+    node = None
+    if request.router:
+        # Validate and get container names
+        node = validate_and_get_NodeID(request.node, "router")
+    else:
+        # Validate and get container names
+        node = validate_and_get_NodeID(request.node, "host")
+
+    if request.detach:
+        id = generate_random_id()
+        cmd = request.cmd
+        if request.log_output:
+            # Keep the output in the container, /cmd_output reads it once the command has finished
+            cmd = f"/bin/bash -c {shlex.quote(f'{request.cmd} > {id}.txt 2>&1')}"
+        exec_id = docker_api_call("exec_create", client.api.exec_create, node.containername, cmd)
+        config.EVENT_DATABASE[id] = {
+            "exec_id": exec_id["Id"],
+            "container": node.containername,
+            "json": not request.log_output,
+            "endtime": "-1",
+        }
+
+        docker_api_call("exec_start", client.api.exec_start, exec_id, detach=True)
+        
+        return {"ID": id}
+    else:
+        exec_result = exec_in_container(
+            node.container, request.cmd, timeout=request.timeout, detach=request.detach, check=True
+        )
 
         # Return the output of the command
         return {
@@ -1704,64 +1849,35 @@ def set_burst(request: config.SetBurstRequest):
             "exit_code": exec_result.exit_code,
         }
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
 
+@handle_errors
+def execute_batch(request: config.ExecuteBatchRequest):
+    """Execute many short commands on containers concurrently, e.g. probes on all hosts.
 
-def execute(request: config.ExecuteRequest):
-    """Execute a command on a container."""
-    try:
-        node = None
-        if request.router:
-            # Validate and get container names
-            node = validate_and_get_NodeID(request.node, "router")
-        else:
-            # Validate and get container names
-            node = validate_and_get_NodeID(request.node, "host")
-
-        if request.detach:
-            exec_id = client.api.exec_create(node.containername, request.cmd)
-            id = generate_random_id()
-            config.EVENT_DATABASE[id] = {
-                "exec_id": exec_id["Id"],
-                "container": node.containername,
-                "json": True,
-                "endtime": "-1",
-            }
+    A command that fails doesn't fail the batch, its error is returned in its place.
+    Non-zero exit codes are not errors, they are returned like the output.
 
-            client.api.exec_start(exec_id, detach=True)
-            
-            return {"ID": id}
-        else:
-            exec_result = node.container.exec_run(request.cmd, detach=request.detach)
-        
-            if exec_result.exit_code != 0:
-                raise Exception(
-                    {   
-                        "cmd": request.cmd,
-                        "output": exec_result.output.decode("utf-8"),
-                        "exit_code": exec_result.exit_code,
-                    }
-                )
-
-            # Return the output of the command
-            return {
-                "output": exec_result.output.decode("utf-8"),
-                "exit_code": exec_result.exit_code,
-            }
+    Args:
+        request: ExecuteBatchRequest with the commands and their deadline
+
+    Returns:
+        dict: Results in the order of the commands, {"output", "exit_code"} or {"error", "status_code"}
+    """
+
+    def run(command: config.BatchCommand):
+        try:
+            node = validate_and_get_NodeID(command.node, "router" if command.router else "host")
+            exec_result = exec_in_container(node.container, command.cmd, timeout=request.timeout)
+        except (ExecError, HTTPException) as e:
+            return {"error": e.detail, "status_code": e.status_code}
+        except Exception as e:
+            return {"error": str(e), "status_code": 500}
+        return {"output": exec_result.output.decode("utf-8"), "exit_code": exec_result.exit_code}
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    return {"results": run_in_parallel(run, request.commands)}
 
 
+@handle_errors
 def reset_bandwidth(request: config.RemoveChangeRequest):
     """Reset the bandwidth of a network link to its initial value.
 
@@ -1774,55 +1890,39 @@ def reset_bandwidth(request: config.RemoveChangeRequest):
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        # Validate and get identifiers
-        src, dst = validate_and_get_NodeIDs(request.src, request.dst)
+    # Validate and get identifiers
+    src, dst = validate_and_get_NodeIDs(request.src, request.dst)
 
-        # Get the container object and interface
-        interface = get_interface_from_to(src, dst)
+    # Get the container object and interface
+    interface = get_interface_from_to(src, dst)
 
-        # Check the current link state to preserve existing values
-        current_params = check_link_state(src.name, dst.name)
+    # Check the current link state to preserve existing values
+    current_params = check_link_state(src.name, dst.name)
 
-        # Get the initial bandwidth value from the configuration
-        initial_bandwidth = config.LAB_LINKS[frozenset({src.name, dst.name})][
-            "bandwidth"
-        ]
+    # Get the initial bandwidth value from the configuration
+    initial_bandwidth = config.LAB_LINKS[frozenset({src.name, dst.name})][
+        "bandwidth"
+    ]
 
-        # Command to reset bandwidth while preserving other values
-        cmd = f"""/bin/bash -c '
-        tc qdisc del dev {interface} root || true; \
-        tc qdisc add dev {interface} root handle 1:0 netem delay {current_params["delay"]} loss {current_params["loss"]} ; \
-        tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {initial_bandwidth} burst {current_params["burst"]} latency {current_params["buffer"]}'"""
-
-        # print(cmd)
-        # Execute the command in the container
-        exec_result = src.container.exec_run(cmd)
-
-        if exec_result.exit_code != 0:
-            raise Exception(
-                {   
-                    "node": src.name,
-                    "cmd": cmd,
-                    "output": exec_result.output.decode("utf-8"),
-                    "exit_code": exec_result.exit_code,
-                }
-            )
+    # Command to reset bandwidth while preserving other values
+    cmd = f"""/bin/bash -c '
+    tc qdisc del dev {interface} root || true; \
+    tc qdisc add dev {interface} root handle 1:0 netem delay {current_params["delay"]} loss {current_params["loss"]} ; \
+    tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {initial_bandwidth} burst {current_params["burst"]} latency {current_params["buffer"]}'"""
 
-        # Return the output of the command
-        return {
-            "output": exec_result.output.decode("utf-8"),
-            "exit_code": exec_result.exit_code,
-        }
+    # print(cmd)
+    # Execute the command in the container
+    exec_result = exec_in_container(src.container, cmd, check=True)
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+
+    # Return the output of the command
+    return {
+        "output": exec_result.output.decode("utf-8"),
+        "exit_code": exec_result.exit_code,
+    }
 
 
+@handle_errors
 def reset_burst(request: config.RemoveChangeRequest):
     """Reset the burst of a network link to its initial value.
 
@@ -1835,51 +1935,35 @@ def reset_burst(request: config.RemoveChangeRequest):
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        # Validate and get identifiers
-        src, dst = validate_and_get_NodeIDs(request.src, request.dst)
-
-        # Get the container object and interface
-        interface = get_interface_from_to(src, dst)
-
-        # Check the current link state to preserve existing values
-        current_params = check_link_state(src.name, dst.name)
-
-        # Get the initial burst value from the configuration
-        initial_burst = config.LAB_LINKS[frozenset({src.name, dst.name})]["burst"]
-
-        # Command to reset burst while preserving other values
-        cmd = f"""/bin/bash -c '
-        tc qdisc del dev {interface} root || true; \
-        tc qdisc add dev {interface} root handle 1:0 netem delay {current_params["delay"]} loss {current_params["loss"]} ; \
-        tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {current_params["bandwidth"]} burst {initial_burst} latency {current_params["buffer"]}'"""
-        # Execute the command in the container
-        exec_result = src.container.exec_run(cmd)
-
-        if exec_result.exit_code != 0:
-            raise Exception(
-                {   
-                    "node": src.name,
-                    "cmd": cmd,
-                    "output": exec_result.output.decode("utf-8"),
-                    "exit_code": exec_result.exit_code,
-                }
-            )
+    # Validate and get identifiers
+    src, dst = validate_and_get_NodeIDs(request.src, request.dst)
 
-        # Return the output of the command
-        return {
-            "output": exec_result.output.decode("utf-8"),
-            "exit_code": exec_result.exit_code,
-        }
+    # Get the container object and interface
+    interface = get_interface_from_to(src, dst)
+
+    # Check the current link state to preserve existing values
+    current_params = check_link_state(src.name, dst.name)
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    # Get the initial burst value from the configuration
+    initial_burst = config.LAB_LINKS[frozenset({src.name, dst.name})]["burst"]
+
+    # Command to reset burst while preserving other values
+    cmd = f"""/bin/bash -c '
+    tc qdisc del dev {interface} root || true; \
+    tc qdisc add dev {interface} root handle 1:0 netem delay {current_params["delay"]} loss {current_params["loss"]} ; \
+    tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {current_params["bandwidth"]} burst {initial_burst} latency {current_params["buffer"]}'"""
+    # Execute the command in the container
+    exec_result = exec_in_container(src.container, cmd, check=True)
+
+
+    # Return the output of the command
+    return {
+        "output": exec_result.output.decode("utf-8"),
+        "exit_code": exec_result.exit_code,
+    }
 
 
+@handle_errors
 def reset_buffer(request: config.RemoveChangeRequest):
     """Reset the buffer of a network link to its initial value.
 
@@ -1892,52 +1976,36 @@ def reset_buffer(request: config.RemoveChangeRequest):
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        # Validate and get identifiers
-        src, dst = validate_and_get_NodeIDs(request.src, request.dst)
-
-        # Get the container object and interface
-        interface = get_interface_from_to(src, dst)
-
-        # Check the current link state to preserve existing values
-        current_params = check_link_state(src.name, dst.name)
-
-        # Get the initial buffer value from the configuration
-        initial_buffer = config.LAB_LINKS[frozenset({src.name, dst.name})]["buffer"]
-
-        # Command to reset buffer while preserving other values
-        cmd = f"""/bin/bash -c '
-        tc qdisc del dev {interface} root || true; \
-        tc qdisc add dev {interface} root handle 1:0 netem delay {current_params["delay"]} loss {current_params["loss"]} ; \
-        tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {current_params["bandwidth"]} burst {current_params["burst"]} latency {initial_buffer}'"""
-
-        # Execute the command in the container
-        exec_result = src.container.exec_run(cmd)
-
-        if exec_result.exit_code != 0:
-            raise Exception(
-                {   
-                    "node": src.name,
-                    "cmd": cmd,
-                    "output": exec_result.output.decode("utf-8"),
-                    "exit_code": exec_result.exit_code,
-                }
-            )
+    # Validate and get identifiers
+    src, dst = validate_and_get_NodeIDs(request.src, request.dst)
 
-        # Return the output of the command
-        return {
-            "output": exec_result.output.decode("utf-8"),
-            "exit_code": exec_result.exit_code,
-        }
+    # Get the container object and interface
+    interface = get_interface_from_to(src, dst)
+
+    # Check the current link state to preserve existing values
+    current_params = check_link_state(src.name, dst.name)
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    # Get the initial buffer value from the configuration
+    initial_buffer = config.LAB_LINKS[frozenset({src.name, dst.name})]["buffer"]
 
+    # Command to reset buffer while preserving other values
+    cmd = f"""/bin/bash -c '
+    tc qdisc del dev {interface} root || true; \
+    tc qdisc add dev {interface} root handle 1:0 netem delay {current_params["delay"]} loss {current_params["loss"]} ; \
+    tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {current_params["bandwidth"]} burst {current_params["burst"]} latency {initial_buffer}'"""
 
+    # Execute the command in the container
+    exec_result = exec_in_container(src.container, cmd, check=True)
+
+
+    # Return the output of the command
+    return {
+        "output": exec_result.output.decode("utf-8"),
+        "exit_code": exec_result.exit_code,
+    }
+
+
+@handle_errors
 def reset_link(request: config.RemoveChangeRequest):
     """Reset the link parameters to their initial values.
 
@@ -1950,45 +2018,395 @@ def reset_link(request: config.RemoveChangeRequest):
     Raises:
         HTTPException: If operation fails
     """
-    try:
-        # Validate and get identifiers
-        src, dst = validate_and_get_NodeIDs(request.src, request.dst)
-
-        # Get the container object and interface
-        interface = get_interface_from_to(src, dst)
-
-        # Get the initial values from the configuration
-        initial_params = config.LAB_LINKS[frozenset({src.name, dst.name})]
-
-        # Command to reset link parameters to initial values
-        cmd = f"""/bin/bash -c '
-        tc qdisc del dev {interface} root || true; \
-        tc qdisc add dev {interface} root handle 1:0 netem delay {initial_params["delay"]} loss {initial_params["loss"]} ; \
-        tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {initial_params["bandwidth"]} burst {initial_params["burst"]} latency {initial_params["buffer"]}'"""
-
-        # Execute the command in the container
-        exec_result = src.container.exec_run(cmd)
-
-        if exec_result.exit_code != 0:
-            raise Exception(
-                {   
-                    "node": src.name,
-                    "cmd": cmd,
-                    "output": exec_result.output.decode("utf-8"),
-                    "exit_code": exec_result.exit_code,
-                }
-            )
-        # Return the output of the command
-        return {
-            "output": exec_result.output.decode("utf-8"),
-            "exit_code": exec_result.exit_code,
+    # Validate and get identifiers
+    src, dst = validate_and_get_NodeIDs(request.src, request.dst)
+
+    # Get the container object and interface
+    interface = get_interface_from_to(src, dst)
+
+    # Command to reset link parameters to initial values
+    cmd = f"/bin/bash -c '{reset_link_script(src, dst, interface)}'"
+
+    # Execute the command in the container
+    exec_result = exec_in_container(src.container, cmd, check=True)
+
+    # Return the output of the command
+    return {
+        "output": exec_result.output.decode("utf-8"),
+        "exit_code": exec_result.exit_code,
+    }
+
+
+def reset_link_script(src: NodeID, dst: NodeID, interface: str):
+    """Shell commands that restore the initial qdiscs of the interface from src to dst.
+
+    Args:
+        src: Source NodeID object
+        dst: Destination NodeID object
+        interface: Interface of src towards dst
+
+    Returns:
+        str: Commands, the exit code is the one of the last tc call
+    """
+    # Get the initial values from the configuration
+    initial_params = config.LAB_LINKS[frozenset({src.name, dst.name})]
+    return (
+        f"tc qdisc del dev {interface} root || true; "
+        f"tc qdisc add dev {interface} root handle 1:0 netem delay {initial_params['delay']} loss {initial_params['loss']} ; "
+        f"tc qdisc add dev {interface} parent 1:1 handle 10: tbf rate {initial_params['bandwidth']} "
+        f"burst {initial_params['burst']} latency {initial_params['buffer']}"
+    )
+
+
+RESET_FAILED_MARKER = "__RESET_FAILED__"
+
+
+@handle_errors
+def reset_links(request: config.ResetLinksRequest):
+    """Reset the parameters of many links to their initial values at once.
+
+    The links are grouped by the router they are configured on, every router resets
+    all its interfaces within a single docker exec and the routers are reset concurrently.
+    A link that can't be reset doesn't stop the others, it is reported instead.
+
+    Args:
+        request: ResetLinksRequest with the links, by default all links in both directions
+
+    Returns:
+        dict: Number of reset links and the failed ones with their error
+    """
+    if request.links is None:
+        pairs = [(src, dst) for link in config.LAB_LINKS for src in link for dst in link if src != dst]
+    else:
+        pairs = [(link.src, link.dst) for link in request.links]
+    by_router = {}
+    for src, dst in pairs:
+        by_router.setdefault(src, []).append(dst)
+
+    def reset_router(item):
+        src_name, dst_names = item
+        scripts = []
+        failed = []
+        try:
+            src = validate_and_get_NodeID(src_name, "router")
+        except Exception as e:
+            return [{"src": src_name, "dst": dst_name, "error": str(e)} for dst_name in dst_names]
+        for dst_name in dst_names:
+            try:
+                dst = validate_and_get_NodeID(dst_name, "router")
+                script = reset_link_script(src, dst, get_interface_from_to(src, dst))
+            except Exception as e:
+                failed.append({"src": src_name, "dst": dst_name, "error": str(e)})
+                continue
+            # Every link is reset on its own, a failing one only prints its marker
+            scripts.append(f"{{ {script} ; }} || echo {RESET_FAILED_MARKER}{dst_name}")
+        if not scripts:
+            return failed
+        try:
+            exec_result = exec_in_container(src.container, f"/bin/bash -c '{'; '.join(scripts)}'", check=True)
+        except Exception as e:
+            reset = [dst_name for dst_name in dst_names if dst_name not in {entry["dst"] for entry in failed}]
+            return failed + [{"src": src_name, "dst": dst_name, "error": str(e)} for dst_name in reset]
+        for line in exec_result.output.decode("utf-8").splitlines():
+            if line.startswith(RESET_FAILED_MARKER):
+                failed.append({"src": src_name, "dst": line[len(RESET_FAILED_MARKER):], "error": "tc failed"})
+        return failed
+
+    failed = [entry for entries in run_in_parallel(reset_router, by_router.items()) for entry in entries]
+    return {"reset": len(pairs) - len(failed), "failed": failed}
+
+
+@handle_errors
+def set_link_state(request: config.LinkStateRequest, state: str):
+    """Bring the interfaces on both ends of a link up or down and measure convergence.
+
+    In contrast to adding 100% loss, changing the link state is immediately visible
+    to FRR, so OSPF and BGP react without waiting for their hold timers to expire.
+
+    Args:
+        request: LinkStateRequest object with link details
+        state: "up" or "down"
+
+    Returns:
+        dict: Interfaces that were changed, the time it took to change them and,
+        if requested, the measured convergence time
+
+    Raises:
+        HTTPException: If operation fails
+    """
+    # Validate and get identifiers
+    src, dst = validate_and_get_NodeIDs(request.src, request.dst)
+    link = frozenset({src.name, dst.name})
+
+    # While the link is down `ip route get` would return another interface,
+    # so reuse the ones we found when bringing the link down
+    if link in config.DOWN_LINKS:
+        interfaces = config.DOWN_LINKS[link]
+    else:
+        interfaces = {
+            src.name: get_interface_from_to(src, dst),
+            dst.name: get_interface_from_to(dst, src),
         }
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))  # noqa: B904
-    except docker.errors.NotFound:  # type: ignore
-        raise HTTPException(status_code=404, detail="Container not found")  # noqa: B904
-    except docker.errors.APIError as e:  # type: ignore
-        raise HTTPException(status_code=500, detail="Docker: " + str(e))  # noqa: B904
+    routers = []
+    baseline = {}
+    if request.measure_convergence:
+        routers = [validate_and_get_NodeID(name, "router") for name in config.LAB_NAMES]
+        baseline = get_lab_adjacency_state(routers)
+
+    def toggle(node: NodeID):
+        cmd = f"ip link set dev {interfaces[node.name]} {state}"
+        exec_in_container(node.container, cmd, check=True)
+
+    # Change both ends at the same time, like a cable being unplugged
+    start = time.monotonic()
+    run_in_parallel(toggle, [src, dst])
+    toggle_time = time.monotonic() - start
 
+    if state == "down":
+        config.DOWN_LINKS[link] = interfaces
+    else:
+        config.DOWN_LINKS.pop(link, None)
+
+    result = {
+        "src": src.name,
+        "dst": dst.name,
+        "state": state,
+        "interfaces": interfaces,
+        "toggle_time": toggle_time,
+    }
+    if request.measure_convergence:
+        result.update(
+            measure_convergence(
+                routers,
+                baseline,
+                start,
+                request.convergence_timeout,
+                request.poll_interval,
+                request.stable_polls,
+            )
+        )
+    return result
+
+
+def link_down(request: config.LinkStateRequest):
+    """Bring a link down on both ends, see `set_link_state`."""
+    return set_link_state(request, "down")
+
+
+def link_up(request: config.LinkStateRequest):
+    """Bring a link back up on both ends, see `set_link_state`."""
+    return set_link_state(request, "up")
+
+
+def run_timed_netem_change(src: NodeID, dst: NodeID, current_params: dict, netem_params: str, duration: float):
+    """Change the netem parameters of a link for `duration` ms and restore them afterwards.
+
+    Changing the netem qdisc in place keeps the tbf qdisc below it. The change, the sleep and
+    the restore all happen in a single exec in the router, so the length of the impulse doesn't
+    depend on the round trips to the API. The sleep is shortened by the time the first tc
+    command took, as the restore takes about as long to become active.
+
+    Args:
+        src: NodeID of the router the link starts at
+        dst: NodeID of the router the link ends at
+        current_params: Current parameters of the link (see `check_link_state`), restored after the impulse
+        netem_params: netem parameters during the impulse, e.g. "delay 5ms loss 100%"
+        duration: Length of the impulse in ms
+
+    Returns:
+        dict: Requested and measured duration in ms (measured is None if the router's date doesn't support %N)
+    """
+    interface = get_interface_from_to(src, dst)
+    netem_restore = f'delay {current_params["delay"]} loss {current_params["loss"]}'
+    tbf = f'rate {current_params["bandwidth"]} burst {current_params["burst"]} latency {current_params["buffer"]}'
+    # Fall back to setting up the qdiscs if the link doesn't have a netem qdisc yet
+    setup = f"{{ tc qdisc del dev {interface} root ; tc qdisc add dev {interface} root handle 1:0 netem {netem_params} && tc qdisc add dev {interface} parent 1:1 handle 10: tbf {tbf} ; }}"
+    script = "; ".join(
+        [
+            "t0=$(date +%s%N)",
+            f"{{ tc qdisc change dev {interface} root handle 1:0 netem {netem_params} || {setup} ; }}",
+            "t1=$(date +%s%N)",
+            # Computed with bash builtins to not lose time forking, the time of the first tc command is
+            # only subtracted if date printed nanoseconds
+            f"ns={int(duration * 1000000)}",
+            'case "$t0$t1" in *[!0-9]*) ;; *) ns=$((ns - (t1 - t0))) ;; esac',
+            "[ $ns -lt 0 ] && ns=0",
+            'printf -v secs "%d.%09d" $((ns / 1000000000)) $((ns % 1000000000))',
+            "sleep $secs",
+            f"tc qdisc change dev {interface} root handle 1:0 netem {netem_restore}",
+            "status=$?",
+            "t2=$(date +%s%N)",
+            "echo $t1 $t2",
+            "exit $status",
+        ]
+    )
+    cmd = f"/bin/bash -c '{script}'"
+    # The deadline has to cover the impulse itself
+    exec_result = exec_in_container(src.container, cmd, timeout=config.EXEC_TIMEOUT + duration / 1000, check=True)
 
+    output = exec_result.output.decode("utf-8")
+    try:
+        t1, t2 = (int(value) for value in output.split()[-2:])
+        measured = (t2 - t1) / 1000000
+    except ValueError:
+        measured = None
+    return {"requested_duration": duration, "measured_duration": measured, "output": output}
+
+
+@handle_errors
+def loss_burst(request: config.LossBurstRequest):
+    """Drop packets on a link for a precisely timed burst.
+
+    Args:
+        request: LossBurstRequest object with link details, duration in ms and loss rate during the burst
+
+    Returns:
+        dict: Requested and measured duration of the burst in ms
+
+    Raises:
+        HTTPException: If operation fails
+    """
+    src, dst = validate_and_get_NodeIDs(request.src, request.dst)
+    current_params = check_link_state(src.name, dst.name)
+    netem_params = f'delay {current_params["delay"]} loss {request.loss_rate}%'
+    return run_timed_netem_change(src, dst, current_params, netem_params, request.duration)
+
+
+@handle_errors
+def delay_spike(request: config.DelaySpikeRequest):
+    """Add a rectangular delay spike to a link.
+
+    Args:
+        request: DelaySpikeRequest object with link details, added delay in ms and duration in ms
+
+    Returns:
+        dict: Requested and measured duration of the spike in ms
+
+    Raises:
+        HTTPException: If operation fails
+    """
+    src, dst = validate_and_get_NodeIDs(request.src, request.dst)
+    current_params = check_link_state(src.name, dst.name)
+    spike_delay = parse_time_ms(current_params["delay"]) + request.delay
+    netem_params = f'delay {spike_delay}ms loss {current_params["loss"]}'
+    return run_timed_netem_change(src, dst, current_params, netem_params, request.duration)
+
+
+@handle_errors
+def get_routing_state(max_age: float = None):
+    """Get the routing state (FIB, OSPF neighbors, BGP paths) of all routers.
+
+    The state is collected from all routers concurrently and cached, requests
+    within `max_age` seconds of the last collection return the cached state.
+
+    Args:
+        max_age: Maximum age of the cached state in seconds, defaults to ROUTING_STATE_TTL
+
+    Returns:
+        dict: Collection time, age and the normalized routing state per router.
+        Routers whose state could not be collected contain an "error" instead.
+
+    Raises:
+        HTTPException: If operation fails
+    """
+    if max_age is None:
+        max_age = config.ROUTING_STATE_TTL
+    with routing_state_lock:
+        cached = config.ROUTING_STATE
+        if cached["state"] is None or time.monotonic() - cached["collected"] > max_age:
+            routers = [validate_and_get_NodeID(name, "router") for name in config.LAB_NAMES]
+
+            def collect(node: NodeID):
+                try:
+                    return collect_routing_state(node)
+                except Exception as e:
+                    return {"error": str(e)}
+
+            states = run_in_parallel(collect, routers)
+            cached["state"] = {router.name: state for router, state in zip(routers, states)}
+            cached["collected"] = time.monotonic()
+            cached["time"] = calculate_endtime(0)
+
+    return {
+        "time": cached["time"],
+        "age": time.monotonic() - cached["collected"],
+        "routers": cached["state"],
+    }
+
+
+def compute_paths(pairs: list, dst_type: str, max_age: float = None):
+    """Compute the forwarding paths between pairs of nodes from the collected FIBs.
+
+    Args:
+        pairs: List of (src, dst) tuples, src is a router name, dst a node name or IP
+        dst_type: "router" or "host", see get_destination_ip
+        max_age: Maximum age of the routing state in seconds, see get_routing_state
+
+    Returns:
+        dict: Time of the routing state, the computation time in ms and the paths per src and dst
+    """
+    routing_state = get_routing_state(max_age)
+    start = time.perf_counter()
+    routers_state = {
+        router: state for router, state in routing_state["routers"].items() if "error" not in state
+    }
+    fibs = routing.build_fibs(routers_state)
+    owners = routing.build_address_owners(routers_state)
+
+    paths = {}
+    for src, dst in pairs:
+        if src not in config.LAB_NAMES:
+            raise HTTPException(status_code=404, detail=f"Invalid node: {src}")
+        paths.setdefault(src, {})[dst] = routing.resolve_paths(
+            fibs, owners, src, get_destination_ip(dst, dst_type)
+        )
+    return {
+        "time": routing_state["time"],
+        "computation_time": (time.perf_counter() - start) * 1000,
+        "paths": paths,
+    }
+
+
+@handle_errors
+def get_path(src: str, dst: str, dst_type: str = "router", max_age: float = None):
+    """Get the current forwarding path(s) from router `src` to `dst`.
+
+    Args:
+        src: Source router name
+        dst: Destination node name or IP address
+        dst_type: "router" or "host", whether to resolve the path to the router or its host
+        max_age: Maximum age of the routing state in seconds
+
+    Returns:
+        dict: Paths as returned by routing.resolve_paths
+
+    Raises:
+        HTTPException: If operation fails
+    """
+    result = compute_paths([(src, dst)], dst_type, max_age)
+    return {
+        "time": result["time"],
+        "computation_time": result["computation_time"],
+        "src": src,
+        "dst": dst,
+        "paths": result["paths"][src][dst],
+    }
+
+
+@handle_errors
+def get_all_paths(dst_type: str = "router", max_age: float = None):
+    """Get the current forwarding paths between all pairs of nodes.
+
+    Args:
+        dst_type: "router" or "host", whether to resolve the paths to the routers or their hosts
+        max_age: Maximum age of the routing state in seconds
+
+    Returns:
+        dict: src -> dst -> paths as returned by routing.resolve_paths
+
+    Raises:
+        HTTPException: If operation fails
+    """
+    pairs = [(src, dst) for src in config.LAB_NAMES for dst in config.LAB_NAMES if src != dst]
+    return compute_paths(pairs, dst_type, max_age)
@@ -6,16 +6,53 @@ class AbstractEvent(ABC):
     def __init__(self, min_duration: int, max_duration: int):
         self.min_duration = min_duration
         self.max_duration = max_duration
+        # Set by configure(): the nodes and links the event may target, the duration distribution
+        # of the scenario (None draws uniformly between min and max), the shared API client
+        # and schedule_undo(duration, action, args) of the script
+        self.nodes = ()
+        self.links = ()
+        self.duration = None
+        self.client = None
+        self.schedule_undo = None
+
+    def configure(self, nodes: list, links: list, client, schedule_undo, duration=None):
+        """
+        Bind the event to the lab, called once the lab is known and before the event is planned or executed.
+        """
+        self.nodes = nodes
+        self.links = links
+        self.client = client
+        self.schedule_undo = schedule_undo
+        self.duration = duration
 
     @abstractmethod
-    def execute(self, rng: random.Random):
+    def plan(self, rng: random.Random) -> dict:
         """
-        Abstract method to execute the event. Must be implemented by subclasses.
+        Abstract method to draw all random choices of the event (targets, parameters, duration).
+        Must be implemented by subclasses, the returned parameters are stored in the timeline.
+        Targets have to be chosen from self.nodes and self.links.
         """
         pass
 
+    @abstractmethod
+    async def execute(self, params: dict):
+        """
+        Abstract coroutine to execute the event with the planned parameters. Must be implemented by subclasses.
+        """
+        pass
+
+    def draw_duration(self, rng: random.Random):
+        """
+        Draw the duration of a planned event (in seconds).
+        """
+        if self.duration is None:
+            return rng.randint(self.min_duration, self.max_duration)
+        return self.duration.draw(rng)
+
     def get_average_duration(self) -> float:
         """
         Calculate the average duration of the event.
         """
-        return (self.min_duration + self.max_duration) / 2
+        if self.duration is None:
+            return (self.min_duration + self.max_duration) / 2
+        return self.duration.mean()
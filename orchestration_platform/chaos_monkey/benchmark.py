@@ -0,0 +1,238 @@
+"""
+Load benchmark of the orchestration API: drives a mix of endpoints at increasing concurrency and
+reports throughput and latency percentiles per endpoint, so performance changes of the API can be
+compared before and after (see --compare).
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+from datetime import datetime
+
+import event_log
+import http_client
+import simulator
+
+BENCHMARK_VERSION = 1
+# Share of the requests per endpoint
+DEFAULT_MIX = "add_loss=4,set_bandwidth=2,link_state=4,change_ospf_cost=1,execute=1"
+DEFAULT_CONCURRENCY = "1,2,4,8,16,32"
+# Time every concurrency level is measured, after the warm-up
+LEVEL_DURATION = 20  # s
+WARMUP = 2  # s
+PERCENTILES = (50, 95, 99)
+LOGS_DIR = os.path.join(os.path.dirname(__file__), "logs")
+
+
+def plan_request(endpoint: str, rng: random.Random, nodes: list, links: list):
+    """
+    A random request to the endpoint, as (method, path, data).
+    """
+    link = rng.choice(links)
+    src, dst = link["src"], link["dst"]
+    if endpoint == "add_loss":
+        return "POST", "/add_loss", {"src": src, "dst": dst, "loss_rate": rng.randint(0, 5)}
+    if endpoint == "set_bandwidth":
+        return "POST", "/set_bandwidth", {"src": src, "dst": dst, "bandwidth": rng.randint(50, 100)}
+    if endpoint == "link_state":
+        return "GET", "/link_state", {"src": src, "dst": dst}
+    if endpoint == "change_ospf_cost":
+        return "POST", "/change_ospf_cost", {"src": src, "dst": dst, "cost": rng.randint(1, 100)}
+    if endpoint == "execute":
+        return "POST", "/execute", {"node": rng.choice(nodes), "router": True, "cmd": "true", "detach": False}
+    raise ValueError(f"Unknown endpoint {endpoint}")
+
+
+def parse_mix(value: str):
+    """
+    Endpoint weights from "endpoint=weight,endpoint=weight".
+    """
+    mix = {}
+    for entry in value.split(","):
+        endpoint, _, weight = entry.partition("=")
+        mix[endpoint.strip()] = float(weight or 1)
+    rng = random.Random(0)
+    for endpoint in mix:
+        # Fails early for unknown endpoints
+        plan_request(endpoint, rng, ["node"], [{"src": "a", "dst": "b"}])
+    return mix
+
+
+def percentile(values: list, p: float):
+    """
+    Nearest-rank percentile of sorted values.
+    """
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+async def worker(client, rng: random.Random, mix: dict, nodes: list, links: list, samples: list, measure_from: float, until: float):
+    """
+    Send requests back to back until `until` (event loop time), the ones started after `measure_from` are recorded
+    as (endpoint, latency in ms, ok).
+    """
+    loop = asyncio.get_running_loop()
+    endpoints, weights = list(mix), list(mix.values())
+    while loop.time() < until:
+        endpoint = rng.choices(endpoints, weights)[0]
+        method, path, data = plan_request(endpoint, rng, nodes, links)
+        start = loop.time()
+        try:
+            if method == "GET":
+                response = await client.get(path, params=data)
+            else:
+                response = await client.post(path, json=data)
+            ok = response.status_code == 200
+        except Exception:
+            ok = False
+        if start >= measure_from:
+            samples.append((endpoint, (loop.time() - start) * 1000, ok))
+
+
+def summarize(samples: list, duration: float):
+    """
+    Throughput (successful requests per second) and latency percentiles per endpoint and in total.
+    """
+    by_endpoint = {}
+    for endpoint, latency, ok in samples:
+        by_endpoint.setdefault(endpoint, []).append((latency, ok))
+    by_endpoint["total"] = [(latency, ok) for _, latency, ok in samples]
+    summary = {}
+    for endpoint, results in by_endpoint.items():
+        latencies = sorted(latency for latency, _ in results)
+        errors = sum(not ok for _, ok in results)
+        summary[endpoint] = {
+            "requests": len(results),
+            "errors": errors,
+            "throughput": round((len(results) - errors) / duration, 3),
+            **{f"p{p}": round(percentile(latencies, p), 3) for p in PERCENTILES},
+            "max": round(latencies[-1], 3),
+        }
+    return summary
+
+
+async def run_level(client, concurrency: int, args, mix: dict, nodes: list, links: list):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    samples = []
+    # Every worker has its own rng, so a level issues the same requests in every run
+    workers = [
+        worker(client, random.Random(f"{args.seed}:{concurrency}:{i}"), mix, nodes, links, samples, start + args.warmup,
+               start + args.warmup + args.duration)
+        for i in range(concurrency)
+    ]
+    await asyncio.gather(*workers)
+    return {"concurrency": concurrency, "endpoints": summarize(samples, args.duration)} if samples else None
+
+
+def print_level(level: dict, previous: dict = None):
+    print(f"\nConcurrency {level['concurrency']}")
+    print(f"  {'endpoint':<18}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for endpoint, stats in level["endpoints"].items():
+        line = (f"  {endpoint:<18}{stats['throughput']:>10.1f}{stats['p50']:>10.1f}{stats['p95']:>10.1f}"
+                f"{stats['p99']:>10.1f}{stats['errors']:>8}")
+        before = (previous or {}).get(endpoint)
+        if before:
+            # Relative change against the compared report, higher throughput and lower latency are better
+            throughput = (stats["throughput"] / before["throughput"] - 1) * 100 if before["throughput"] else math.nan
+            p95 = (stats["p95"] / before["p95"] - 1) * 100 if before["p95"] else math.nan
+            line += f"   throughput {throughput:+.0f}%, p95 {p95:+.0f}%"
+        print(line)
+
+
+async def main(args):
+    if args.simulate:
+        client = simulator.FakeApi(routers=args.sim_routers)
+    else:
+        client = http_client.ApiClient(args.api_url, pool_size=max(args.concurrency), timeout=args.timeout, retries=0)
+    compared = {}
+    if args.compare:
+        with open(args.compare) as f:
+            compared = {level["concurrency"]: level["endpoints"] for level in json.load(f)["levels"]}
+    try:
+        nodes = (await client.get("/available_routers")).json()["routers"]
+        links = (await client.get("/links")).json()["links"]
+        # Both directions of every link
+        links += [{"src": link["dst"], "dst": link["src"]} for link in links]
+        report = {
+            "version": BENCHMARK_VERSION,
+            "started": datetime.now().isoformat(),
+            "api_url": "simulated" if args.simulate else args.api_url,
+            "lab": (await client.get("/lab")).json(),
+            "revision": event_log.git_revision(),
+            "seed": args.seed,
+            "mix": args.mix,
+            "duration": args.duration,
+            "levels": [],
+        }
+        # The benchmark changes links and OSPF costs, they are reverted at the end
+        snapshot_id = (await client.post("/take_snapshot")).json()["id"]
+        try:
+            for concurrency in args.concurrency:
+                level = await run_level(client, concurrency, args, args.mix, nodes, links)
+                if level is None:
+                    continue
+                report["levels"].append(level)
+                print_level(level, compared.get(concurrency))
+        finally:
+            print("\nResetting the lab...")
+            await client.post("/apply_snapshot", json={"snapshot_id": snapshot_id})
+            await client.post("/reset_links", json={})
+    finally:
+        await client.aclose()
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"Benchmark report written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load benchmark of the orchestration API")
+    parser.add_argument(
+        "--api-url",
+        default="http://localhost:5432",
+        help="Base URL for the API (default: http://localhost:5432)",
+    )
+    parser.add_argument(
+        "--mix", type=parse_mix, default=DEFAULT_MIX, help=f"Share of the requests per endpoint (default: {DEFAULT_MIX})"
+    )
+    parser.add_argument(
+        "--concurrency", type=lambda value: [int(level) for level in value.split(",")], default=DEFAULT_CONCURRENCY,
+        help=f"Concurrent requests of every level (default: {DEFAULT_CONCURRENCY})"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=LEVEL_DURATION, help=f"Seconds every level is measured (default: {LEVEL_DURATION})"
+    )
+    parser.add_argument(
+        "--warmup", type=float, default=WARMUP, help=f"Seconds before every level whose requests aren't measured (default: {WARMUP})"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=42, help="Random seed of the requests (default: 42)"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=http_client.TIMEOUT, help=f"Timeout of API requests in seconds (default: {http_client.TIMEOUT})"
+    )
+    parser.add_argument(
+        "--output", default=None, help="File to write the report to (default: logs/benchmark_<date>.json)"
+    )
+    parser.add_argument(
+        "--compare", default=None, help="Previous report to compare throughput and latency with"
+    )
+    parser.add_argument(
+        "--simulate", action="store_true", help="Run against an in-process fake of the API instead of a lab"
+    )
+    parser.add_argument(
+        "--speedup", type=float, default=60, help="How much faster than real time a simulation runs (default: 60)"
+    )
+    parser.add_argument(
+        "--sim-routers", type=int, default=10, help="Number of routers of the simulated lab (default: 10)"
+    )
+    args = parser.parse_args()
+    if args.output is None:
+        args.output = os.path.join(LOGS_DIR, f"benchmark_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json")
+
+    if args.simulate:
+        simulator.run(main(args), args.speedup)
+    else:
+        asyncio.run(main(args))
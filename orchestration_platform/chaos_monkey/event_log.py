@@ -0,0 +1,104 @@
+import asyncio
+import json
+import os
+import subprocess
+import time
+
+# The buffer is written to disk at least this often, or once it holds FLUSH_SIZE records
+FLUSH_INTERVAL = 1.0  # s
+FLUSH_SIZE = 1000
+
+
+class EventLog:
+    """
+    Buffered JSONL log of a run. Recording only appends to a buffer, a background task writes it
+    to disk in a worker thread, so events never wait for disk I/O.
+    Every record has a monotonic timestamp "t" (seconds since the start of the run, on the event loop clock,
+    which runs accelerated in simulations) and the wall clock time "ts".
+    """
+
+    def __init__(self, path: str, flush_interval: float = FLUSH_INTERVAL, flush_size: int = FLUSH_SIZE):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.buffer = []
+        self.start = None
+        self.flush_needed = asyncio.Event()
+        self.counts = {}
+
+    def record(self, kind: str, **fields):
+        """
+        Add a record of the given kind (eg. "request", "started", "failed") to the log.
+        """
+        now = asyncio.get_running_loop().time()
+        if self.start is None:
+            self.start = now
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        self.buffer.append({"t": round(now - self.start, 6), "ts": round(time.time(), 3), "kind": kind, **fields})
+        if len(self.buffer) >= self.flush_size:
+            self.flush_needed.set()
+
+    async def run(self):
+        """
+        Task writing the buffer periodically, until it is cancelled.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self.flush_needed.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self):
+        self.flush_needed.clear()
+        if not self.buffer:
+            return
+        records, self.buffer = self.buffer, []
+        lines = "".join(json.dumps(record, default=str) + "\n" for record in records)
+        await asyncio.to_thread(self.write, lines)
+
+    def write(self, lines: str):
+        with open(self.path, "a") as f:
+            f.write(lines)
+
+
+class ErrorBudget:
+    """
+    Counts failed requests and events, once more than `max_errors` happened `on_exhausted` is called (once).
+    """
+
+    def __init__(self, max_errors: int, on_exhausted):
+        self.max_errors = max_errors
+        self.on_exhausted = on_exhausted
+        self.errors = 0
+        self.exhausted = False
+
+    def error(self):
+        self.errors += 1
+        if self.max_errors is not None and self.errors > self.max_errors and not self.exhausted:
+            self.exhausted = True
+            self.on_exhausted()
+
+
+def git_revision():
+    """
+    Revision of the checked out chaos monkey, None if it isn't run from a git repository.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=directory, capture_output=True, text=True, timeout=5)
+        if result.returncode != 0:
+            return None
+        # Mark revisions with local changes, the run can't be reproduced from the revision alone
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=directory, capture_output=True, text=True, timeout=5
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    revision = result.stdout.strip()
+    return revision + ("-dirty" if status.stdout.strip() else "")
+
+
+def write_manifest(path: str, manifest: dict):
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=1, default=str)
@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import httpx
+
+# Defaults of the shared client, can be overwritten on the command line
+POOL_SIZE = 32  # Number of kept-alive connections to the API
+TIMEOUT = 60  # s, applying snapshots can take a while
+CONNECT_TIMEOUT = 5  # s
+RETRIES = 2
+RETRY_BACKOFF = 0.1  # s, doubled for every retry
+# Status codes returned by the API when docker is temporarily unavailable, safe to retry for GET requests
+RETRY_STATUS_CODES = (502, 503)
+
+
+class ApiClient:
+    """
+    Shared keep-alive client for all requests to the orchestration API.
+    Connections are pooled, so back-to-back requests (eg. two link changes bracketing a short outage)
+    don't pay for a new TCP connection each. The latency of every request is passed to `on_request`.
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        pool_size: int = POOL_SIZE,
+        timeout: float = TIMEOUT,
+        retries: int = RETRIES,
+        on_request=None,
+    ):
+        self.retries = retries
+        # on_request(method, endpoint, data, status_code, latency_ms, error) is called after every request
+        self.on_request = on_request
+        self.client = httpx.AsyncClient(
+            base_url=api_url,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT),
+            # Retries establishing connections, requests that reached the API are never repeated by the transport
+            transport=httpx.AsyncHTTPTransport(retries=retries),
+        )
+
+    async def request(self, method: str, endpoint: str, **kwargs):
+        """
+        Perform a request, GET requests are additionally retried on RETRY_STATUS_CODES.
+        Raises httpx errors if the request failed.
+        """
+        endpoint = f"/{endpoint.lstrip('/')}"
+        data = kwargs.get("json", kwargs.get("params"))
+        attempts = self.retries + 1 if method == "GET" else 1
+        for attempt in range(attempts):
+            start = time.perf_counter()
+            try:
+                response = await self.client.request(method, endpoint, **kwargs)
+            except httpx.HTTPError as e:
+                self._report(method, endpoint, data, None, start, e)
+                raise
+            self._report(method, endpoint, data, response.status_code, start, None)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == attempts - 1:
+                return response
+            await asyncio.sleep(RETRY_BACKOFF * 2**attempt)
+
+    async def get(self, endpoint: str, params: dict = None):
+        return await self.request("GET", endpoint, params=params)
+
+    async def post(self, endpoint: str, json: dict = None):
+        return await self.request("POST", endpoint, json=json)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def _report(self, method, endpoint, data, status_code, start, error):
+        if self.on_request is not None:
+            latency_ms = (time.perf_counter() - start) * 1000
+            self.on_request(method, endpoint, data, status_code, latency_ms, error)
@@ -0,0 +1,215 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+# Resources are tuples of strings, so sorting them gives the canonical acquisition order
+def link_resource(src: str, dst: str, attribute: str):
+    """
+    Modifying an attribute ("loss" or "delay") of the link from src to dst, held for the duration of a request.
+    """
+    return ("link", src, dst, attribute)
+
+
+def link_use_resource(src: str, dst: str, attribute: str):
+    """
+    Reservation of an attribute of the link from src to dst by a chaos event, held until the event is undone.
+    Elementary losses and delay spikes only need link_resource, so they still hit reserved links.
+    """
+    return ("link_use", src, dst, attribute)
+
+
+def router_resource(node: str):
+    """
+    Reservation of a whole router (eg. while it is disconnected).
+    """
+    return ("router", node)
+
+
+def static_route_resource(node: str, destination: str):
+    """
+    Reservation of a static route on a router, the same route can't be added twice.
+    """
+    return ("static_route", node, destination)
+
+
+class Lease:
+    """
+    A set of resources held by one owner, returned by LockManager.acquire().
+    """
+
+    def __init__(self, resources: tuple, owner: str, since: float):
+        self.resources = resources
+        self.owner = owner
+        self.since = since
+        self.released = False
+
+    def __repr__(self):
+        return f"Lease({self.owner}, {self.resources})"
+
+
+class ResourceState:
+    def __init__(self):
+        self.lease = None
+        # Futures of tasks waiting for the resource, in FIFO order
+        self.waiters = deque()
+        # Contention statistics
+        self.acquired = 0
+        self.contended = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+
+
+class LockManager:
+    """
+    Exclusive locks on links, routers and other resources of the lab.
+    Sets of resources are always acquired in canonical (sorted) order, so events that wait for several
+    resources can't deadlock each other. Must be used from within the running event loop.
+    """
+
+    def __init__(self):
+        self.resources = {}
+
+    async def acquire(self, resources, owner: str = None, timeout: float = None):
+        """
+        Acquire all resources, waiting at most `timeout` seconds in total (None waits forever, 0 doesn't wait).
+
+        Returns:
+            Lease: To be passed to release(), or None if not all resources could be acquired in time
+        """
+        loop = asyncio.get_running_loop()
+        if owner is None:
+            task = asyncio.current_task()
+            owner = task.get_name() if task else "unknown"
+        deadline = None if timeout is None else loop.time() + timeout
+        lease = Lease(tuple(sorted(set(resources))), owner, loop.time())
+        acquired = []
+        try:
+            for resource in lease.resources:
+                if not await self._acquire_one(resource, lease, deadline):
+                    break
+                acquired.append(resource)
+        finally:
+            if len(acquired) != len(lease.resources):
+                # Timed out or cancelled, give back what we already hold
+                for resource in reversed(acquired):
+                    self._release_one(resource)
+        if len(acquired) != len(lease.resources):
+            return None
+        lease.since = loop.time()
+        return lease
+
+    def release(self, lease: Lease):
+        """
+        Release all resources of the lease, waking up the next waiter of every resource.
+        """
+        if lease.released:
+            return
+        lease.released = True
+        for resource in reversed(lease.resources):
+            self._release_one(resource)
+
+    @asynccontextmanager
+    async def locked(self, resources, owner: str = None):
+        """
+        Hold the resources for the duration of the block, waiting as long as necessary.
+        """
+        lease = await self.acquire(resources, owner)
+        try:
+            yield lease
+        finally:
+            self.release(lease)
+
+    async def _acquire_one(self, resource, lease: Lease, deadline):
+        state = self.resources.setdefault(resource, ResourceState())
+        if state.lease is None and not state.waiters:
+            state.lease = lease
+            state.acquired += 1
+            return True
+        state.contended += 1
+        loop = asyncio.get_running_loop()
+        remaining = None if deadline is None else deadline - loop.time()
+        if remaining is not None and remaining <= 0:
+            state.timeouts += 1
+            return False
+        waiter = loop.create_future()
+        state.waiters.append(waiter)
+        start = loop.time()
+        try:
+            await asyncio.wait_for(waiter, remaining)
+        except asyncio.TimeoutError:
+            if waiter.cancelled() or not waiter.done():
+                state.timeouts += 1
+                return False
+            # Handed over right as the timeout expired, keep it
+        except asyncio.CancelledError:
+            # The resource might have been handed over right before the cancellation
+            if waiter.done() and not waiter.cancelled():
+                self._release_one(resource)
+            raise
+        finally:
+            state.wait_time += loop.time() - start
+            if waiter in state.waiters:
+                state.waiters.remove(waiter)
+        state.lease = lease
+        state.acquired += 1
+        return True
+
+    def _release_one(self, resource):
+        state = self.resources[resource]
+        state.lease = None
+        # Hand the resource directly to the next waiter, so that it can't be taken by someone else in between
+        while state.waiters:
+            waiter = state.waiters.popleft()
+            if not waiter.done():
+                state.lease = waiter
+                waiter.set_result(None)
+                return
+
+    def held(self):
+        """
+        Currently held resources with their owner and how long (in seconds) they have been held.
+        """
+        now = asyncio.get_running_loop().time()
+        return [
+            {
+                "resource": resource,
+                "owner": state.lease.owner,
+                "held_for": now - state.lease.since,
+                "waiters": len(state.waiters),
+            }
+            for resource, state in sorted(self.resources.items())
+            if isinstance(state.lease, Lease)
+        ]
+
+    def stats(self):
+        """
+        Contention statistics per resource, sorted by how often the resource was contended.
+        """
+        stats = [
+            {
+                "resource": resource,
+                "acquired": state.acquired,
+                "contended": state.contended,
+                "timeouts": state.timeouts,
+                "wait_time": state.wait_time,
+            }
+            for resource, state in self.resources.items()
+        ]
+        return sorted(stats, key=lambda entry: (-entry["contended"], entry["resource"]))
+
+    def print_held(self):
+        held = self.held()
+        print(f"Held locks: {len(held)}")
+        for entry in held:
+            print(f"  {entry['resource']} by {entry['owner']} for {entry['held_for']:.1f} s ({entry['waiters']} waiting)")
+
+    def print_stats(self, limit: int = 10):
+        stats = self.stats()
+        print(f"Lock contention: {sum(entry['contended'] for entry in stats)} contended, "
+              f"{sum(entry['timeouts'] for entry in stats)} dropped")
+        for entry in stats[:limit]:
+            if entry["contended"] == 0:
+                break
+            print(f"  {entry['resource']}: acquired {entry['acquired']}, contended {entry['contended']}, "
+                  f"dropped {entry['timeouts']}, waited {entry['wait_time']:.2f} s")
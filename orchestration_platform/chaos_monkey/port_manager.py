@@ -1,30 +1,144 @@
-import threading
-import time
+import asyncio
+import heapq
+import itertools
+
+# Leases without a duration that are held longer than this are reported as leaked
+LEAK_AGE = 3600  # s
+
+
+class PortLease:
+    """
+    A port leased on a set of hosts, until `expires` (event loop time) or until it is released.
+    """
+
+    def __init__(self, hosts: tuple, port: int, owner: str, since: float, expires: float = None):
+        self.hosts = hosts
+        self.port = port
+        self.owner = owner
+        self.since = since
+        self.expires = expires
+        self.released = False
+
+    def __repr__(self):
+        return f"PortLease({self.port} on {self.hosts}, {self.owner})"
+
 
 class PortManager:
+    """
+    Allocates the ports of the flowgrind daemons, every host has its own pool of ports.
+    A traffic session needs the same port on the server and all of its clients.
+    Expiring leases are kept in a single heap, served by one timer on the event loop.
+    Must be called from within the running event loop.
+    """
+
     def __init__(self, start_port, end_port):
-        self.free_ports = set(range(start_port, end_port + 1))
-        self.lock = threading.Lock()  # To ensure thread safety
+        self.all_ports = range(start_port, end_port + 1)
+        # host -> free ports, pools are created when a host is first used
+        self.free_ports = {}
+        # (host, port) -> lease
+        self.leases = {}
+        # (expires, seq, lease), entries of released or renewed leases are skipped when they come up
+        self.expiry_heap = []
+        self.seq = itertools.count()
+        self.timer = None
+        self.expired = 0
 
-    def get_port(self, duration=None):
-        """
-        Get a free port. If a duration is specified, the port will be automatically returned after the duration.
+    def pool(self, host: str):
+        if host not in self.free_ports:
+            self.free_ports[host] = set(self.all_ports)
+        return self.free_ports[host]
+
+    def get_port(self, hosts, duration=None, owner: str = None):
         """
-        with self.lock:
-            if not self.free_ports:
-                return False
-            port = self.free_ports.pop()
+        Lease a port that is free on all hosts. If a duration is specified, the lease expires after the duration,
+        otherwise it has to be released.
 
-        # Schedule the port to be returned after the specified duration
+        Returns:
+            PortLease: The lease, or None if there is no port that is free on all hosts
+        """
+        hosts = tuple(dict.fromkeys(hosts))
+        pools = sorted((self.pool(host) for host in hosts), key=len)
+        candidates = pools[0].intersection(*pools[1:])
+        if not candidates:
+            return None
+        port = min(candidates)
+        if owner is None:
+            task = asyncio.current_task()
+            owner = task.get_name() if task else "unknown"
+        lease = PortLease(hosts, port, owner, asyncio.get_running_loop().time())
+        for host in hosts:
+            self.free_ports[host].remove(port)
+            self.leases[(host, port)] = lease
         if duration is not None:
-            threading.Timer(duration, self.return_port, args=(port,)).start()
+            self.renew(lease, duration)
+        return lease
+
+    def renew(self, lease: PortLease, duration: float):
+        """
+        Let the lease expire `duration` seconds from now instead.
+        """
+        if lease.released:
+            raise ValueError(f"{lease} was already released")
+        lease.expires = asyncio.get_running_loop().time() + duration
+        heapq.heappush(self.expiry_heap, (lease.expires, next(self.seq), lease))
+        if self.expiry_heap[0][2] is lease:
+            self.schedule_timer()
+
+    def release(self, lease: PortLease):
+        """
+        Return the port of the lease to the pools of its hosts.
+        """
+        if lease.released:
+            return
+        lease.released = True
+        for host in lease.hosts:
+            del self.leases[(host, lease.port)]
+            self.free_ports[host].add(lease.port)
+
+    def schedule_timer(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        # Don't wake up for leases that were released or renewed since
+        while self.expiry_heap and self.is_stale(self.expiry_heap[0]):
+            heapq.heappop(self.expiry_heap)
+        if self.expiry_heap:
+            self.timer = asyncio.get_running_loop().call_at(self.expiry_heap[0][0], self.expire)
+
+    @staticmethod
+    def is_stale(entry):
+        expires, _, lease = entry
+        return lease.released or lease.expires != expires
 
-        return port
+    def expire(self):
+        """
+        Release all leases whose time has come.
+        """
+        self.timer = None
+        now = asyncio.get_running_loop().time()
+        while self.expiry_heap and self.expiry_heap[0][0] <= now:
+            entry = heapq.heappop(self.expiry_heap)
+            if self.is_stale(entry):
+                continue
+            self.release(entry[2])
+            self.expired += 1
+        self.schedule_timer()
+
+    def held(self):
+        """
+        All leases that are currently held.
+        """
+        return list({id(lease): lease for lease in self.leases.values()}.values())
 
-    def return_port(self, port):
+    def leaked(self, max_age: float = LEAK_AGE):
         """
-        Return a port back to the pool.
+        Leases without expiry that have been held longer than max_age seconds, they were probably never released.
         """
-        with self.lock:
-            self.free_ports.add(port)
-            print(f"Port {port} returned to the pool.")
+        now = asyncio.get_running_loop().time()
+        return [lease for lease in self.held() if lease.expires is None and now - lease.since > max_age]
+
+    def print_stats(self):
+        held = self.held()
+        print(f"Ports: {len(held)} leases held on {len(self.free_ports)} hosts, {self.expired} expired")
+        for lease in self.leaked():
+            print(f"  leaked: {lease}")
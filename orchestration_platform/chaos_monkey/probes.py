@@ -0,0 +1,354 @@
+import asyncio
+import bisect
+import gzip
+import json
+import math
+import re
+import statistics
+
+PROBES_VERSION = 1
+# Time between two probe rounds, every round pings all pairs with a single /execute_batch request
+PROBE_INTERVAL = 2  # s
+# Echo requests per pair and round
+PING_COUNT = 3
+PING_SPACING = 0.2  # s
+# Rounds are stamped with their start, the pings of a round still see changes made until this much later
+PROBE_DURATION = PING_COUNT * PING_SPACING  # s
+# Rounds measured before the timeline starts, the median RTT of a pair is its baseline
+BASELINE_ROUNDS = 5
+# Events without a duration change the lab until the teardown, their impact is measured within this window
+PERMANENT_EVENT_WINDOW = 30  # s
+# Time after the end of an event that still counts towards its impact, eg. until routing converged again
+SETTLE_TIME = 5  # s
+# A pair counts as affected if its RTT is this much higher than just before the event
+INFLATION_THRESHOLD = 1.5
+
+# One row per pair and round, t is relative to the start of the timeline
+COLUMNS = (
+    "t",  # s
+    "src",
+    "dst",
+    "sent",  # None if the probe couldn't be run
+    "received",
+    "rtt_avg",  # ms, None without replies
+)
+
+PING_SUMMARY = re.compile(r"(\d+) packets transmitted, (\d+) (?:packets )?received")
+PING_RTT = re.compile(r"= [\d.]+/([\d.]+)/")
+
+
+def ping_command(dst_ip: str):
+    return f"ping -q -n -c {PING_COUNT} -i {PING_SPACING} -W 1 {dst_ip}"
+
+
+def parse_ping(result: dict):
+    """
+    Parse the summary of ping in a result of /execute_batch.
+
+    Returns:
+        tuple: (sent, received, average RTT in ms or None), None if ping didn't run
+    """
+    if "error" in result:
+        return None
+    summary = PING_SUMMARY.search(result["output"])
+    if not summary:
+        return None
+    rtt = PING_RTT.search(result["output"])
+    return int(summary.group(1)), int(summary.group(2)), float(rtt.group(1)) if rtt else None
+
+
+class Probes:
+    """
+    Measures reachability and RTT between host pairs at a fixed cadence during a run, and computes
+    the impact of every timeline event from the measured series.
+    """
+
+    def __init__(self, pairs: list, host_ips: dict, path: str, interval: float = PROBE_INTERVAL):
+        self.pairs = pairs
+        self.path = path
+        self.interval = interval
+        self.commands = [{"node": src, "router": False, "cmd": ping_command(host_ips[dst])} for src, dst in pairs]
+        self.columns = {column: [] for column in COLUMNS}
+        # (src, dst) -> median RTT in ms before the timeline started
+        self.baseline = {}
+        self.rounds = 0
+        self.failed = 0
+        self.skipped = 0
+
+    async def probe(self, client):
+        """
+        Ping all pairs once, returns the parsed result of every pair or None if the request failed.
+        """
+        try:
+            response = await client.post(
+                "/execute_batch", json={"commands": self.commands, "timeout": PROBE_DURATION + 2}
+            )
+        except Exception as e:
+            print(f"Probes: {e}")
+            return None
+        if response.status_code != 200:
+            return None
+        return [parse_ping(result) for result in response.json()["results"]]
+
+    async def measure_baseline(self, client, rounds: int = BASELINE_ROUNDS):
+        loop = asyncio.get_running_loop()
+        rtts = {pair: [] for pair in self.pairs}
+        for _ in range(rounds):
+            start = loop.time()
+            for pair, sample in zip(self.pairs, await self.probe(client) or []):
+                if sample is not None and sample[2] is not None:
+                    rtts[pair].append(sample[2])
+            await asyncio.sleep(max(0, start + self.interval - loop.time()))
+        self.baseline = {pair: statistics.median(values) for pair, values in rtts.items() if values}
+        unreachable = [pair for pair in self.pairs if pair not in self.baseline]
+        print(f"Probes: baseline of {len(self.baseline)} pairs measured, {len(unreachable)} unreachable {unreachable or ''}")
+
+    async def run(self, client, start: float, stop_event: asyncio.Event):
+        """
+        Task probing every `interval` seconds from `start` (event loop time of the start of the timeline) on.
+        Rounds that take longer than the interval make the following ones be skipped, instead of piling up requests.
+        """
+        loop = asyncio.get_running_loop()
+        next_round = start
+        while not stop_event.is_set():
+            timeout = next_round - loop.time()
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout)
+                    return
+                except asyncio.TimeoutError:
+                    pass
+            t = loop.time() - start
+            self.store(t, await self.probe(client))
+            next_round += self.interval
+            if next_round < loop.time():
+                missed = math.ceil((loop.time() - next_round) / self.interval)
+                self.skipped += missed
+                next_round += missed * self.interval
+
+    def store(self, t: float, samples: list):
+        self.rounds += 1
+        if samples is None:
+            self.failed += 1
+            samples = [None] * len(self.pairs)
+        for (src, dst), sample in zip(self.pairs, samples):
+            sent, received, rtt = sample if sample is not None else (None, None, None)
+            row = {"t": round(t, 3), "src": src, "dst": dst, "sent": sent, "received": received, "rtt_avg": rtt}
+            for column in COLUMNS:
+                self.columns[column].append(row[column])
+
+    def series(self):
+        """
+        (src, dst) -> rows (t, sent, received, rtt_avg), ordered by time
+        """
+        series = {pair: [] for pair in self.pairs}
+        for row in zip(*(self.columns[column] for column in COLUMNS)):
+            series[(row[1], row[2])].append((row[0], *row[3:]))
+        return series
+
+    def state_before(self, pair: tuple, rows: list, times: list, t: float):
+        """
+        Whether a pair got replies in its last round before t and the RTT measured in this round. Before the first
+        round, pairs with a baseline are up with their baseline RTT.
+        """
+        for _, sent, received, rtt in reversed(rows[: bisect.bisect_left(times, t)]):
+            if sent is not None:
+                return received > 0, rtt
+        return pair in self.baseline, self.baseline.get(pair)
+
+    def outages(self, rows: list):
+        """
+        Runs of rounds in which a pair got no replies at all, as (start, duration in s).
+        """
+        outages = []
+        start = last = None
+        for t, sent, received, _ in rows:
+            if sent is None:
+                continue
+            if received == 0:
+                start = t if start is None else start
+                last = t
+            elif start is not None:
+                outages.append((start, last - start + self.interval))
+                start = None
+        if start is not None:
+            outages.append((start, last - start + self.interval))
+        return outages
+
+    def inflations(self, pair: tuple, rows: list):
+        """
+        Runs of rounds in which the RTT of a pair was INFLATION_THRESHOLD times higher than in the round before the run,
+        as (start, duration in s). Rounds without replies neither start nor end a run.
+        """
+        inflations = []
+        reference = self.baseline.get(pair)
+        start = last = None
+        for t, _, _, rtt in rows:
+            if rtt is None:
+                continue
+            if reference and rtt > INFLATION_THRESHOLD * reference:
+                start = t if start is None else start
+                last = t
+                continue
+            if start is not None:
+                inflations.append((start, last - start + self.interval))
+                start = None
+            reference = rtt
+        if start is not None:
+            inflations.append((start, last - start + self.interval))
+        return inflations
+
+    def impact(self, events: list, event_duration):
+        """
+        Impact of every event on the probed pairs, measured from its start until SETTLE_TIME after its end.
+        Only pairs that got replies just before the event started count, and only outages that started within
+        the window. Events that were undone more than SETTLE_TIME before an outage ended can't have caused it
+        alone, unless no event explains its length. An outage that more than one event can have caused isn't
+        attributed to any of them alone, it is reported as shared outage of all of them.
+        RTTs are compared with the RTT of the pair just before the event started, and runs of inflated RTTs are
+        attributed like outages, so changes that are never undone (eg. an increased delay) don't count towards the
+        impact of later or shorter overlapping events.
+
+        Args:
+            events: Timeline events that change the lab
+            event_duration: Function returning the duration of an event in seconds, None for permanent changes
+
+        Returns:
+            list: Per event {"event_id", "type", "time", "window", "down_before" (pairs without replies just before
+                  the start), "overlapping_events" (ids of the events whose window overlaps), "outage" (longest outage
+                  in s only this event can have caused), "shared_outage" (longest outage that started during an
+                  overlapping event as well), "affected_pairs", "loss" (fraction of lost replies), "latency_inflation"
+                  (highest RTT / RTT before the start, without runs of inflated RTTs caused by other events)}
+        """
+        # Compare the end of the pings of every round with the events
+        series = {pair: [(t + PROBE_DURATION, *row) for t, *row in rows] for pair, rows in self.series().items()}
+        times = {pair: [row[0] for row in rows] for pair, rows in series.items()}
+        outages = {pair: self.outages(rows) for pair, rows in series.items()}
+        inflations = {pair: self.inflations(pair, rows) for pair, rows in series.items()}
+        windows = []
+        # Events without a duration can cause outages and inflated RTTs of any length
+        permanent = []
+        for event in events:
+            duration = event_duration(event)
+            begin = event["time"]
+            windows.append((begin, begin + (PERMANENT_EVENT_WINDOW if duration is None else duration) + SETTLE_TIME))
+            permanent.append(duration is None)
+        # State and RTT of every pair just before every event
+        before = [
+            {pair: self.state_before(pair, rows, times[pair], begin) for pair, rows in series.items()}
+            for begin, _ in windows
+        ]
+        up = [{pair: pair_up for pair, (pair_up, _) in state.items()} for state in before]
+
+        def causes(pair, start, length):
+            """
+            Events that can have caused an outage or inflation of a pair: the pair was up before them and it started
+            within their window. If any of them lasted until it ended, only those.
+            """
+            candidates = [
+                index for index, (begin, end) in enumerate(windows) if begin <= start <= end and up[index][pair]
+            ]
+            lasting = [index for index in candidates if permanent[index] or start + length <= windows[index][1]]
+            return lasting or candidates
+
+        impacts = []
+        for index, (event, (begin, end)) in enumerate(zip(events, windows)):
+            outage = shared_outage = 0
+            sent = received = 0
+            inflation = None
+            affected = []
+            for pair, rows in series.items():
+                pair_up, rtt_before = before[index][pair]
+                if not pair_up:
+                    continue
+                pair_affected = False
+                for start, length in outages[pair]:
+                    if not begin <= start <= end:
+                        continue
+                    outage_causes = causes(pair, start, length)
+                    if index not in outage_causes:
+                        continue
+                    pair_affected = True
+                    if outage_causes == [index]:
+                        outage = max(outage, length)
+                    else:
+                        shared_outage = max(shared_outage, length)
+                # Inflated RTTs of this window that other events caused
+                foreign = [
+                    (start, start + length)
+                    for start, length in inflations[pair]
+                    if start <= end
+                    and begin < start + length
+                    and not (begin <= start and index in causes(pair, start, length))
+                ]
+                window = rows[bisect.bisect_left(times[pair], begin) : bisect.bisect_right(times[pair], end)]
+                for t, pair_sent, pair_received, rtt in window:
+                    if pair_sent is None:
+                        continue
+                    sent += pair_sent
+                    received += pair_received
+                    if pair_received < pair_sent:
+                        pair_affected = True
+                    if rtt is not None and rtt_before and not any(start <= t < stop for start, stop in foreign):
+                        ratio = rtt / rtt_before
+                        inflation = ratio if inflation is None else max(inflation, ratio)
+                        pair_affected = pair_affected or ratio > INFLATION_THRESHOLD
+                if pair_affected:
+                    affected.append(f"{pair[0]} {pair[1]}")
+            impacts.append(
+                {
+                    "event_id": event["id"],
+                    "type": event["type"],
+                    "time": begin,
+                    "window": round(end - begin, 3),
+                    "down_before": [f"{src} {dst}" for (src, dst), pair_up in up[index].items() if not pair_up],
+                    "overlapping_events": [
+                        other["id"]
+                        for other, (other_begin, other_end) in zip(events, windows)
+                        if other is not event and other_begin <= end and begin <= other_end
+                    ],
+                    "outage": round(outage, 3),
+                    "shared_outage": round(shared_outage, 3),
+                    "affected_pairs": affected,
+                    "loss": round(1 - received / sent, 4) if sent else None,
+                    "latency_inflation": round(inflation, 3) if inflation is not None else None,
+                }
+            )
+        return impacts
+
+    def save(self, timeline_path: str, impacts: list):
+        with gzip.open(self.path, "wt") as f:
+            json.dump(
+                {
+                    "version": PROBES_VERSION,
+                    "timeline": timeline_path,
+                    "interval": self.interval,
+                    "baseline": {f"{src} {dst}": rtt for (src, dst), rtt in self.baseline.items()},
+                    "rows": len(self.columns["t"]),
+                    "columns": self.columns,
+                    "impact": impacts,
+                },
+                f,
+                separators=(",", ":"),
+            )
+        print(f"Probes: {self.rounds} rounds of {len(self.pairs)} pairs ({self.failed} failed, {self.skipped} skipped) "
+              f"written to {self.path}")
+        worst = sorted(
+            impacts, key=lambda impact: (impact["outage"], impact["shared_outage"], len(impact["affected_pairs"])), reverse=True
+        )[:5]
+        for impact in worst:
+            if impact["outage"] or impact["shared_outage"] or impact["affected_pairs"]:
+                line = (f"  {impact['type']}#{impact['event_id']} at {impact['time']:.1f}s: outage {impact['outage']:.1f}s, "
+                        f"{len(impact['affected_pairs'])} pairs affected, latency x{impact['latency_inflation']}")
+                if impact["overlapping_events"]:
+                    line += (f" ({len(impact['overlapping_events'])} overlapping events, "
+                             f"shared outage {impact['shared_outage']:.1f}s)")
+                print(line)
+
+
+def load_probes(path: str):
+    with gzip.open(path, "rt") as f:
+        probes = json.load(f)
+    if probes.get("version") != PROBES_VERSION:
+        raise ValueError(f"Unsupported probes version {probes.get('version')} in {path}")
+    return probes
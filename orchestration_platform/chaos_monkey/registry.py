@@ -0,0 +1,51 @@
+import importlib
+import importlib.metadata
+import sys
+
+# Packages can provide chaos events through this entry point group, eg. in their pyproject.toml:
+# [project.entry-points."chaos_monkey.events"]
+# flap_link = "my_package.events:FlapLinkEvent"
+ENTRY_POINT_GROUP = "chaos_monkey.events"
+
+# Event name (the class name, which is also the event type in timelines) -> AbstractEvent subclass
+EVENTS = {}
+
+
+def register(cls):
+    """
+    Class decorator adding a chaos event to the registry.
+    """
+    if cls.__name__ in EVENTS and EVENTS[cls.__name__] is not cls:
+        raise ValueError(f"Chaos event {cls.__name__} is already registered by {EVENTS[cls.__name__].__module__}")
+    EVENTS[cls.__name__] = cls
+    return cls
+
+
+def load_plugins(modules=(), directory: str = None):
+    """
+    Register the chaos events of all installed entry points and of the given modules (eg. from a scenario).
+    Entry points may refer to an event class or to a module whose classes use @register.
+    The modules are also searched in `directory`, eg. next to the scenario file.
+
+    Returns:
+        list: Names of the loaded entry points and modules
+    """
+    loaded = []
+    for entry_point in importlib.metadata.entry_points(group=ENTRY_POINT_GROUP):
+        plugin = entry_point.load()
+        if isinstance(plugin, type):
+            register(plugin)
+        loaded.append(entry_point.value)
+    if modules and directory and directory not in sys.path:
+        sys.path.insert(0, directory)
+    for module in modules:
+        # Importing the module registers its events
+        importlib.import_module(module)
+        loaded.append(module)
+    return loaded
+
+
+def get_event(name: str):
+    if name not in EVENTS:
+        raise ValueError(f"Unknown chaos event {name}, registered events: {sorted(EVENTS)}")
+    return EVENTS[name]
@@ -0,0 +1,173 @@
+import asyncio
+import gzip
+import heapq
+import itertools
+import json
+import re
+
+RESULTS_VERSION = 1
+# Time after the end of a traffic session until its output is fetched
+FETCH_MARGIN = 5  # s
+
+# One row per flow and endpoint (S: source, D: destination) of flowgrind's final report
+COLUMNS = (
+    "event_id",
+    "event_time",
+    "event_type",
+    "server",
+    "client",
+    "flow",
+    "endpoint",
+    "duration",  # s
+    "throughput_out",  # Mbit/s
+    "throughput_in",  # Mbit/s
+    "rtt_min",  # ms
+    "rtt_avg",  # ms
+    "rtt_max",  # ms
+    "lost",  # segments the kernel considered lost (tcpi_lost) at the end of the flow
+    "retransmits",  # total retransmitted segments (tcpi_total_retrans)
+)
+
+SUMMARY_LINE = re.compile(r"^#\s*ID\s+(\d+)\s+([SD]):")
+SUMMARY_FIELDS = {
+    "duration": re.compile(r"flow duration = ([\d.]+)s"),
+    "throughput": re.compile(r"through = ([\d.]+)/([\d.]+)\s*Mbit/s"),
+    "rtt": re.compile(r"RTT = ([\d.]+)/([\d.]+)/([\d.]+)"),
+}
+
+
+def parse_flowgrind(output: str):
+    """
+    Parse the output of flowgrind into one record per flow and endpoint.
+    Throughput, RTT and duration come from the final report ("# ID 0 S: ..."), loss and retransmissions
+    from the last interval report of the flow, whose columns are named by the "# ID begin end through ..." header.
+    Values that flowgrind didn't report are None.
+
+    Returns:
+        dict: (flow, endpoint) -> record
+    """
+    records = {}
+    header = None
+    for line in output.splitlines():
+        summary = SUMMARY_LINE.match(line)
+        if summary:
+            record = records.setdefault((int(summary.group(1)), summary.group(2)), {})
+            duration = SUMMARY_FIELDS["duration"].search(line)
+            if duration:
+                record["duration"] = float(duration.group(1))
+            throughput = SUMMARY_FIELDS["throughput"].search(line)
+            if throughput:
+                record["throughput_out"] = float(throughput.group(1))
+                record["throughput_in"] = float(throughput.group(2))
+            rtt = SUMMARY_FIELDS["rtt"].search(line)
+            if rtt:
+                record["rtt_min"], record["rtt_avg"], record["rtt_max"] = map(float, rtt.groups())
+        elif line.startswith("#") and "through" in line:
+            header = line.lstrip("#").split()
+        elif header and line[:1] in ("S", "D"):
+            values = dict(zip(header, line.split()[1:]))
+            try:
+                record = records.setdefault((int(values["ID"]), line[0]), {})
+                if "lost" in values:
+                    record["lost"] = int(values["lost"])
+                if "tret" in values:
+                    record["retransmits"] = int(values["tret"])
+            except (KeyError, ValueError):
+                continue
+    return records
+
+
+class TrafficResults:
+    """
+    Collects the output of background traffic sessions once they have ended and stores it
+    column-wise, every row refers to the timeline event that started the session.
+    """
+
+    def __init__(self, path: str, timeline_path: str = None):
+        self.path = path
+        self.timeline_path = timeline_path
+        self.columns = {column: [] for column in COLUMNS}
+        # (ready time, seq, cmd_id, session), ordered by when the output can be fetched
+        self.pending = []
+        self.seq = itertools.count()
+        self.added = asyncio.Event()
+        self.fetched = 0
+        self.failed = 0
+
+    def add(self, cmd_id: str, session: dict, duration: float):
+        """
+        Fetch the output of the command once the session (event_id, event_time, event_type, server, clients) has ended.
+        """
+        ready = asyncio.get_running_loop().time() + duration + FETCH_MARGIN
+        heapq.heappush(self.pending, (ready, next(self.seq), cmd_id, session))
+        self.added.set()
+
+    async def run(self, fetch, stop_event: asyncio.Event):
+        """
+        Task fetching outputs when they are ready, fetch(cmd_id) returns the output or None.
+        """
+        loop = asyncio.get_running_loop()
+        while not stop_event.is_set():
+            self.added.clear()
+            timeout = self.pending[0][0] - loop.time() if self.pending else None
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self.added.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, cmd_id, session = heapq.heappop(self.pending)
+            self.store(session, await fetch(cmd_id))
+
+    async def flush(self, fetch):
+        """
+        Fetch the outputs of all remaining sessions concurrently, also the ones that are still running.
+        """
+        pending = [heapq.heappop(self.pending) for _ in range(len(self.pending))]
+        outputs = await asyncio.gather(*(fetch(cmd_id) for _, _, cmd_id, _ in pending))
+        for (_, _, _, session), output in zip(pending, outputs):
+            self.store(session, output)
+
+    def store(self, session: dict, output: str):
+        records = parse_flowgrind(output) if output else {}
+        if not records:
+            self.failed += 1
+            return
+        self.fetched += 1
+        for (flow, endpoint), record in sorted(records.items()):
+            clients = session["clients"]
+            row = {
+                "event_id": session["event_id"],
+                "event_time": session["event_time"],
+                "event_type": session["event_type"],
+                "server": session["server"],
+                "client": clients[flow] if flow < len(clients) else None,
+                "flow": flow,
+                "endpoint": endpoint,
+                **record,
+            }
+            for column in COLUMNS:
+                self.columns[column].append(row.get(column))
+
+    def save(self):
+        with gzip.open(self.path, "wt") as f:
+            json.dump(
+                {
+                    "version": RESULTS_VERSION,
+                    "timeline": self.timeline_path,
+                    "rows": len(self.columns["flow"]),
+                    "columns": self.columns,
+                },
+                f,
+                separators=(",", ":"),
+            )
+        print(f"Traffic results: {self.fetched} sessions ({len(self.columns['flow'])} rows) written to {self.path}, "
+              f"{self.failed} without output")
+
+
+def load_results(path: str):
+    with gzip.open(path, "rt") as f:
+        results = json.load(f)
+    if results.get("version") != RESULTS_VERSION:
+        raise ValueError(f"Unsupported results version {results.get('version')} in {path}")
+    return results
@@ -0,0 +1,147 @@
+import fnmatch
+import math
+import os
+import random
+
+# Generators whose rate a scenario can set besides the chaos events
+RATE_SECTIONS = ("loss", "delay", "traffic", "chaos")
+EVENT_SETTINGS = {"weight", "rate", "duration", "nodes", "links"}
+
+
+class Distribution:
+    """
+    Distribution of event durations (in seconds), from a scenario entry like
+    {distribution = "exponential", mean = 20, max = 120}. A plain number is a fixed duration.
+    Supported: fixed (value), uniform (min, max), exponential (mean), lognormal (median, sigma).
+    All of them can be bounded by min and max.
+    """
+
+    def __init__(self, spec):
+        if isinstance(spec, (int, float)):
+            spec = {"distribution": "fixed", "value": spec}
+        self.spec = dict(spec)
+        self.kind = self.spec.get("distribution", "uniform")
+        self.min = self.spec.get("min", 0)
+        self.max = self.spec.get("max", math.inf)
+        required = {"fixed": ("value",), "uniform": ("min", "max"), "exponential": ("mean",), "lognormal": ("median", "sigma")}
+        if self.kind not in required:
+            raise ValueError(f"Unknown duration distribution {self.kind}, use one of {sorted(required)}")
+        missing = [key for key in required[self.kind] if key not in self.spec]
+        if missing:
+            raise ValueError(f"Duration distribution {self.kind} needs {missing}")
+
+    def draw(self, rng: random.Random):
+        if self.kind == "fixed":
+            value = self.spec["value"]
+        elif self.kind == "uniform":
+            value = rng.uniform(self.min, self.max)
+        elif self.kind == "exponential":
+            value = rng.expovariate(1 / self.spec["mean"])
+        else:
+            value = rng.lognormvariate(math.log(self.spec["median"]), self.spec["sigma"])
+        return round(min(max(value, self.min), self.max), 3)
+
+    def mean(self):
+        """
+        Mean of the unbounded distribution, used to derive the default chaos rate.
+        """
+        if self.kind == "fixed":
+            return self.spec["value"]
+        if self.kind == "uniform":
+            return (self.min + self.max) / 2
+        if self.kind == "exponential":
+            return self.spec["mean"]
+        return self.spec["median"] * math.exp(self.spec["sigma"] ** 2 / 2)
+
+
+def read_file(path: str):
+    """
+    Parse a TOML or (if PyYAML is installed) YAML scenario file.
+    """
+    if os.path.splitext(path)[1] in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError(f"YAML scenarios need PyYAML (pip install pyyaml), or use TOML for {path}") from None
+        with open(path) as f:
+            return yaml.safe_load(f) or {}
+    import tomllib
+
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+def load_scenario(path: str):
+    """
+    Load a scenario file. Example (TOML):
+
+        plugins = ["my_events"]          # modules registering additional chaos events
+        [loss]
+        rate = 0.5                       # rates of the loss, delay, traffic generators and of all chaos events
+        [chaos]
+        rate = 0.05
+        [events.DisconnectRandomLinkEvent]
+        weight = 3                       # share of the chaos rate
+        duration = {distribution = "exponential", mean = 20, max = 120}
+        links = ["bb2-* bb2-*"]          # "src dst" glob patterns
+        [events.DisconnectRandomRouterEvent]
+        rate = 0.01                      # own rate instead of a share of the chaos rate
+        nodes = ["bb2-*"]
+
+    Only the listed events are planned, without an events table all registered events are planned with weight 1.
+
+    Returns:
+        dict: {"path", "plugins", "rates": {section: rate}, "events": {name: settings}}
+    """
+    data = read_file(path)
+    unknown = set(data) - {"plugins", "events", *RATE_SECTIONS}
+    if unknown:
+        raise ValueError(f"Unknown sections in scenario {path}: {sorted(unknown)}")
+    rates = {section: float(data[section]["rate"]) for section in RATE_SECTIONS if "rate" in data.get(section, {})}
+    events = {}
+    for name, settings in data.get("events", {}).items():
+        unknown = set(settings) - EVENT_SETTINGS
+        if unknown:
+            raise ValueError(f"Unknown settings of {name} in scenario {path}: {sorted(unknown)}")
+        events[name] = {
+            "weight": float(settings.get("weight", 1)),
+            "rate": float(settings["rate"]) if "rate" in settings else None,
+            "duration": Distribution(settings["duration"]) if "duration" in settings else None,
+            "nodes": settings.get("nodes"),
+            "links": settings.get("links"),
+        }
+    return {"path": path, "plugins": list(data.get("plugins", [])), "rates": rates, "events": events}
+
+
+def select_nodes(nodes, patterns):
+    """
+    Nodes matching any of the glob patterns, all nodes if there are no patterns.
+    """
+    if patterns is None:
+        return list(nodes)
+    selected = [node for node in nodes if any(fnmatch.fnmatchcase(node, pattern) for pattern in patterns)]
+    if not selected:
+        raise ValueError(f"No nodes match {patterns}")
+    return selected
+
+
+def select_links(links, patterns):
+    """
+    Links (in both directions) matching any of the "src dst" glob patterns, all links if there are no patterns.
+    """
+    if patterns is None:
+        return list(links)
+    pairs = []
+    for pattern in patterns:
+        parts = pattern.split()
+        if len(parts) != 2:
+            raise ValueError(f"Link selectors have the format \"src dst\", got {pattern!r}")
+        pairs.append(parts)
+    selected = [
+        link
+        for link in links
+        if any(fnmatch.fnmatchcase(link["src"], src) and fnmatch.fnmatchcase(link["dst"], dst) for src, dst in pairs)
+    ]
+    if not selected:
+        raise ValueError(f"No links match {patterns}")
+    return selected
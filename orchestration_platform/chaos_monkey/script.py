@@ -1,18 +1,32 @@
 import argparse
-import json
-import logging
+import asyncio
+import contextvars
+import functools
+import heapq
 import os
-import queue
 import random
 import signal
-import threading
 import time
 from datetime import datetime
 
-import requests
+import event_log
+import http_client
+import probes
+import registry
+import results
+import scenario
+import simulator
+import timeline
+import traffic
 from abstract_event import AbstractEvent
 from undo_event import UndoEvent
-from link_lock import Link_Lock
+from lock_manager import (
+    LockManager,
+    link_resource,
+    link_use_resource,
+    router_resource,
+    static_route_resource,
+)
 from port_manager import PortManager
 from utils import (
     get_random_link,
@@ -27,62 +41,170 @@ from utils import (
 # Global variables
 NODES = ()
 LINKS = {}
+# (src, dst) -> link, to validate the links of a replayed timeline
+LINK_INDEX = {}
 ROUTER_IPS = {}
 HOST_IPS = {}
 API_URL = None
 INITAL_SNAPSHOT_ID = ""
+# Ports of the flowgrind daemons on every host, see platform/setup/flowgrind.sh
 PORT_MANAGER = PortManager(8000, 8005)
 LOGS_DIR = os.path.join(os.path.dirname(__file__), "logs")
+# Shared client for all requests to the API, created in main()
+HTTP_CLIENT = None
+# Locks on links, routers and routes, shared by all events
+LOCKS = LockManager()
+# Time chaos events wait for the links/routers they need before they are dropped
+LOCK_TIMEOUT = 0  # s
+# Time running events get to finish after Ctrl+C before they are cancelled
+SHUTDOWN_GRACE = 5  # s
+# Time after which the teardown (undoing events and resetting the lab) gives up on what isn't reverted yet
+TEARDOWN_TIMEOUT = 120  # s
+# Failed requests and events after which the run is aborted
+MAX_ERRORS = 100
+# Rates, chaos events, targets and durations of the run, see scenario.load_scenario()
+SCENARIO = {"path": None, "plugins": [], "rates": {}, "events": {}}
 
 # Constants that refer to the events
 
+# Rates of the generators, unless set on the command line or in the scenario
+DEFAULT_RATES = {"loss": 1 / 8, "delay": 1 / 8, "traffic": 1 / 35}  # events per second
+
 # Background traffic will have a duration that is uniformly distributed around an avg, this specifies how much longer/shorter the duration can be
 BACKGROUND_TRAFFIC_DURATION_SPREAD = 25 
 COMPLEX_LOSS_MIN_DURATION = 20
 COMPLEX_LOSS_MAX_DURATION = 50
+ELEMENTARY_LOSS_MIN_DURATION = 10  # ms
+ELEMENTARY_LOSS_MAX_DURATION = 100  # ms
 MIN_DELAY = 2  # ms
 MAX_DELAY = 300  # ms
 MIN_BANDWIDTH = 100 # kbps
 MAX_BANDWIDTH = 10000 # kbps
 
-stop_event = threading.Event()
-
-event_queue = queue.PriorityQueue()
+stop_event = asyncio.Event()
+
+# Heap of UndoEvents, ordered by their unroll time
+event_queue = []
+# Set whenever an undo event is added, to wake up the event unroller
+undo_added = asyncio.Event()
+# All events currently running as tasks on the event loop
+RUNNING_TASKS = set()
+# How late (in seconds) every event of the timeline was started
+START_LAGS = []
+# Timeline event that started the current task, inherited by the tasks it spawns
+CURRENT_EVENT = contextvars.ContextVar("current_event", default=None)
+# Collects the output of background traffic, None if disabled
+TRAFFIC_RESULTS = None
+# Measures reachability and RTT between hosts during the run, None if disabled
+PROBES = None
+# Timestamp in the names of all files written by this run, set in main()
+RUN_ID = None
+# JSONL log of all requests and events of the run, created in main()
+EVENT_LOG = None
+# Aborts the run after MAX_ERRORS failures, created in main()
+ERROR_BUDGET = None
 
 # Seed randomness for reproducibility
-def log_request(endpoint, data, response_status=None, error=None):
+def log_request(method, endpoint, data, response_status, latency_ms, error):
     """
-    Logs the request details in JSON format, including the thread name.
+    Records the request in the event log, including the name of the task (event) that made the request.
+    Called by the shared client after every request, failed requests count against the error budget.
     """
-    log_entry = {
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
-        "thread": threading.current_thread().name,  # Add thread name
-        "endpoint": endpoint,
-        "data": data,
-        "response_status": response_status,
-        "error": str(error) if error else None,
-    }
-    logging.info(json.dumps(log_entry))  # Log as a JSON string
-    # print(json.dumps(log_entry, indent=4))  # Print for debugging
+    task = asyncio.current_task()
+    EVENT_LOG.record(
+        "request",
+        task=task.get_name() if task else None,
+        method=method,
+        endpoint=endpoint,
+        data=data,
+        status=response_status,
+        latency_ms=round(latency_ms, 3),
+        error=str(error) if error else None,
+    )
+    if ERROR_BUDGET is not None and (error or (response_status or 0) >= 400):
+        ERROR_BUDGET.error()
 
 
-def perform_request(endpoint, data):
+async def perform_request(endpoint, data):
     """
-    Wrapper function to perform a request and log the details in JSON format.
+    Wrapper function to perform a request, the details are logged in JSON format by the shared client.
     """
     try:
-        response = requests.post(f"{API_URL}/{endpoint}", json=data)
+        response = await HTTP_CLIENT.post(endpoint, json=data)
         if response.status_code != 200:
             print(f"{endpoint} Error: {response.status_code} - {response.text}")
-        log_request(endpoint, data, response_status=response.status_code)
         return response
     except Exception as e:
-        log_request(endpoint, data, error=e)
+        print(f"{endpoint} Error: {e}")
         return None
 
 
+async def get_link_state(src: str, dst: str):
+    """
+    Get the current state of the link from src to dst, returns None if the request failed.
+    """
+    resp = await HTTP_CLIENT.get("/link_state", params={"src": src, "dst": dst})
+    if resp.status_code != 200:
+        print(f"Error: {resp.status_code} - {resp.text}")
+        return None
+    return resp.json()
+
+
+def spawn(coro, name: str, event: dict = None):
+    """
+    Run an event as a task on the event loop, so that long events don't delay the generator that created them.
+    Errors of the event are printed and count against the error budget instead of stopping the run.
+    The start and outcome of the task are recorded in the event log, with the planned event if there is one.
+    """
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    if event is None:
+        EVENT_LOG.record("started", task=name)
+    else:
+        EVENT_LOG.record(
+            "started",
+            task=name,
+            event_id=event["id"],
+            event_type=event["type"],
+            planned_time=event["time"],
+            params=event["params"],
+            lag=round(START_LAGS[-1], 6),
+        )
+
+    async def run():
+        try:
+            await coro
+        except asyncio.CancelledError:
+            EVENT_LOG.record("cancelled", task=name, duration=round(loop.time() - start, 6))
+            raise
+        except Exception as e:
+            print(f"Error in {name}: {e}")
+            EVENT_LOG.record("failed", task=name, duration=round(loop.time() - start, 6), error=repr(e))
+            ERROR_BUDGET.error()
+        else:
+            EVENT_LOG.record("finished", task=name, duration=round(loop.time() - start, 6))
+
+    task = asyncio.create_task(run(), name=name)
+    RUNNING_TASKS.add(task)
+    task.add_done_callback(RUNNING_TASKS.discard)
+    return task
+
 
-def configure():
+async def sleep_until(deadline: float):
+    """
+    Sleep until `deadline` (in event loop time), returns early once the stop event is set.
+    """
+    timeout = deadline - asyncio.get_running_loop().time()
+    if timeout <= 0:
+        return
+    try:
+        await asyncio.wait_for(stop_event.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def configure():
     """
     Fetch and configure global variables using the global API_URL.
     """
@@ -90,49 +212,32 @@ def configure():
     global LINKS
     global ROUTER_IPS
     global HOST_IPS
-    global INITAL_SNAPSHOT_ID
-    response = requests.get(f"{API_URL}/available_routers")
+    response = await HTTP_CLIENT.get("/available_routers")
     NODES = response.json().get("routers", [])
-    response = requests.get(f"{API_URL}/links")
+    response = await HTTP_CLIENT.get("/links")
     LINKS = response.json().get("links", [])
      # Extend links to also contain the other direction
-     # and add locks to the links
     flipped_links = []
     for link in LINKS:
-        link["loss_lock"] = Link_Lock()
-        link["delay_lock"] = Link_Lock()
         src, dst = get_src_dst_from_link(link)
         newlink = link.copy()
         newlink["src"] = dst
         newlink["dst"] = src
-        # The locks on the reverse link need to be different
-        newlink["loss_lock"] = Link_Lock()
-        newlink["delay_lock"] = Link_Lock()
         flipped_links.append(newlink)
 
     LINKS.extend(flipped_links)
+    LINK_INDEX.clear()
+    LINK_INDEX.update({get_src_dst_from_link(link): link for link in LINKS})
     # randlink = get_random_link(random.Random(), LINKS)
     # reverse_link = [link for link in LINKS if link["src"] == randlink["dst"] and link["dst"] == randlink["src"]][0]
     # print(f"Random link: {randlink}")
     # print(f"Reverse link: {reverse_link}")
-    response = requests.get(f"{API_URL}/router_ips")
+    response = await HTTP_CLIENT.get("/router_ips")
     ROUTER_IPS = response.json().get("ips", [])
-    response = requests.get(f"{API_URL}/host_ips")
+    response = await HTTP_CLIENT.get("/host_ips")
     HOST_IPS = response.json().get("ips", [])
     for container in [NODES, LINKS, ROUTER_IPS, HOST_IPS]:
         assert len(container) != 0
-    response = requests.post(f"{API_URL}/take_snapshot", {})
-    INITAL_SNAPSHOT_ID = response.json()["id"]
-
-    # Ensure the logs folder exists
-    os.makedirs(LOGS_DIR, exist_ok=True)
-
-    # Configure logging
-    logging.basicConfig(
-        filename=os.path.join(LOGS_DIR, f"chaos_monkey_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json"),
-        level=logging.INFO,
-        format="%(message)s",  # Log only the message (JSON string)
-    )
     # for debugging purposes:
     # print(f"Available routers: {NODES}")
     # print(f"Available links: {LINKS}")
@@ -141,6 +246,12 @@ def configure():
 
 
 
+def flowgrind_output_option(duration: int):
+    """
+    Flowgrind is quiet unless traffic results are collected, it then only reports once for the whole duration.
+    """
+    return "-q" if TRAFFIC_RESULTS is None else f"-i {duration}"
+
 def gen_webserver_traffic_cmd(
     server_node: str, client_nodes: list, duration: int, port: int, seed: int
 ):
@@ -150,12 +261,11 @@ def gen_webserver_traffic_cmd(
     """
     server_ip, client_ips = get_server_and_client_IPs(server_node, client_nodes, HOST_IPS)
 
-    # For now we dont dump the traffic or store the logfiles somewhere
-    # if we want to do this we would need to make corresponding changes in the API
-    # What we could do is obtain the flowgrind output and parse it
+    # Unless --no-traffic-results is set, the final report of flowgrind is fetched through /cmd_output and parsed
+    # into the traffic results file (see results.py)
 
     # Adapted from the manpages example (https://manpages.ubuntu.com/manpages/xenial/man1/flowgrind.1.html) link to src there(www.3gpp...) is dead however
-    cmd = f"flowgrind -q -n {len(client_nodes)}"
+    cmd = f"flowgrind {flowgrind_output_option(duration)} -n {len(client_nodes)}"
     for flow_id, client_ip in enumerate(client_ips):
         cmd += f" -F {flow_id} -J {seed} -H s={server_ip}/{server_ip}:{port},d={client_ip}/{client_ip}:{port} -T s={duration} -G s=q:C:350 -G s=p:L:9055:115.17 -U b=100000"
 
@@ -173,191 +283,244 @@ def gen_videostreaming_traffic_cmd(
     """
     server_ip, client_ips = get_server_and_client_IPs(server_node, client_nodes, HOST_IPS)
 
-    # For now we dont dump the traffic or store the logfiles somewhere
-    # if we want to do this we would need to make corresponding changes in the API
-    # What we could do is obtain the flowgrind output and parse it
+    # Unless --no-traffic-results is set, the final report of flowgrind is fetched through /cmd_output and parsed
+    # into the traffic results file (see results.py)
 
     # Adapted from the manpages example (https://manpages.ubuntu.com/manpages/xenial/man1/flowgrind.1.html) link to src there(www.3gpp...) is dead however
-    cmd = f"flowgrind -q -n {len(client_nodes)}"
+    cmd = f"flowgrind {flowgrind_output_option(duration)} -n {len(client_nodes)}"
     for flow_id, client_ip in enumerate(client_ips):
         cmd += f" -F {flow_id} -J {seed} -H s={server_ip}/{server_ip}:{port},d={client_ip}/{client_ip}:{port} -T s={duration} -G s=q:C:800 -G s=g:N:0.008:0.001"
 
     return cmd
 
-def gen_videostreaming_traffic(rng: random.Random, rate: float):
+def gen_trace_traffic_cmd(server_node: str, flows: list, port: int):
     """
-    Function to generate a flowgrind command that simulates a webserver serving multiple clients.
-    This function can be customized to generate specific traffic patterns.
+    Function to generate a flowgrind command that launches a batch of flows from a traffic trace or matrix.
+    Every flow starts after its delay and sends with its own rate (bit/s) for its duration.
+    """
+    server_ip, client_ips = get_server_and_client_IPs(server_node, [flow["dst"] for flow in flows], HOST_IPS)
+
+    cmd = f"flowgrind {flowgrind_output_option(max(flow['duration'] for flow in flows))} -n {len(flows)}"
+    for flow_id, (flow, client_ip) in enumerate(zip(flows, client_ips)):
+        cmd += f" -F {flow_id} -H s={server_ip}/{server_ip}:{port},d={client_ip}/{client_ip}:{port} -Y s={flow['delay']} -T s={flow['duration']} -R s={flow['rate'] / 1000:.3f}kb"
+
+    return cmd
+
+def collect_traffic_output(response, server: str, clients: list, duration: float):
+    """
+    Fetch the output of a started traffic session once it has ended, if traffic results are collected.
+    """
+    if TRAFFIC_RESULTS is None:
+        return
+    event = CURRENT_EVENT.get() or {}
+    session = {
+        "event_id": event.get("id"),
+        "event_time": event.get("time"),
+        "event_type": event.get("type"),
+        "server": server,
+        "clients": clients,
+    }
+    TRAFFIC_RESULTS.add(response.json()["ID"], session, duration)
+
+async def fetch_output(cmd_id: str):
     """
+    Get the output of a detached command, returns None if the request failed.
+    """
+    try:
+        response = await HTTP_CLIENT.get("/cmd_output", params={"cmd_id": cmd_id})
+    except Exception as e:
+        print(f"cmd_output Error: {e}")
+        return None
+    if response.status_code != 200:
+        print(f"cmd_output Error: {response.status_code} - {response.text}")
+        return None
+    return response.json().get("output")
+
+def plan_background_traffic(rng: random.Random, rate: float):
+    """
+    Plan a background traffic session, randomly choosing between webserver and videostreaming traffic.
+    """
+    traffic_type = "webserver_traffic" if rng.random() < 0.5 else "videostreaming_traffic"
     server, clients = get_random_server_and_clients(rng, NODES)
-    duration = get_traffic_duration(rng, rate)
+    params = {
+        "server": server,
+        "clients": clients,
+        "duration": get_traffic_duration(rng, rate),
+        "seed": rng.randint(0, 10000),
+    }
+    return [{"type": traffic_type, "params": params}]
+
+async def gen_videostreaming_traffic(params: dict):
+    """
+    Function to start videostreaming traffic from a server to multiple clients.
+    """
+    server, clients, duration = params["server"], params["clients"], params["duration"]
     print(f"Simulating videostreaming background traffic from {server} to {clients} for {duration} seconds")
-    port = PORT_MANAGER.get_port(duration=duration+1)# add 1 second to avoid race conditions.
-    if not port:
+    # The port has to be free on the server and all clients
+    lease = PORT_MANAGER.get_port([server, *clients], duration=duration+1)# add 1 second to avoid race conditions.
+    if lease is None:
         print("no port available, continuing")
         return
-    cmd = gen_videostreaming_traffic_cmd(server, clients, duration, port, rng.randint(0, 10000))
+    cmd = gen_videostreaming_traffic_cmd(server, clients, duration, lease.port, params["seed"])
     print(f"Generated command: {cmd}")
-    perform_request("/execute", {"node": server, "router": False, "cmd": cmd, "detach": True})
+    response = await perform_request("/execute", {"node": server, "router": False, "cmd": cmd, "detach": True, "log_output": TRAFFIC_RESULTS is not None})
+    if response is None or response.status_code != 200:
+        PORT_MANAGER.release(lease)
+        return
+    collect_traffic_output(response, server, clients, duration)
 
-def gen_webserver_traffic(rng: random.Random, rate: float):
-    server, clients = get_random_server_and_clients(rng, NODES)
-    duration = get_traffic_duration(rng, rate)
+async def gen_webserver_traffic(params: dict):
+    """
+    Function to start webserver traffic from a server to multiple clients.
+    """
+    server, clients, duration = params["server"], params["clients"], params["duration"]
     print(f"Simulating webserver background traffic from {server} to {clients} for {duration} seconds")
-    port = PORT_MANAGER.get_port(duration=duration+1)# add 1 second to avoid race conditions.
-    if not port:
+    # The port has to be free on the server and all clients
+    lease = PORT_MANAGER.get_port([server, *clients], duration=duration+1)# add 1 second to avoid race conditions.
+    if lease is None:
         print("no port available, continuing")
         return
-    cmd = gen_webserver_traffic_cmd(server, clients, duration, port, rng.randint(0, 10000))
+    cmd = gen_webserver_traffic_cmd(server, clients, duration, lease.port, params["seed"])
     print(f"Generated command: {cmd}")
-    perform_request("/execute", {"node": server, "router": False, "cmd": cmd, "detach": True})
-
-def background_traffic(rng: random.Random, rate: float):
-    """
-    Function to simulate background traffic in the network.
-    """
-    while not stop_event.is_set():  # Check the stop flag
-        # Randomly choose between webserver and videostreaming traffic
-        if rng.random() < 0.5:
-            gen_webserver_traffic(rng, rate)
-        else:
-            gen_videostreaming_traffic(rng, rate)
-
-        # Sleep for a random interval before generating the next traffic
-        sleeptime = rng.expovariate(rate)
-        time.sleep(sleeptime)  # assuming the event duration has an average of 35 seconds
+    response = await perform_request("/execute", {"node": server, "router": False, "cmd": cmd, "detach": True, "log_output": TRAFFIC_RESULTS is not None})
+    if response is None or response.status_code != 200:
+        PORT_MANAGER.release(lease)
+        return
+    collect_traffic_output(response, server, clients, duration)
 
-def fire_event_exponentially_distributed(
-    rng: random.Random, rate: float, event, args: list
-):
+async def trace_traffic(params: dict):
     """
-    Function to fire events at exponentially distributed intervals.
-    Args:
-        rate (float): The rate parameter (lambda) for the exponential distribution.
-                      This is the average number of events per second.
-        event: Function to invoke the desired event
-        args(list): arguments for the event function, the rng will prepended by convention
+    Function to launch a batch of flows from a traffic trace or matrix on their source host.
     """
-    args.insert(0, rng)
-    while not stop_event.is_set():
-        # Generate the next interval using exponential distribution
-        interval = rng.expovariate(rate)
-        time.sleep(interval)  # Wait for the interval duration
-        event(args)
-        # FIXME: add some way to catch errors of the event and abort the run in case of errors
-        # eg by event returning a bool or raising an exception
-
+    server, flows, duration = params["server"], params["flows"], params["duration"]
+    print(f"Launching {len(flows)} trace flows from {server} for {duration} seconds")
+    clients = [flow["dst"] for flow in flows]
+    # The port has to be free on the server and all destinations
+    lease = PORT_MANAGER.get_port([server, *clients], duration=duration+1)
+    if lease is None:
+        print("no port available, continuing")
+        return
+    cmd = gen_trace_traffic_cmd(server, flows, lease.port)
+    response = await perform_request("/execute", {"node": server, "router": False, "cmd": cmd, "detach": True, "log_output": TRAFFIC_RESULTS is not None})
+    if response is None or response.status_code != 200:
+        PORT_MANAGER.release(lease)
+        return
+    collect_traffic_output(response, server, clients, duration)
 
-def elementary_loss(rng: random.Random, link: dict):
-    """An event that produces packet loss of multiple consecutive packets, as per the Paper"""
-    # TODO: add citation:
-    src, dst = get_src_dst_from_link(link)
 
-    link["loss_lock"].acquire_modify()
-    # # get current loss rate as the event might overlap with another one
-    resp = requests.get(f"{API_URL}/link_state?src={src}&dst={dst}")
-    if resp.status_code != 200:
-        print(f"Error: {resp.status_code} - {resp.text}")
-        link["loss_lock"].release_modify()
-        return
-    curr_loss = resp.json().get("loss_rate", 0)
-    perform_request("add_loss", {"src": src, "dst": dst, "loss_rate": "100"})
-    # Probably its fine if we dont wait for a bit since the handling delay should be enough
-    perform_request("add_loss", {"src": src, "dst": dst, "loss_rate": curr_loss})
-    # perform_request("rm_loss", {"src": src, "dst": dst})
-    link["loss_lock"].release_modify()
+def plan_elementary_loss(rng: random.Random, src: str, dst: str, offset: float = 0):
+    """Plan a burst of packet loss on the link from src to dst"""
+    duration = rng.uniform(ELEMENTARY_LOSS_MIN_DURATION, ELEMENTARY_LOSS_MAX_DURATION)  # ms
+    return {"type": "elementary_loss", "offset": offset, "params": {"src": src, "dst": dst, "duration": duration}}
 
 
-def complex_loss(rng: random.Random, link: dict):
-    """A loss event consisting of multiple elemtary loss events"""
+def plan_complex_loss(rng: random.Random, src: str, dst: str):
+    """A loss event consisting of multiple elemtary loss events, planned as separate events in the timeline"""
     max_duration = rng.randint(COMPLEX_LOSS_MIN_DURATION, COMPLEX_LOSS_MAX_DURATION)  # seconds
-    #  FIXME: maybe log this
+    events = []
+    offset = 0
     while max_duration > 0:
-        elementary_loss(rng, link)
+        events.append(plan_elementary_loss(rng, src, dst, offset))
         interval = rng.expovariate(1/5)
         max_duration -= interval
-        time.sleep(interval)
+        offset += interval
+    return events
 
-def loss_event(args: list):
+
+def plan_loss_event(rng: random.Random):
     # pick out a link
-    rng = args[0]
     link = get_random_link(rng, LINKS)
-    if(rng.random() < 0.1== 0):
+    src, dst = get_src_dst_from_link(link)
+    if rng.random() < 0.1:
         # in 10% of cases we trigger a complex loss event
-        complex_loss(rng, link)
-    else:
-        elementary_loss(rng, link)
+        return plan_complex_loss(rng, src, dst)
+    return [plan_elementary_loss(rng, src, dst)]
+
+
+async def elementary_loss(params: dict):
+    """An event that produces packet loss of multiple consecutive packets, as per the Paper"""
+    # TODO: add citation:
+    src, dst = params["src"], params["dst"]
+    async with LOCKS.locked([link_resource(src, dst, "loss")]):
+        # The API drops all packets for the given duration and restores the current loss rate itself,
+        # timed inside the router so the outage length doesn't depend on request latencies
+        await perform_request("loss_burst", {"src": src, "dst": dst, "duration": params["duration"]})
+
+
+def plan_delay_event(rng: random.Random):
+    link = get_random_link(rng, LINKS)
+    src, dst = get_src_dst_from_link(link)
+    delay_size = rng.randint(30, 240) #ms
+    return [{"type": "delay_spike", "params": {"src": src, "dst": dst, "delay": delay_size}}]
 
 
-def delay_spike(rng: random.Random, link):
+async def delay_spike(params: dict):
     """Add a simple delay spike that is equally as high(added delay) as it is long
     Eg. a packet that is forwarded over the impacted link usually experiences a propagation delay of 25 ms
-    with a delay spike with size 75  it should (currently not implemented) experience a stepwise (due to implementation) decreasing loss with an initial maximum of 100 over a duration of 75ms"""
-    delay_size = rng.randint(30, 240) #ms
-    # timestamp = time.time_ns()
-    src, dst = get_src_dst_from_link(link)
-    link["delay_lock"].acquire_modify()
-    resp = requests.get(f"{API_URL}/link_state?src={src}&dst={dst}")
-    curr_delay = resp.json().get("delay", 0)
-    # strip the delay from the units
-    try:
-        curr_delay = int(curr_delay[:-2])
-    except:
-        print(f"Error parsing delay: {curr_delay}")
-        curr_delay = 5
-
-    perform_request("add_delay", {"src": src, "dst": dst, "delay": delay_size})
-    # remaining = timestamp - time.time_ns()
-    # FIXME: make this somewhat more rectangular
-    # if remaining/1000 > delay_size 
-    # time.sleep(remaining/(1000*1000))
-    perform_request("add_delay", {"src": src, "dst": dst, "delay": curr_delay})
-    link["delay_lock"].release_modify()
-
-def delay_event(args: list):
-    rng = args[0]
-    link = get_random_link(rng, LINKS)
-    delay_spike(rng, link)
+    with a delay spike with size 75 it experiences a delay of 100ms for a duration of 75ms.
+    The spike is rectangular, the API adds and removes it within the router."""
+    src, dst, delay_size = params["src"], params["dst"], params["delay"]
+    async with LOCKS.locked([link_resource(src, dst, "delay")]):
+        await perform_request("delay_spike", {"src": src, "dst": dst, "delay": delay_size, "duration": delay_size})
 
 
 def schedule_undo_event(duration: int, action, args: list):
     """
-    Function to schedule an undo event
+    Function to schedule an undo event, action(args) is awaited once the duration is over.
+    args end with the endpoint and data of the request that undoes the change, the teardown groups and reports undos by them.
     """
-    unroll_time = time.time() + duration
+    # Undo times are on the event loop clock, which runs accelerated in simulations
+    unroll_time = asyncio.get_running_loop().time() + duration
     event = UndoEvent(unroll_time, action, args)
-    event_queue.put(event)
+    task = asyncio.current_task()
+    EVENT_LOG.record("scheduled", task=task.get_name() if task else None, action=action.__name__, delay=duration)
+    heapq.heappush(event_queue, event)
+    undo_added.set()
 
-def simple_undo(args: list):
+async def simple_undo(args: list):
     """
     Undo an event by calling the same function with the opposite parameters.
     """
-    perform_request(args[0], args[1])
+    return await perform_request(args[0], args[1])
 
-def undo_link_loss_change(args: list):
+async def undo_and_release(args: list):
     """
-    Undo a link change by calling the same function with the opposite parameters.
-    While making sure that the link is not simultaneously changed by another thread/event
+    Undo a change by calling the same function with the opposite parameters, then release what the event reserved.
+    args: [lease of the event, resources to lock while undoing, endpoint, data]
+    The resources make sure that eg. the link is not simultaneously changed by another event.
     """
-    link  = args[0]
-    link["loss_lock"].acquire_modify()
-    perform_request(args[1], args[2])
-    link["loss_lock"].release_modify()
-    link["loss_lock"].release_in_use()
+    lease, resources, endpoint, data = args
+    try:
+        async with LOCKS.locked(resources):
+            return await perform_request(endpoint, data)
+    finally:
+        LOCKS.release(lease)
+
+async def reserve(resources: list):
+    """
+    Reserve the resources of a chaos event until it is undone, waiting at most LOCK_TIMEOUT seconds.
+    Returns None if they stay busy, the event is then dropped.
+    """
+    lease = await LOCKS.acquire(resources, timeout=LOCK_TIMEOUT)
+    if lease is None:
+        print(f"{asyncio.current_task().get_name()}: {resources} busy, dropping event")
+        EVENT_LOG.record("dropped", task=asyncio.current_task().get_name(), resources=resources)
+    return lease
 
 ##############################
 # Config changes
 ##############################
 
+@registry.register
 class AddBogusStaticRouteEvent(AbstractEvent):
     def __init__(self):
         super().__init__(min_duration=30, max_duration=120)  # Set min and max durations
 
-    def execute(self, rng: random.Random):
+    def plan(self, rng: random.Random):
         """
-        Function to add a valid but wrong static route to a router.
+        Plan a valid but wrong static route on a router.
         """
-        target, destination, next_hop = get_random_nodes(rng, NODES, 3)
+        target, destination, next_hop = get_random_nodes(rng, self.nodes, 3)
         # Get a random IP from the available IPs
         dest_ip = ROUTER_IPS[destination]
         next_hop_ip = ROUTER_IPS[next_hop]
@@ -374,230 +537,634 @@ class AddBogusStaticRouteEvent(AbstractEvent):
             0,
         ]
         destination = '.'.join(map(str, network_ip)) + subnet_mask
-        perform_request("add_static_route", {"node": target, "destination": destination, "next_hop": next_hop_ip})
-        duration = rng.randint(self.min_duration, self.max_duration)
-        schedule_undo_event(duration, simple_undo, ["rm_static_route", {"node": target, "destination": destination, "next_hop": next_hop_ip}])
+        duration = self.draw_duration(rng)
+        return {"node": target, "destination": destination, "next_hop": next_hop_ip, "duration": duration}
 
+    async def execute(self, params: dict):
+        """
+        Function to add a valid but wrong static route to a router.
+        """
+        route = {"node": params["node"], "destination": params["destination"], "next_hop": params["next_hop"]}
+        lease = await reserve([static_route_resource(params["node"], params["destination"])])
+        if lease is None:
+            return
+        await perform_request("add_static_route", route)
+        schedule_undo_event(params["duration"], undo_and_release, [lease, [], "rm_static_route", route])
+
+@registry.register
 class ChangeOspfWeightEvent(AbstractEvent):
     def __init__(self):
         super().__init__(min_duration=0, max_duration=0)  # No duration, permanent change
 
+    def plan(self, rng: random.Random):
+        link = get_random_link(rng, self.links)
+        src, dst = get_src_dst_from_link(link)
+        cost = rng.randint(1, 100)
+        return {"src": src, "dst": dst, "cost": cost}
+
     # NOTE: this change will not be undone until the script terminates
-    def execute(self, rng: random.Random):
+    async def execute(self, params: dict):
         """
         Function to change the OSPF weight on a random link.
         """
-        link = get_random_link(rng, LINKS)
-        src, dst = get_src_dst_from_link(link)
-        cost = rng.randint(1, 100)
-        perform_request("change_ospf_cost", {"src": src, "dst": dst, "cost": cost})
+        await perform_request("change_ospf_cost", {"src": params["src"], "dst": params["dst"], "cost": params["cost"]})
 
 # NOTE: this change will not be undone until the script terminates
+@registry.register
 class IncreaseDelayEvent(AbstractEvent):
     def __init__(self):
         super().__init__(min_duration=0.5, max_duration=0.5)  # Set min and max durations
 
-    def execute(self, rng: random.Random):
+    def plan(self, rng: random.Random):
+        link = get_random_link(rng, self.links)
+        src, dst = get_src_dst_from_link(link)
+        delay = rng.randint(MIN_DELAY, MAX_DELAY)  # ms
+        return {"src": src, "dst": dst, "delay": delay}
+
+    async def execute(self, params: dict):
         """
         Function to increase the delay on a random link.
         """
-        link = get_random_link(rng, LINKS)
-        src, dst = get_src_dst_from_link(link)
-        delay = rng.randint(MIN_DELAY, MAX_DELAY)  # ms
-        link["delay_lock"].acquire_modify()
-        perform_request("add_delay", {"src": src, "dst": dst, "delay": delay})
-        link["delay_lock"].release_modify()
+        src, dst = params["src"], params["dst"]
+        async with LOCKS.locked([link_resource(src, dst, "delay")]):
+            await perform_request("add_delay", {"src": src, "dst": dst, "delay": params["delay"]})
 
+@registry.register
 class DisconnectRandomLinkEvent(AbstractEvent):
     def __init__(self):
         super().__init__(min_duration=5, max_duration=30)  # Set min and max durations
 
-    def execute(self, rng: random.Random):
+    def plan(self, rng: random.Random):
+        link = get_random_link(rng, self.links)
+        src, dst = get_src_dst_from_link(link)
+        duration = self.draw_duration(rng)
+        return {"src": src, "dst": dst, "duration": duration}
+
+    async def execute(self, params: dict):
         """
         Function to disconnect a random link.
         """
-        link = get_random_link(rng, LINKS)
-        if link["loss_lock"].acquire_in_use():
-            src, dst = get_src_dst_from_link(link)
-            link["loss_lock"].acquire_modify()
-            resp = requests.get(f"{API_URL}/link_state?src={src}&dst={dst}")
-            if resp.status_code != 200:
-                print(f"Error: {resp.status_code} - {resp.text}")
-                link["loss_lock"].release_modify()
+        src, dst = params["src"], params["dst"]
+        lease = await reserve([link_use_resource(src, dst, "loss")])
+        if lease is None:
+            return
+        loss = [link_resource(src, dst, "loss")]
+        async with LOCKS.locked(loss):
+            link_state = await get_link_state(src, dst)
+            if link_state is None:
+                LOCKS.release(lease)
                 return
-            curr_loss = resp.json().get("loss_rate", 0)
-            perform_request("add_loss", {"src": src, "dst": dst, "loss_rate": 100})
-            link["loss_lock"].release_modify()
-            duration = rng.randint(self.min_duration, self.max_duration)
-            schedule_undo_event(duration, undo_link_loss_change, [link, "add_loss", {"src": src, "dst": dst, "loss_rate": curr_loss}])
+            curr_loss = link_state.get("loss_rate", 0)
+            await perform_request("add_loss", {"src": src, "dst": dst, "loss_rate": 100})
+        schedule_undo_event(params["duration"], undo_and_release, [lease, loss, "add_loss", {"src": src, "dst": dst, "loss_rate": curr_loss}])
 
 
 
+@registry.register
 class DisconnectRandomRouterEvent(AbstractEvent):
     def __init__(self):
         super().__init__(min_duration=60, max_duration=300)  # Set min and max durations
 
-    def execute(self, rng:random.Random):
+    def plan(self, rng: random.Random):
+        host = get_random_node(rng, self.nodes)
+        duration = self.draw_duration(rng)  # seconds
+        return {"node": host, "duration": duration}
+
+    async def execute(self, params: dict):
         """
         Function to disconnect a random node.
         """
-        host = get_random_node(rng, NODES)
-        perform_request("disconnect_router", {"node": host})
-        duration = rng.randint(self.min_duration, self.max_duration)  # seconds
-        schedule_undo_event(duration, simple_undo, ["connect_router", {"node": host}])
-
+        node = params["node"]
+        # A disconnected router takes down all of its links, loss events on them would have no effect
+        resources = [router_resource(node)]
+        resources += [link_use_resource(src, dst, "loss") for src, dst in LINK_INDEX if node in (src, dst)]
+        lease = await reserve(resources)
+        if lease is None:
+            return
+        await perform_request("disconnect_router", {"node": node})
+        schedule_undo_event(params["duration"], undo_and_release, [lease, [], "connect_router", {"node": node}])
+
+@registry.register
 class MakeLinkLossyEvent(AbstractEvent):
     def __init__(self):
         super().__init__(min_duration=10, max_duration=30)  # Set min and max durations
 
-    def execute(self, rng: random.Random):
+    def plan(self, rng: random.Random):
+        link = get_random_link(rng, self.links)
+        src, dst = get_src_dst_from_link(link)
+        rate = rng.randint(1, 100)
+        duration = self.draw_duration(rng)
+        return {"src": src, "dst": dst, "loss_rate": rate, "duration": duration}
+
+    async def execute(self, params: dict):
         """
         Function to make a random link lossy.
         """
-        link = get_random_link(rng, LINKS)
-        if link["loss_lock"].acquire_in_use():
-            src, dst = get_src_dst_from_link(link)
-            link["loss_lock"].acquire_modify()
+        src, dst = params["src"], params["dst"]
+        lease = await reserve([link_use_resource(src, dst, "loss")])
+        if lease is None:
+            return
+        loss = [link_resource(src, dst, "loss")]
+        async with LOCKS.locked(loss):
             # Get current loss rate as the event might overlap with another one
-            resp = requests.get(f"{API_URL}/link_state?src={src}&dst={dst}")
-            if resp.status_code != 200:
-                print(f"Error: {resp.status_code} - {resp.text}")
-                link["loss_lock"].release_modify()
+            link_state = await get_link_state(src, dst)
+            if link_state is None:
+                LOCKS.release(lease)
                 return
-            curr_loss = resp.json().get("loss_rate", 0)
-            rate = rng.randint(1, 100)
-            perform_request("add_loss", {"src": src, "dst": dst, "loss_rate": rate})
-            link["loss_lock"].release_modify()
-            duration = rng.randint(self.min_duration, self.max_duration)
-            schedule_undo_event(duration, undo_link_loss_change, [link, "add_loss", {"src": src, "dst": dst, "loss_rate": curr_loss}])
+            curr_loss = link_state.get("loss_rate", 0)
+            await perform_request("add_loss", {"src": src, "dst": dst, "loss_rate": params["loss_rate"]})
+        schedule_undo_event(params["duration"], undo_and_release, [lease, loss, "add_loss", {"src": src, "dst": dst, "loss_rate": curr_loss}])
 
 
+@registry.register
 class ChangeBandwidthEvent(AbstractEvent):
     def __init__(self):
         super().__init__(min_duration=0, max_duration=0)  # Set min and max durations
-    
+
+    def plan(self, rng: random.Random):
+        link = get_random_link(rng, self.links)
+        src, dst = get_src_dst_from_link(link)
+        bandwidth = rng.randint(MIN_BANDWIDTH, MAX_BANDWIDTH)  # kbps
+        return {"src": src, "dst": dst, "bandwidth": bandwidth}
+
     # NOTE: this change will not be undone until the script terminates
-    def execute(self, rng: random.Random):
+    async def execute(self, params: dict):
         """
         Function to change the bandwidth on a random link.
         """
-        link = get_random_link(rng, LINKS)
-        src, dst = get_src_dst_from_link(link)
-        bandwidth = rng.randint(MIN_BANDWIDTH, MAX_BANDWIDTH)  # kbps
-        perform_request("set_bandwidth", {"src": src, "dst": dst, "bandwidth": bandwidth})    
+        await perform_request("set_bandwidth", {"src": params["src"], "dst": params["dst"], "bandwidth": params["bandwidth"]})
+
 
+# All registered chaos events by name, bound to the lab by configure_events()
+CHAOS_EVENTS = {}
 
-def chaos_monkey(rng: random.Random):
+# Coroutine executing the planned parameters for every event type of the timeline, chaos events are added by configure_events()
+EVENT_TYPES = {
+    "webserver_traffic": gen_webserver_traffic,
+    "videostreaming_traffic": gen_videostreaming_traffic,
+    "trace_traffic": trace_traffic,
+    "elementary_loss": elementary_loss,
+    "delay_spike": delay_spike,
+}
+
+
+def configure_events():
+    """
+    Bind all registered chaos events to the lab, with the targets and durations of the scenario.
+    Events that aren't part of the scenario are configured as well, so replayed timelines can execute them.
+    """
+    for name in SCENARIO["events"]:
+        registry.get_event(name)
+    CHAOS_EVENTS.clear()
+    for name, event_class in registry.EVENTS.items():
+        settings = SCENARIO["events"].get(name, {})
+        event = event_class()
+        event.configure(
+            scenario.select_nodes(NODES, settings.get("nodes")),
+            scenario.select_links(LINKS, settings.get("links")),
+            HTTP_CLIENT,
+            schedule_undo_event,
+            settings.get("duration"),
+        )
+        CHAOS_EVENTS[name] = event
+        EVENT_TYPES[name] = event.execute
+
+
+def get_chaos_rates():
     """
-    Main function to run the chaos monkey.
+    Rate of every chaos event of the scenario (all registered ones without a scenario).
+    Events without their own rate share the chaos rate by weight, which defaults to the reciprocal of their
+    (weighted) average duration, the rate at which the chaos monkey used to fire one of them.
     """
-    chaos_events = [
-        AddBogusStaticRouteEvent(),
-        ChangeOspfWeightEvent(),
-        IncreaseDelayEvent(),
-        DisconnectRandomLinkEvent(),
-        DisconnectRandomRouterEvent(),
-        MakeLinkLossyEvent(),
-        ChangeBandwidthEvent(),
+    settings = SCENARIO["events"] or {name: {"weight": 1.0, "rate": None} for name in CHAOS_EVENTS}
+    rates = {name: entry["rate"] for name, entry in settings.items() if entry["rate"] is not None}
+    shared = {name: entry["weight"] for name, entry in settings.items() if entry["rate"] is None and entry["weight"] > 0}
+    if shared:
+        total_weight = sum(shared.values())
+        chaos_rate = SCENARIO["rates"].get("chaos")
+        if chaos_rate is None:
+            average_duration = sum(CHAOS_EVENTS[name].get_average_duration() * weight for name, weight in shared.items()) / total_weight
+            if average_duration <= 0:
+                raise ValueError("The chaos events have no duration, set the chaos rate in the scenario")
+            chaos_rate = 1 / average_duration
+        rates.update({name: chaos_rate * weight / total_weight for name, weight in shared.items()})
+    return rates
+
+
+def plan_chaos_event(event: AbstractEvent, rng: random.Random):
+    return [{"type": type(event).__name__, "params": event.plan(rng)}]
+
+
+def generate_timeline(args):
+    """
+    Plan the whole run from the seed, events are not influenced by how long requests take.
+    """
+    generators = [
+        # small loss and delay events all over
+        ("loss", args.loss_rate, plan_loss_event),
+        ("delay", args.delay_rate, plan_delay_event),
     ]
+    # Every chaos event is planned as its own Poisson process
+    for name, rate in get_chaos_rates().items():
+        generators.append((f"chaos:{name}", rate, functools.partial(plan_chaos_event, CHAOS_EVENTS[name])))
+    scheduled = []
+    # The plugins are needed to replay the timeline
+    metadata = {"nodes": list(NODES), "scenario": SCENARIO["path"], "plugins": SCENARIO["plugins"]}
+    if args.traffic_trace or args.traffic_matrix:
+        # Background traffic replayed from a recorded trace or traffic matrix instead of random sessions
+        flows = []
+        if args.traffic_trace:
+            flows += traffic.load_trace(args.traffic_trace, NODES, HOST_IPS)
+        if args.traffic_matrix:
+            flows += traffic.load_matrix(args.traffic_matrix, NODES, HOST_IPS, args.duration)
+        scheduled.append(("traffic", traffic.compile_flows(flows, args.duration, args.traffic_scale)))
+        metadata["traffic"] = {"trace": args.traffic_trace, "matrix": args.traffic_matrix, "scale": args.traffic_scale}
+    else:
+        # Background traffic, emulating webserver and videostreaming traffic
+        generators.insert(0, ("traffic", args.traffic_rate, lambda rng: plan_background_traffic(rng, args.traffic_rate)))
+    metadata["rates"] = {name: rate for name, rate, _ in generators}
+    return timeline.generate_timeline(args.seed, args.duration, generators, metadata, scheduled)
 
-    # Calculate the average duration for all events
-    average_duration = sum(event.get_average_duration() for event in chaos_events) / len(chaos_events)
 
-    # Calculate the rate as the reciprocal of the average duration
-    chaos_rate = 1 / average_duration
-    while not stop_event.is_set():
-        # Randomly choose an event to trigger
-        event = rng.choice(chaos_events)
-        event.execute(rng)  # Call the event function
-        time.sleep(rng.expovariate(chaos_rate))
-        
+def validate_timeline(planned: dict):
+    """
+    Check that a (replayed) timeline only contains known event types targeting links and nodes of this lab.
+    """
+    unknown = {event["type"] for event in planned["events"]} - EVENT_TYPES.keys()
+    if unknown:
+        raise ValueError(f"Unknown event types in timeline: {unknown}")
+    for event in planned["events"]:
+        params = event["params"]
+        if "src" in params and (params["src"], params["dst"]) not in LINK_INDEX:
+            raise ValueError(f"Event {event['id']} targets unknown link {params['src']} -> {params['dst']}")
+        if "node" in params and params["node"] not in NODES:
+            raise ValueError(f"Event {event['id']} targets unknown node {params['node']}")
+        if "server" in params and params["server"] not in NODES:
+            raise ValueError(f"Event {event['id']} targets unknown node {params['server']}")
+
+
+async def execute_timeline(planned: dict, start: float):
+    """
+    Start every event of the timeline at its planned time, relative to `start` (in event loop time).
+    Every event runs as its own task, so long events can overlap without delaying the following ones.
+    """
+    # Events are scheduled on absolute times, so the time it takes to start an event doesn't add up as drift
+    for event in planned["events"]:
+        await sleep_until(start + event["time"])
+        if stop_event.is_set():
+            return
+        START_LAGS.append(asyncio.get_running_loop().time() - (start + event["time"]))
+        CURRENT_EVENT.set(event)
+        spawn(EVENT_TYPES[event["type"]](event["params"]), f"{event['type']}#{event['id']}", event)
+    await sleep_until(start + planned["duration"])
+    print("Timeline finished.")
+    stop_event.set()
 
 
+# Events that don't change the lab, they have no impact to measure
+TRAFFIC_EVENT_TYPES = ("webserver_traffic", "videostreaming_traffic", "trace_traffic")
 
 
-def event_unroller():
+def event_duration(event: dict):
+    """
+    Seconds a planned event changes the lab, None if the change stays until the teardown.
     """
-    Thread function to unroll events when their time comes.
+    params = event["params"]
+    if event["type"] == "elementary_loss":
+        return params["duration"] / 1000
+    if event["type"] == "delay_spike":
+        # Spikes are as long as they are high
+        return params["delay"] / 1000
+    return params.get("duration")
+
+
+def get_probe_pairs(value: str):
+    """
+    Host pairs from "src:dst,src:dst", by default every host probes the next one (in the order of the API).
+    """
+    if not value:
+        return [(NODES[i], NODES[(i + 1) % len(NODES)]) for i in range(len(NODES))]
+    pairs = [tuple(pair.split(":")) for pair in value.split(",")]
+    for pair in pairs:
+        if len(pair) != 2 or not set(pair) <= set(NODES):
+            raise ValueError(f"Invalid probe pair {':'.join(pair)}, expected src:dst of hosts in {NODES}")
+    return pairs
+
+
+async def event_unroller():
+    """
+    Task to unroll events when their time comes.
     """
     while not stop_event.is_set():
-        try:
-            # Get the next event
-            event = event_queue.get(timeout=1)
-            now = time.time()
-            if event.unroll_time > now:
-                # Wait until the event's unroll time, checking regularly if the stop event is set
-                while not stop_event.is_set() and time.time() < event.unroll_time:
-                    time.sleep(1)
-            # Debugging: Check event details
-            # print(f"Unrolling event: {event}")
-            # print(f"Event args: {event.args}, type: {type(event.args)}")
-            # print(f"Event action: {event.action}, callable: {callable(event.action)}")
-            
-            # Execute the event's action
-            arglist = []
-            if isinstance(event.args, (list, tuple)):  # Ensure args is iterable
-                arglist.extend(event.args)
-            else:
-                raise TypeError(f"Invalid type for event.args: {type(event.args)}")
-            
-            event.action(arglist)
-        except queue.Empty:
+        undo_added.clear()
+        if not event_queue:
+            await undo_added.wait()
             continue
-        except Exception as e:
-            print(f"Error in event unroller: {e}")
+        # Wait until the next event's unroll time, waking up if an earlier event gets scheduled
+        timeout = event_queue[0].unroll_time - asyncio.get_running_loop().time()
+        if timeout > 0:
+            try:
+                await asyncio.wait_for(undo_added.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        event = heapq.heappop(event_queue)
+        # Debugging: Check event details
+        # print(f"Unrolling event: {event}")
+        # print(f"Event args: {event.args}, type: {type(event.args)}")
+        # print(f"Event action: {event.action}, callable: {callable(event.action)}")
+
+        # Execute the event's action
+        if not isinstance(event.args, (list, tuple)):  # Ensure args is iterable
+            print(f"Error in event unroller: Invalid type for event.args: {type(event.args)}")
+            continue
+        spawn(event.action(list(event.args)), f"undo_{event.action.__name__}")
 
 
-def reset_config():
+async def reset_config():
     """
     Function to reset the configuration.
+    Returns what could not be reset, in the format of the teardown report.
     """
     print("Resetting configuration...")
-    perform_request("apply_snapshot", {"snapshot_id": INITAL_SNAPSHOT_ID})
+    data = {"snapshot_id": INITAL_SNAPSHOT_ID}
+    response = await perform_request("apply_snapshot", data)
+    if response is None or response.status_code != 200:
+        return [{"endpoint": "apply_snapshot", "data": data, "error": "request failed"}]
     print("Configuration reset complete.")
+    return []
 
-def reset_links():
+async def reset_links():
     """
-    Resets all links to their default values
+    Resets all links (in both directions) to their default values with a single request,
+    the API resets the links of every router at once and all routers concurrently.
+    Returns the links that could not be reset, in the format of the teardown report.
     """
-    for link in LINKS:
-        src, dst = get_src_dst_from_link(link)
-        print(src)
-        perform_request("reset_link", {"src": src, "dst": dst})
-
-def custom_keyboard_interrupt_handler(signal, frame):
+    print("Resetting links...")
+    response = await perform_request("reset_links", {})
+    if response is None or response.status_code != 200:
+        return [{"endpoint": "reset_links", "data": {}, "error": "request failed"}]
+    failed = response.json()["failed"]
+    print(f"Reset {response.json()['reset']} links, {len(failed)} failed.")
+    return [{"endpoint": "reset_link", "data": {"src": entry["src"], "dst": entry["dst"]}, "error": entry["error"]} for entry in failed]
+
+def custom_keyboard_interrupt_handler():
     """
-    Custom handler for keyboard interrupt (Ctrl+C).
-    Resets the configuration and waits for all threads to finish.
+    Custom handler for keyboard interrupt (Ctrl+C), signals all generators to stop.
+    The cleanup itself is done by shutdown() once main() notices the stop event.
     """
     print("\nKeyboard interrupt received. Cleaning up...")
     print("This might take a while...")
-    stop_event.set()  # Signal threads to stop
-    print("Waiting for threads to finish...")
-    for thread in threading.enumerate():
-        if thread is not threading.main_thread():  # Skip the main thread
-            print(f"Waiting for thread {thread.name} to finish...")
-            thread.join(60)  # Wait for the thread to finish
-    print("All threads finished.")
-    print("Begin unrolling events...")
-    # No need to worry about race conditions here as all other threads are dead
-    while not event_queue.empty():
-        try:
-            event = event_queue.get_nowait()  # Get the next event without blocking
-            arglist = []
-            arglist.extend(event.args) 
-            event.action(arglist)  # Execute the event's action
-        except Exception as e:
-            print(f"Error while unrolling event: {e}")
-    print("Resetting config...")
-    reset_config()  # Perform cleanup tasks
-    reset_links()
+    stop_event.set()
+
+async def run_until(deadline: float, coros: list):
+    """
+    Run the coroutines concurrently until `deadline` (in event loop time), the ones that are still running then are cancelled.
+    """
+    tasks = [asyncio.create_task(coro) for coro in coros]
+    if not tasks:
+        return
+    _, pending = await asyncio.wait(tasks, timeout=max(0, deadline - asyncio.get_running_loop().time()))
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+
+def undo_target(event: UndoEvent):
+    """
+    Router an undo event changes, the last argument of every undo action is the data of its request.
+    """
+    data = event.args[-1]
+    return data.get("node") or data.get("src")
+
+
+async def undo_all(deadline: float):
+    """
+    Execute all pending undo events. Undos of the same router run in their planned order, different routers concurrently.
+    Returns the undos that failed or didn't finish before `deadline`, in the format of the teardown report.
+    """
+    groups = {}
+    while event_queue:
+        event = heapq.heappop(event_queue)
+        groups.setdefault(undo_target(event), []).append(event)
+    print(f"Undoing {sum(map(len, groups.values()))} events on {len(groups)} routers...")
+    not_reverted = []
+
+    async def undo_group(events: list):
+        # Events are removed once they are done, what is left when the deadline is hit has timed out
+        while events:
+            event = events[0]
+            try:
+                response = await event.action(list(event.args))
+                error = None if response is not None and response.status_code == 200 else "request failed"
+            except Exception as e:
+                error = str(e)
+            if error:
+                not_reverted.append({"endpoint": event.args[-2], "data": event.args[-1], "error": error})
+            events.pop(0)
+
+    await run_until(deadline, [undo_group(events) for events in groups.values()])
+    for events in groups.values():
+        not_reverted.extend({"endpoint": event.args[-2], "data": event.args[-1], "error": "timed out"} for event in events)
+    return not_reverted
+
+
+async def reset_lab(deadline: float):
+    """
+    Reset the configuration and all links concurrently until `deadline`.
+    Returns what could not be reset, in the format of the teardown report.
+    """
+    not_reverted = {}
+
+    async def reset(name: str, coro):
+        # Reported as timed out unless the reset finishes before the deadline
+        not_reverted[name] = [{"endpoint": name, "data": {}, "error": "timed out"}]
+        not_reverted[name] = await coro
+
+    await run_until(deadline, [reset("apply_snapshot", reset_config()), reset("reset_links", reset_links())])
+    return [entry for entries in not_reverted.values() for entry in entries]
+
+
+async def shutdown(generators: list):
+    """
+    Stops the generators and running events, then reverts the lab within TEARDOWN_TIMEOUT:
+    all pending events are undone concurrently, then the configuration and all links are reset.
+    Prints and returns a report of what could not be reverted.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    deadline = start + TEARDOWN_TIMEOUT
+    for generator in generators:
+        generator.cancel()
+    await asyncio.gather(*generators, return_exceptions=True)
+    if RUNNING_TASKS:
+        print(f"Waiting up to {SHUTDOWN_GRACE}s for {len(RUNNING_TASKS)} running events to finish...")
+        _, pending = await asyncio.wait(list(RUNNING_TASKS), timeout=SHUTDOWN_GRACE)
+        for task in pending:
+            print(f"Cancelling event {task.get_name()}...")
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    print("All events finished.")
+    LOCKS.print_held()
+    # Undos have to finish first, eg. a disconnected router can't have its links reset
+    not_reverted = await undo_all(deadline)
+    not_reverted += await reset_lab(deadline)
+    duration = loop.time() - start
+    EVENT_LOG.record("teardown", duration=round(duration, 6), not_reverted=not_reverted)
+    print(f"Teardown finished in {duration:.1f}s.")
+    if not_reverted:
+        print(f"Could not revert {len(not_reverted)} changes:")
+        for entry in not_reverted:
+            print(f"  {entry['endpoint']} {entry['data']}: {entry['error']}")
+    if TRAFFIC_RESULTS is not None:
+        print("Fetching remaining traffic results...")
+        await TRAFFIC_RESULTS.flush(fetch_output)
+        TRAFFIC_RESULTS.save()
+    LOCKS.print_stats()
+    PORT_MANAGER.print_stats()
     print("Exiting program.")
-    exit(0)
+    return not_reverted
+
+
+def abort_run():
+    """
+    Called once the error budget is exhausted, stops the run like Ctrl+C.
+    """
+    print(f"\nMore than {ERROR_BUDGET.max_errors} errors, aborting the run. Cleaning up...")
+    EVENT_LOG.record("aborted", errors=ERROR_BUDGET.errors)
+    stop_event.set()
 
-# Register the custom keyboard interrupt handler
-signal.signal(signal.SIGINT, custom_keyboard_interrupt_handler)
 
+async def main(args):
+    global HTTP_CLIENT
+    global INITAL_SNAPSHOT_ID
+    global TRAFFIC_RESULTS
+    global RUN_ID
+    global EVENT_LOG
+    global ERROR_BUDGET
+    global SCENARIO
+    global PROBES
+    if args.scenario:
+        SCENARIO = scenario.load_scenario(args.scenario)
+    # Command line rates take precedence over the scenario
+    for name, rate in DEFAULT_RATES.items():
+        if getattr(args, f"{name}_rate") is None:
+            setattr(args, f"{name}_rate", SCENARIO["rates"].get(name, rate))
+    os.makedirs(LOGS_DIR, exist_ok=True)
+    RUN_ID = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    # Started before the first request, all requests are logged
+    EVENT_LOG = event_log.EventLog(os.path.join(LOGS_DIR, f"events_{RUN_ID}.jsonl"))
+    log_writer = asyncio.create_task(EVENT_LOG.run(), name="EventLog")
+    ERROR_BUDGET = event_log.ErrorBudget(args.max_errors, abort_run)
+    if args.simulate:
+        HTTP_CLIENT = simulator.FakeApi(routers=args.sim_routers, on_request=log_request)
+    else:
+        HTTP_CLIENT = http_client.ApiClient(
+            API_URL,
+            pool_size=args.pool_size,
+            timeout=args.timeout,
+            retries=args.retries,
+            on_request=log_request,
+        )
+    try:
+        # Configure the chaos_monkey using the API
+        await configure()
+
+        if args.replay:
+            planned = timeline.load_timeline(args.replay)
+            scenario_path = planned["metadata"].get("scenario")
+            registry.load_plugins(planned["metadata"].get("plugins", []), scenario_path and os.path.dirname(os.path.abspath(scenario_path)))
+        else:
+            registry.load_plugins(SCENARIO["plugins"], SCENARIO["path"] and os.path.dirname(os.path.abspath(SCENARIO["path"])))
+        configure_events()
+
+        if args.replay:
+            timeline_path = args.replay
+            validate_timeline(planned)
+            print(f"Replaying timeline {args.replay} with {len(planned['events'])} events")
+        else:
+            planned = generate_timeline(args)
+            timeline_path = args.timeline or os.path.join(LOGS_DIR, f"timeline_{RUN_ID}.json")
+            timeline.save_timeline(planned, timeline_path)
+            print(f"Wrote timeline with {len(planned['events'])} events to {timeline_path}")
+        if args.plan_only:
+            return
+
+        # Everything needed to reproduce or analyze the run, updated with the outcome at the end
+        manifest_path = os.path.join(LOGS_DIR, f"manifest_{RUN_ID}.json")
+        response = await HTTP_CLIENT.get("/lab")
+        manifest = {
+            "run_id": RUN_ID,
+            "started": datetime.now().isoformat(),
+            "seed": planned["seed"],
+            "duration": planned["duration"],
+            "metadata": planned.get("metadata", {}),
+            "args": vars(args),
+            "lab": response.json(),
+            "revision": event_log.git_revision(),
+            "api_url": API_URL,
+            "timeline": timeline_path,
+            "events": EVENT_LOG.path,
+            "traffic_results": None,
+            "probes": None,
+        }
+        event_log.write_manifest(manifest_path, manifest)
+
+        response = await HTTP_CLIENT.post("/take_snapshot")
+        INITAL_SNAPSHOT_ID = response.json()["id"]
+
+        # Register the custom keyboard interrupt handler
+        asyncio.get_running_loop().add_signal_handler(signal.SIGINT, custom_keyboard_interrupt_handler)
+        # kill -USR1 <pid> prints the currently held locks
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, LOCKS.print_held)
+
+        if args.probe_interval > 0:
+            probes_path = os.path.join(LOGS_DIR, f"probes_{RUN_ID}.json.gz")
+            manifest["probes"] = probes_path
+            PROBES = probes.Probes(get_probe_pairs(args.probe_pairs), HOST_IPS, probes_path, args.probe_interval)
+            await PROBES.measure_baseline(HTTP_CLIENT, args.probe_baseline)
+
+        wall_start = time.perf_counter()
+        loop_start = asyncio.get_running_loop().time()
+        tasks = [
+            asyncio.create_task(event_unroller(), name="EventUnroller"),
+        ]
+        if PROBES is not None:
+            tasks.append(asyncio.create_task(PROBES.run(HTTP_CLIENT, loop_start, stop_event), name="Probes"))
+        if args.traffic_results:
+            results_path = os.path.join(LOGS_DIR, f"traffic_{RUN_ID}.json.gz")
+            manifest["traffic_results"] = results_path
+            TRAFFIC_RESULTS = results.TrafficResults(results_path, timeline_path)
+            tasks.append(asyncio.create_task(TRAFFIC_RESULTS.run(fetch_output, stop_event), name="TrafficResults"))
+        tasks.append(asyncio.create_task(execute_timeline(planned, loop_start), name="Timeline"))
+        await stop_event.wait()
+        not_reverted = await shutdown(tasks)
+        if PROBES is not None:
+            impacts = PROBES.impact([event for event in planned["events"] if event["type"] not in TRAFFIC_EVENT_TYPES], event_duration)
+            PROBES.save(timeline_path, impacts)
+        manifest.update(
+            {
+                "finished": datetime.now().isoformat(),
+                "aborted": ERROR_BUDGET.exhausted,
+                "errors": ERROR_BUDGET.errors,
+                "counts": EVENT_LOG.counts,
+                "not_reverted": not_reverted,
+            }
+        )
+        event_log.write_manifest(manifest_path, manifest)
+        print(f"Run manifest written to {manifest_path}")
+        if args.simulate:
+            simulator.print_report(
+                HTTP_CLIENT,
+                time.perf_counter() - wall_start,
+                asyncio.get_running_loop().time() - loop_start,
+                START_LAGS,
+            )
+    finally:
+        await HTTP_CLIENT.aclose()
+        log_writer.cancel()
+        await asyncio.gather(log_writer, return_exceptions=True)
+        await EVENT_LOG.flush()
 
 
 if __name__ == "__main__":
@@ -611,45 +1178,92 @@ if __name__ == "__main__":
     parser.add_argument(
         "--seed", type=int, default=42, help="Random seed for reproducibility (default: 42)"
     )
+    parser.add_argument(
+        "--duration", type=float, default=3600, help="Length of the generated timeline in seconds (default: 3600)"
+    )
+    parser.add_argument(
+        "--timeline", default=None, help="File to write the generated timeline to (default: logs/timeline_<date>.json)"
+    )
+    parser.add_argument(
+        "--replay", default=None, help="Execute a previously written timeline instead of generating one"
+    )
+    parser.add_argument(
+        "--plan-only", action="store_true", help="Only generate and write the timeline, don't execute it"
+    )
     # If a custom seed is needed for traffic generation
     # parser.add_argument("--traffic_seed", type=int, default=42, help="Random seed for reproducibility of traffic generation")
     parser.add_argument(
-        "--loss_rate", type=float, default=1/8, help="Rate of loss events (default: 1/8 events per second)"
+        "--loss_rate", type=float, default=None, help="Rate of loss events (default: 1/8 events per second)"
+    )
+    parser.add_argument(
+        "--delay_rate", type=float, default=None, help="Rate of delay events (default: 1/8 events per second)"
+    )
+    parser.add_argument(
+        "--traffic_rate", type=float, default=None, help="Rate and average duration of generated background_traffic (default: 1/35 events per second)"
+    )
+    parser.add_argument(
+        "--scenario", default=None, help="TOML (or YAML) file with the rates, chaos events, their targets and durations"
+    )
+    parser.add_argument(
+        "--traffic-trace", default=None, help="CSV flow trace (start, src, dst, size/duration, rate) to replay as background traffic"
+    )
+    parser.add_argument(
+        "--traffic-matrix", default=None, help="CSV traffic matrix (time, src, dst, rate) to generate background traffic from"
+    )
+    parser.add_argument(
+        "--traffic-scale", type=float, default=1.0, help="Factor applied to the rates of trace and matrix traffic (default: 1)"
     )
     parser.add_argument(
-        "--delay_rate", type=float, default=1/8, help="Rate of delay events (default: 1/8 events per second)"
+        "--no-traffic-results", dest="traffic_results", action="store_false", help="Don't collect the output of background traffic"
     )
     parser.add_argument(
-        "--traffic_rate", type=float, default=1/35, help="Rate and average duration of generated background_traffic (default: 1/35 events per second)"
+        "--probe-interval", type=float, default=probes.PROBE_INTERVAL, help=f"Seconds between two rounds of reachability and RTT probes, 0 disables them (default: {probes.PROBE_INTERVAL})"
+    )
+    parser.add_argument(
+        "--probe-pairs", default=None, help="Host pairs to probe as src:dst,src:dst (default: every host probes the next one)"
+    )
+    parser.add_argument(
+        "--probe-baseline", type=int, default=probes.BASELINE_ROUNDS, help=f"Probe rounds before the timeline starts, to measure the baseline RTT (default: {probes.BASELINE_ROUNDS})"
+    )
+    parser.add_argument(
+        "--pool-size", type=int, default=http_client.POOL_SIZE, help=f"Number of kept-alive connections to the API (default: {http_client.POOL_SIZE})"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=http_client.TIMEOUT, help=f"Timeout of API requests in seconds (default: {http_client.TIMEOUT})"
+    )
+    parser.add_argument(
+        "--retries", type=int, default=http_client.RETRIES, help=f"Retries of failed connections and unavailable GET requests (default: {http_client.RETRIES})"
+    )
+    parser.add_argument(
+        "--ports", default="8000-8005", help="Range of ports the flowgrind daemons listen on, on every host (default: 8000-8005)"
+    )
+    parser.add_argument(
+        "--lock-timeout", type=float, default=LOCK_TIMEOUT, help=f"Seconds chaos events wait for busy links and routers before they are dropped (default: {LOCK_TIMEOUT})"
+    )
+    parser.add_argument(
+        "--simulate", action="store_true", help="Run against an in-process fake of the API instead of a lab"
+    )
+    parser.add_argument(
+        "--speedup", type=float, default=60, help="How much faster than real time a simulation runs (default: 60)"
+    )
+    parser.add_argument(
+        "--teardown-timeout", type=float, default=TEARDOWN_TIMEOUT, help=f"Seconds after which the teardown gives up on reverting the lab (default: {TEARDOWN_TIMEOUT})"
+    )
+    parser.add_argument(
+        "--max-errors", type=int, default=MAX_ERRORS, help=f"Failed requests and events after which the run is aborted (default: {MAX_ERRORS})"
+    )
+    parser.add_argument(
+        "--sim-routers", type=int, default=10, help="Number of routers of the simulated lab (default: 10)"
     )
     args = parser.parse_args()
 
     # Set the global API_URL
     API_URL = args.api_url
+    LOCK_TIMEOUT = args.lock_timeout
+    TEARDOWN_TIMEOUT = args.teardown_timeout
+    PORT_MANAGER = PortManager(*map(int, args.ports.split("-")))
 
-    # Configure the chaos_monkey using the API
-    configure()
-    rng_loss = random.Random(args.seed)
-    rng_delay = random.Random(args.seed)
-    rng_traffic = random.Random(args.seed)  # args.traffic_seed
-    rng_chaos_monkey = random.Random(args.seed)
-
-    # Start the background traffic in a separate thread
-    traffic_thread = threading.Thread(
-        target=background_traffic, daemon=True, args=(rng_traffic, args.traffic_rate), name="TrafficGenerator"
-    )
-    traffic_thread.start()
-
-    # add small loss and delay events all over
-    loss_thread = threading.Thread(target = fire_event_exponentially_distributed, args=(rng_loss , args.loss_rate, loss_event, []), name="LossGenerator", daemon=True)
-    loss_thread.start()
-
-    delay_thread = threading.Thread(target=fire_event_exponentially_distributed, args=(rng_delay, args.delay_rate, delay_event, []), name="DelayGenerator", daemon=True)
-    delay_thread.start()
-    # while True:
-    #     time.sleep(1)
-    event_unroll_thread = threading.Thread(target=event_unroller,args = (), name="EventUnroller", daemon=True)
-    event_unroll_thread.start()
-
-    # Continue with other tasks, e.g., chaos monkey
-    chaos_monkey(rng_chaos_monkey)
+    if args.simulate:
+        simulator.run(main(args), args.speedup)
+    else:
+        asyncio.run(main(args))
@@ -0,0 +1,477 @@
+import asyncio
+import copy
+import math
+import random
+import re
+import selectors
+import statistics
+import time
+import uuid
+from collections import Counter
+
+# Latency of simulated API requests, (median in ms, sigma) of a lognormal distribution per endpoint
+DEFAULT_LATENCY = (15, 0.5)
+ENDPOINT_LATENCY = {
+    "/take_snapshot": (2000, 0.3),
+    "/apply_snapshot": (20000, 0.3),
+    "/disconnect_router": (300, 0.3),
+    "/connect_router": (300, 0.3),
+    "/change_ospf_cost": (150, 0.3),
+    "/add_static_route": (150, 0.3),
+    "/rm_static_route": (150, 0.3),
+    "/reset_links": (300, 0.3),
+    "/execute": (40, 0.5),
+    # Probes wait for all pings of the batch
+    "/execute_batch": (450, 0.1),
+}
+# Default parameters of the simulated links, in the format of the lab files
+LINK_DETAILS = {"bandwidth": "100mbit", "delay": "5ms", "buffer": "100000", "loss": "0", "burst": "1250000"}
+
+
+class ScaledSelector(selectors.BaseSelector):
+    """
+    Selector that waits `speedup` times shorter than asked, the counterpart of the scaled clock of ScaledEventLoop.
+    """
+
+    def __init__(self, speedup: float):
+        self.speedup = speedup
+        self.selector = selectors.DefaultSelector()
+
+    def register(self, fileobj, events, data=None):
+        return self.selector.register(fileobj, events, data)
+
+    def unregister(self, fileobj):
+        return self.selector.unregister(fileobj)
+
+    def modify(self, fileobj, events, data=None):
+        return self.selector.modify(fileobj, events, data)
+
+    def select(self, timeout=None):
+        if timeout is not None:
+            timeout = timeout / self.speedup
+        return self.selector.select(timeout)
+
+    def close(self):
+        self.selector.close()
+
+    def get_key(self, fileobj):
+        return self.selector.get_key(fileobj)
+
+    def get_map(self):
+        return self.selector.get_map()
+
+
+class ScaledEventLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop whose clock runs `speedup` times faster than the wall clock.
+    Everything scheduled on the loop (sleeps, timeouts, call_later) runs accelerated.
+    """
+
+    def __init__(self, speedup: float):
+        self.speedup = speedup
+        self.real_start = time.monotonic()
+        super().__init__(ScaledSelector(speedup))
+
+    def time(self):
+        return self.real_start + (time.monotonic() - self.real_start) * self.speedup
+
+
+def run(main, speedup: float = 1.0):
+    """
+    Run the coroutine `main` on a ScaledEventLoop, like asyncio.run().
+    """
+    loop = ScaledEventLoop(speedup)
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(main)
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+class SimulatedError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class FakeResponse:
+    """
+    The parts of an httpx response used by the chaos monkey.
+    """
+
+    def __init__(self, status_code: int, data: dict):
+        self.status_code = status_code
+        self.data = data
+
+    def json(self):
+        return self.data
+
+    @property
+    def text(self):
+        return str(self.data)
+
+
+class FakeApi:
+    """
+    In-process stand-in for the orchestration API, with the same interface as http_client.ApiClient.
+    The lab (a ring of routers with random chords) and all changes to it are only kept in memory.
+    Requests take a random, endpoint dependent time on the event loop; loss bursts and delay spikes
+    additionally take their duration, like the real API.
+    """
+
+    def __init__(self, routers: int = 10, seed: int = 0, latency_scale: float = 1.0, on_request=None):
+        self.rng = random.Random(seed)
+        self.latency_scale = latency_scale
+        # on_request(method, endpoint, data, status_code, latency_ms, error) is called after every request
+        self.on_request = on_request
+
+        self.routers = [f"r{i}" for i in range(1, routers + 1)]
+        self.router_ips = {name: f"10.{i}.0.1" for i, name in enumerate(self.routers, start=1)}
+        self.host_ips = {name: f"10.{i}.1.1" for i, name in enumerate(self.routers, start=1)}
+        # Undirected links of the lab, in the order returned by /links
+        self.lab_links = [(self.routers[i], self.routers[(i + 1) % routers]) for i in range(routers)]
+        for _ in range(routers // 2):
+            src, dst = self.rng.sample(self.routers, 2)
+            if (src, dst) not in self.lab_links and (dst, src) not in self.lab_links:
+                self.lab_links.append((src, dst))
+        # tc state of every direction of a link
+        self.link_states = {}
+        for src, dst in self.lab_links:
+            self.link_states[(src, dst)] = dict(LINK_DETAILS)
+            self.link_states[(dst, src)] = dict(LINK_DETAILS)
+        # Routing configuration, this is what snapshots capture
+        self.frr_config = {"ospf_costs": {}, "static_routes": set()}
+        self.snapshots = {}
+        self.disconnected = set()
+        # (node, port) -> loop time until which a traffic command listens on the port
+        self.ports = {}
+        # ID -> (command, start time) of detached commands whose output is kept
+        self.commands = {}
+        # Links with a running loss burst/delay spike, overlapping impulses indicate a locking bug
+        self.active_bursts = set()
+        self.active_spikes = set()
+
+        self.requests = Counter()
+        self.errors = Counter()
+        self.conflicts = []
+        self.handlers = {
+            ("GET", "/available_routers"): self.available_routers,
+            ("GET", "/links"): self.links,
+            ("GET", "/lab"): lambda data: {"lab": "simulated", "prefix": "sim", "routers": self.routers, "links": len(self.lab_links)},
+            ("GET", "/router_ips"): lambda data: {"ips": self.router_ips},
+            ("GET", "/host_ips"): lambda data: {"ips": self.host_ips},
+            ("GET", "/link_state"): self.link_state,
+            ("GET", "/cmd_output"): self.cmd_output,
+            ("POST", "/add_loss"): self.add_loss,
+            ("POST", "/add_delay"): self.add_delay,
+            ("POST", "/set_bandwidth"): self.set_bandwidth,
+            ("POST", "/reset_link"): self.reset_link,
+            ("POST", "/reset_links"): self.reset_links,
+            ("POST", "/loss_burst"): self.loss_burst,
+            ("POST", "/delay_spike"): self.delay_spike,
+            ("POST", "/change_ospf_cost"): self.change_ospf_cost,
+            ("POST", "/add_static_route"): self.add_static_route,
+            ("POST", "/rm_static_route"): self.rm_static_route,
+            ("POST", "/disconnect_router"): self.disconnect_router,
+            ("POST", "/connect_router"): self.connect_router,
+            ("POST", "/take_snapshot"): self.take_snapshot,
+            ("POST", "/apply_snapshot"): self.apply_snapshot,
+            ("POST", "/execute"): self.execute,
+            ("POST", "/execute_batch"): self.execute_batch,
+        }
+
+    async def request(self, method: str, endpoint: str, **kwargs):
+        endpoint = f"/{endpoint.lstrip('/')}"
+        data = kwargs.get("json", kwargs.get("params")) or {}
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        self.requests[endpoint] += 1
+        median, sigma = ENDPOINT_LATENCY.get(endpoint, DEFAULT_LATENCY)
+        await asyncio.sleep(self.rng.lognormvariate(math.log(median), sigma) * self.latency_scale / 1000)
+        handler = self.handlers.get((method, endpoint))
+        try:
+            if handler is None:
+                raise SimulatedError(404, "Not Found")
+            result = handler(data)
+            if asyncio.iscoroutine(result):
+                result = await result
+            response = FakeResponse(200, result)
+        except SimulatedError as e:
+            self.errors[(endpoint, e.status_code)] += 1
+            response = FakeResponse(e.status_code, {"detail": e.detail})
+        if self.on_request is not None:
+            self.on_request(method, endpoint, data, response.status_code, (loop.time() - start) * 1000, None)
+        return response
+
+    async def get(self, endpoint: str, params: dict = None):
+        return await self.request("GET", endpoint, params=params)
+
+    async def post(self, endpoint: str, json: dict = None):
+        return await self.request("POST", endpoint, json=json)
+
+    async def aclose(self):
+        pass
+
+    def check_node(self, node: str):
+        if node not in self.routers:
+            raise SimulatedError(404, f"No such node: {node}")
+
+    def get_link(self, data: dict):
+        if (data.get("src"), data.get("dst")) not in self.link_states:
+            raise SimulatedError(404, f"No link from {data.get('src')} to {data.get('dst')}")
+        return self.link_states[(data["src"], data["dst"])]
+
+    def conflict(self, description: str):
+        print(f"Simulator: {description}")
+        self.conflicts.append(description)
+
+    def available_routers(self, data):
+        return {"routers": self.routers}
+
+    def links(self, data):
+        return {"links": [{"src": src, "dst": dst, "details": dict(LINK_DETAILS)} for src, dst in self.lab_links]}
+
+    def link_state(self, data):
+        return dict(self.get_link(data))
+
+    def add_loss(self, data):
+        self.get_link(data)["loss"] = f"{data['loss_rate']:g}%"
+        return {"output": "", "exit_code": 0}
+
+    def add_delay(self, data):
+        self.get_link(data)["delay"] = f"{data['delay']:g}ms"
+        return {"output": "", "exit_code": 0}
+
+    def set_bandwidth(self, data):
+        self.get_link(data)["bandwidth"] = f"{data['bandwidth']}kbit"
+        return {"output": "", "exit_code": 0}
+
+    def reset_link(self, data):
+        self.get_link(data).update(LINK_DETAILS)
+        return {"output": "", "exit_code": 0}
+
+    def reset_links(self, data):
+        links = [(link["src"], link["dst"]) for link in data["links"]] if data.get("links") is not None else self.link_states
+        for link in links:
+            self.get_link({"src": link[0], "dst": link[1]}).update(LINK_DETAILS)
+        return {"reset": len(links), "failed": []}
+
+    async def impulse(self, data: dict, active: set, kind: str):
+        self.get_link(data)
+        link = (data["src"], data["dst"])
+        if link in active:
+            self.conflict(f"overlapping {kind} on {link[0]} -> {link[1]}")
+        active.add(link)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            await asyncio.sleep(data["duration"] / 1000)
+        finally:
+            active.discard(link)
+        return {
+            "requested_duration": data["duration"],
+            "measured_duration": (loop.time() - start) * 1000,
+            "output": "",
+        }
+
+    async def loss_burst(self, data):
+        return await self.impulse(data, self.active_bursts, "loss bursts")
+
+    async def delay_spike(self, data):
+        return await self.impulse(data, self.active_spikes, "delay spikes")
+
+    def change_ospf_cost(self, data):
+        self.get_link(data)
+        self.frr_config["ospf_costs"][(data["src"], data["dst"])] = data["cost"]
+        return {"output": "", "exit_code": 0}
+
+    def add_static_route(self, data):
+        self.check_node(data["node"])
+        self.frr_config["static_routes"].add((data["node"], data["destination"], data["next_hop"]))
+        return {"output": "", "exit_code": 0}
+
+    def rm_static_route(self, data):
+        route = (data["node"], data["destination"], data["next_hop"])
+        if route not in self.frr_config["static_routes"]:
+            raise SimulatedError(500, f"No such static route: {route}")
+        self.frr_config["static_routes"].remove(route)
+        return {"output": "", "exit_code": 0}
+
+    def disconnect_router(self, data):
+        self.check_node(data["node"])
+        self.disconnected.add(data["node"])
+        return {"status": "disconnected", "name": data["node"]}
+
+    def connect_router(self, data):
+        self.check_node(data["node"])
+        self.disconnected.discard(data["node"])
+        return {"status": "connected", "name": data["node"]}
+
+    def take_snapshot(self, data):
+        snapshot_id = uuid.uuid4().hex[:8]
+        self.snapshots[snapshot_id] = copy.deepcopy(self.frr_config)
+        return {"output": "", "id": snapshot_id}
+
+    def apply_snapshot(self, data):
+        if data["snapshot_id"] not in self.snapshots:
+            raise SimulatedError(404, "No such snapshot")
+        self.frr_config = copy.deepcopy(self.snapshots[data["snapshot_id"]])
+        return {"output": "", "exit_code": 0}
+
+    def execute(self, data):
+        self.check_node(data["node"])
+        now = asyncio.get_running_loop().time()
+        # Traffic commands listen on the ports of the server for their duration
+        duration = re.search(r"-T s=(\d+)", data["cmd"])
+        for port in set(re.findall(r",d=[^:]+:(\d+)", data["cmd"])):
+            key = (data["node"], int(port))
+            if self.ports.get(key, 0) > now:
+                self.conflict(f"port {port} on {data['node']} is already in use")
+                raise SimulatedError(500, f"Address already in use: {port}")
+            if duration:
+                self.ports[key] = now + int(duration.group(1))
+        if data.get("detach"):
+            cmd_id = uuid.uuid4().hex[:8]
+            if data.get("log_output"):
+                self.commands[cmd_id] = (data["cmd"], now)
+            return {"ID": cmd_id}
+        return {"output": "", "exit_code": 0}
+
+    def execute_batch(self, data):
+        results = []
+        for command in data["commands"]:
+            if command["node"] not in self.routers:
+                results.append({"error": f"Invalid node: {command['node']}", "status_code": 404})
+            else:
+                results.append({"output": self.ping_output(command["node"], command["cmd"]), "exit_code": 0})
+        return {"results": results}
+
+    def route(self, src: str, dst: str):
+        """
+        Links of the path with the fewest hops from src to dst, avoiding disconnected routers and links that are down.
+        None if dst is unreachable.
+        """
+        if src in self.disconnected or dst in self.disconnected:
+            return None
+        previous = {src: None}
+        queue = [src]
+        for node in queue:
+            if node == dst:
+                break
+            for (a, b), state in self.link_states.items():
+                if a == node and b not in previous and b not in self.disconnected and state["loss"] != "100%":
+                    previous[b] = node
+                    queue.append(b)
+        if dst not in previous:
+            return None
+        links = []
+        node = dst
+        while previous[node] is not None:
+            links.append((previous[node], node))
+            node = previous[node]
+        return links
+
+    def ping_output(self, src: str, cmd: str):
+        """
+        Summary of ping between the hosts of two routers, echo requests and replies take the same route
+        and see the loss and delay of its links.
+        """
+        count = int(re.search(r"-c (\d+)", cmd).group(1))
+        dst_ip = cmd.split()[-1]
+        dst = next(node for node, ip in self.host_ips.items() if ip == dst_ip)
+        received = 0
+        rtt = 0
+        route = self.route(src, dst)
+        if route is not None:
+            directions = route + [(b, a) for a, b in route]
+            delivered = math.prod(1 - float(self.link_states[link]["loss"].rstrip("%")) / 100 for link in directions)
+            received = sum(self.rng.random() < delivered for _ in range(count))
+            rtt = 0.1 + sum(float(self.link_states[link]["delay"].rstrip("ms")) for link in directions)
+        lines = [
+            f"--- {dst_ip} ping statistics ---",
+            f"{count} packets transmitted, {received} received, {100 * (count - received) // count}% packet loss, time 400ms",
+        ]
+        if received:
+            lines.append(f"rtt min/avg/max/mdev = {rtt:.3f}/{rtt:.3f}/{rtt:.3f}/0.000 ms")
+        return "\n".join(lines) + "\n"
+
+    def cmd_output(self, data):
+        if data.get("cmd_id") not in self.commands:
+            raise SimulatedError(404, "No such ID")
+        cmd, start = self.commands[data["cmd_id"]]
+        elapsed = asyncio.get_running_loop().time() - start
+        return {"output": self.flowgrind_output(cmd, elapsed), "exit_code": 0}
+
+    def flowgrind_output(self, cmd: str, elapsed: float):
+        """
+        Made up flowgrind output with an interval and a final report for every flow that has ended.
+        """
+        lines = ["# ID begin end through RTT RTT RTT IAT IAT IAT cwnd ssth uack sack lost retr tret fack reor bkof rtt rttvar rto ca state smss pmtu"]
+        for flow in re.finditer(r"-F (\d+) (.*?)(?= -F |$)", cmd):
+            flow_id, options = int(flow.group(1)), flow.group(2)
+            duration = re.search(r"-T s=([\d.]+)", options)
+            duration = float(duration.group(1)) if duration else 10
+            delay = re.search(r"-Y s=([\d.]+)", options)
+            if elapsed < duration + (float(delay.group(1)) if delay else 0):
+                continue
+            rate = re.search(r"-R s=([\d.]+)kb", options)
+            through = float(rate.group(1)) / 1000 if rate else self.rng.uniform(1, 10)
+            rtt = sorted(self.rng.uniform(5, 50) for _ in range(3))
+            lost = self.rng.randint(0, 3)
+            for endpoint, out, received in (("S", through, 0.0), ("D", 0.0, through)):
+                lines.append(
+                    f"{endpoint} {flow_id} 0.000 {duration:.3f} {through:.6f} {rtt[0]:.3f} {rtt[1]:.3f} {rtt[2]:.3f} "
+                    f"0.1 0.2 0.3 10 2147483647 0 0 {lost} 0 {lost} 0 0 0 {rtt[1] * 1000:.0f} 1000 204000 open 1448 1500"
+                )
+                lines.append(
+                    f"# ID {flow_id} {endpoint}: 10.0.0.1 (Linux 5.15.0), random seed: 0, "
+                    f"flow duration = {duration:.3f}s/{duration:.3f}s (real/req), "
+                    f"through = {out:.6f}/{received:.6f}Mbit/s (out/in), "
+                    f"RTT = {rtt[0]:.3f}/{rtt[1]:.3f}/{rtt[2]:.3f} ms (min/avg/max)"
+                )
+        return "\n".join(lines)
+
+    def leftover_state(self):
+        """
+        Changes that are still present in the lab, expected to be empty after the chaos monkey cleaned up.
+        """
+        leftovers = []
+        for (src, dst), state in self.link_states.items():
+            changed = {key: value for key, value in state.items() if LINK_DETAILS[key] != value}
+            if changed:
+                leftovers.append(f"link {src} -> {dst}: {changed}")
+        for node in sorted(self.disconnected):
+            leftovers.append(f"router {node} is disconnected")
+        for route in sorted(self.frr_config["static_routes"]):
+            leftovers.append(f"static route {route}")
+        for (src, dst), cost in self.frr_config["ospf_costs"].items():
+            leftovers.append(f"ospf cost {src} -> {dst}: {cost}")
+        return leftovers
+
+
+def print_report(api: FakeApi, wall_time: float, virtual_time: float, lags: list):
+    """
+    Print the throughput of the scheduler and the results of the simulated run.
+    """
+    print("\nSimulation report")
+    print(f"  virtual time: {virtual_time:.1f} s, wall time: {wall_time:.2f} s ({virtual_time / wall_time:.1f}x)")
+    print(f"  events started: {len(lags)} ({len(lags) / wall_time:.1f} per wall second)")
+    if lags:
+        lags_ms = sorted(lag * 1000 for lag in lags)
+        p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+        print(f"  start lag (virtual ms): median {statistics.median(lags_ms):.1f}, p99 {p99:.1f}, max {lags_ms[-1]:.1f}")
+    print(f"  requests: {sum(api.requests.values())}")
+    for endpoint, count in api.requests.most_common():
+        print(f"    {endpoint}: {count}")
+    for (endpoint, status_code), count in sorted(api.errors.items()):
+        print(f"  errors {endpoint} ({status_code}): {count}")
+    print(f"  conflicts: {len(api.conflicts)}")
+    for conflict in api.conflicts:
+        print(f"    {conflict}")
+    leftovers = api.leftover_state()
+    print(f"  leftover state: {len(leftovers)}")
+    for leftover in leftovers:
+        print(f"    {leftover}")
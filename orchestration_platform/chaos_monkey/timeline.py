@@ -0,0 +1,95 @@
+import json
+import random
+
+TIMELINE_VERSION = 1
+
+
+def child_rng(rng: random.Random):
+    """
+    Derive a separate rng for a planned event, so that the number of random draws of one event
+    doesn't shift the choices of all following events.
+    """
+    return random.Random(rng.getrandbits(64))
+
+
+def poisson_arrivals(rng: random.Random, rate: float, duration: float):
+    """
+    Arrival times (in seconds from the start) of a Poisson process with the given rate within duration.
+    """
+    times = []
+    if rate <= 0:
+        return times
+    t = rng.expovariate(rate)
+    while t < duration:
+        times.append(t)
+        t += rng.expovariate(rate)
+    return times
+
+
+def generate_timeline(seed: int, duration: float, generators: list, metadata: dict = None, scheduled: list = None):
+    """
+    Generate the complete timeline of a chaos run from the seed, without executing anything.
+
+    Args:
+        seed: Seed of the run, every generator gets its own rng derived from it and its name
+        duration: Length of the run in seconds
+        generators: List of (name, rate, plan) tuples. plan(rng) returns a list of planned events
+                    {"type", "params", optionally "offset" in seconds relative to the arrival}
+        metadata: Additional information stored with the timeline (eg. rates, lab)
+        scheduled: List of (name, events) with events at fixed times {"time", "type", "params"} (eg. from a traffic trace)
+
+    Returns:
+        dict: Timeline with the events sorted by their start time
+    """
+    events = []
+    for name, rate, plan in generators:
+        # Seeding with the name keeps generators with the same rate from producing the same arrivals
+        rng = random.Random(f"{seed}:{name}")
+        for arrival in poisson_arrivals(rng, rate, duration):
+            for planned in plan(child_rng(rng)):
+                start = arrival + planned.get("offset", 0)
+                if start >= duration:
+                    continue
+                events.append(
+                    {
+                        "time": round(start, 6),
+                        "generator": name,
+                        "type": planned["type"],
+                        "params": planned["params"],
+                    }
+                )
+    for name, planned_events in scheduled or []:
+        for planned in planned_events:
+            if planned["time"] < duration:
+                events.append(
+                    {
+                        "time": round(planned["time"], 6),
+                        "generator": name,
+                        "type": planned["type"],
+                        "params": planned["params"],
+                    }
+                )
+    # Sort by time, ties are broken by generator to stay deterministic
+    events.sort(key=lambda event: (event["time"], event["generator"]))
+    for event_id, event in enumerate(events):
+        event["id"] = event_id
+    return {
+        "version": TIMELINE_VERSION,
+        "seed": seed,
+        "duration": duration,
+        "metadata": metadata or {},
+        "events": events,
+    }
+
+
+def save_timeline(timeline: dict, path: str):
+    with open(path, "w") as f:
+        json.dump(timeline, f, indent=1)
+
+
+def load_timeline(path: str):
+    with open(path) as f:
+        timeline = json.load(f)
+    if timeline.get("version") != TIMELINE_VERSION:
+        raise ValueError(f"Unsupported timeline version {timeline.get('version')} in {path}")
+    return timeline
@@ -0,0 +1,141 @@
+import csv
+from collections import defaultdict
+
+# Rate of trace flows that only have a size
+DEFAULT_RATE = 1_000_000  # bit/s
+# Flows of a host starting within this window are launched by the same flowgrind command
+BATCH_WINDOW = 1  # s
+MAX_FLOWS_PER_COMMAND = 32
+# Matrix entries are split into flows of at most this length
+MAX_MATRIX_FLOW_DURATION = 60  # s
+# Flows are never shorter than this, flowgrind only takes whole seconds
+MIN_FLOW_DURATION = 1  # s
+
+
+def resolve_node(value: str, nodes, host_ips: dict):
+    """
+    Traces can refer to hosts by the name of their router or by their IP.
+    """
+    if value in nodes:
+        return value
+    for node, ip in host_ips.items():
+        if ip == value:
+            return node
+    raise ValueError(f"Unknown host in traffic file: {value}")
+
+
+def load_trace(path: str, nodes, host_ips: dict):
+    """
+    Read a flow trace (eg. exported NetFlow records) from a CSV file with the columns
+    start (s), src, dst and at least one of size (bytes) or duration (s), optionally rate (bit/s).
+    Start times are relative to the first flow of the trace.
+
+    Returns:
+        list: Flows {"start", "src", "dst", "duration", "rate"}
+    """
+    flows = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            size = float(row["size"]) if row.get("size") else None
+            rate = float(row["rate"]) if row.get("rate") else None
+            duration = float(row["duration"]) if row.get("duration") else None
+            if duration is None and size is None:
+                raise ValueError(f"Flow without size or duration in {path}: {row}")
+            if rate is None:
+                rate = size * 8 / duration if size is not None and duration else DEFAULT_RATE
+            if duration is None:
+                duration = size * 8 / rate
+            flows.append(
+                {
+                    "start": float(row["start"]),
+                    "src": resolve_node(row["src"], nodes, host_ips),
+                    "dst": resolve_node(row["dst"], nodes, host_ips),
+                    "duration": duration,
+                    "rate": rate,
+                }
+            )
+    if flows:
+        first = min(flow["start"] for flow in flows)
+        for flow in flows:
+            flow["start"] -= first
+    return flows
+
+
+def load_matrix(path: str, nodes, host_ips: dict, duration: float):
+    """
+    Read a time-varying traffic matrix from a CSV file with the columns time (s), src, dst and rate (bit/s).
+    The rate between src and dst holds until the next entry of the pair, or until the end of the run,
+    eg. one entry per pair and hour describes a diurnal load.
+
+    Returns:
+        list: Flows {"start", "src", "dst", "duration", "rate"}
+    """
+    entries = defaultdict(list)
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            pair = (resolve_node(row["src"], nodes, host_ips), resolve_node(row["dst"], nodes, host_ips))
+            entries[pair].append((float(row["time"]), float(row["rate"])))
+    flows = []
+    for (src, dst), steps in entries.items():
+        steps.sort()
+        for i, (start, rate) in enumerate(steps):
+            end = steps[i + 1][0] if i + 1 < len(steps) else duration
+            if rate <= 0:
+                continue
+            # Long intervals are split, so that flows are restarted regularly like real connections
+            while start < end:
+                flow_duration = min(MAX_MATRIX_FLOW_DURATION, end - start)
+                flows.append({"start": start, "src": src, "dst": dst, "duration": flow_duration, "rate": rate})
+                start += flow_duration
+    return flows
+
+
+def compile_flows(flows: list, duration: float, scale: float = 1.0):
+    """
+    Compile flows into planned traffic events for the timeline. Flows of the same source host that start
+    within BATCH_WINDOW are batched into a single flowgrind launch, the flows start with a delay
+    relative to the launch. The rate of every flow is multiplied by scale.
+
+    Returns:
+        list: Planned events {"time", "type": "trace_traffic", "params"}
+    """
+    by_host = defaultdict(list)
+    for flow in flows:
+        if 0 <= flow["start"] < duration and flow["src"] != flow["dst"]:
+            by_host[flow["src"]].append(flow)
+    events = []
+    for server, host_flows in by_host.items():
+        host_flows.sort(key=lambda flow: flow["start"])
+        batch = []
+        for flow in host_flows:
+            if batch and (flow["start"] - batch[0]["start"] >= BATCH_WINDOW or len(batch) == MAX_FLOWS_PER_COMMAND):
+                events.append(batch_event(server, batch, scale))
+                batch = []
+            batch.append(flow)
+        if batch:
+            events.append(batch_event(server, batch, scale))
+    events.sort(key=lambda event: (event["time"], event["params"]["server"]))
+    return events
+
+
+def batch_event(server: str, batch: list, scale: float):
+    launch = batch[0]["start"]
+    flows = [
+        {
+            "dst": flow["dst"],
+            "delay": round(flow["start"] - launch, 3),
+            "duration": max(MIN_FLOW_DURATION, round(flow["duration"])),
+            "rate": flow["rate"] * scale,
+        }
+        for flow in batch
+    ]
+    return {
+        "time": launch,
+        "type": "trace_traffic",
+        "params": {
+            "server": server,
+            "flows": flows,
+            # Time until the last flow of the batch ends
+            "duration": max(flow["delay"] + flow["duration"] for flow in flows),
+        },
+    }
@@ -8,8 +8,25 @@ LAB_PREFIX = None
 LAB_NAMES = ()
 LAB_LINKS = ()
 IPS = {}
+# Host IPs are only fetched via DNS when first needed
+HOST_IPS = {}
 EVENT_DATABASE = {}
 SNAPSHOTS = {}
+# Links that were brought down with /link_down, frozenset({src, dst}) -> {node: interface}
+DOWN_LINKS = {}
+# Cache of the last collected routing state (see /routing_state)
+ROUTING_STATE = {"state": None, "collected": 0.0, "time": None}
+ROUTING_STATE_TTL = 2.0  # s
+# Default deadline of commands executed in containers, killed in the container once it is over
+EXEC_TIMEOUT = 30  # s
+FRR_RELOAD_TIMEOUT = 120  # s
+# Retries of docker calls that failed before reaching the container (e.g. daemon restarting)
+EXEC_RETRIES = 2
+EXEC_RETRY_BACKOFF = 0.1  # s, doubled for every retry
+# Timeout of the HTTP connection to the docker daemon, must be longer than any exec deadline
+DOCKER_TIMEOUT = 300  # s
+# Functions called as hook(container_name, cmd, duration, exec_result) after every exec
+EXEC_HOOKS = []
 LABS_DIR = None
 LOGS_DIR = None
 PORT = None
@@ -75,6 +92,11 @@ class RemoveChangeRequest(BaseModel):
     dst: str
 
 
+class ResetLinksRequest(BaseModel):
+    # Links to reset, all links in both directions if not given
+    links: list[RemoveChangeRequest] | None = None
+
+
 class GenFlowRequest(BaseModel):
     src: str
     dst: str
@@ -137,3 +159,43 @@ class ExecuteRequest(BaseModel):
     router: bool
     cmd: str
     detach: bool = False
+    # Only with detach, store the output of the command for /cmd_output
+    log_output: bool = False
+    # Without detach, deadline of the command in seconds, defaults to EXEC_TIMEOUT, 0 disables it
+    timeout: float | None = None
+
+
+class BatchCommand(BaseModel):
+    node: str
+    router: bool
+    cmd: str
+
+
+class ExecuteBatchRequest(BaseModel):
+    commands: list[BatchCommand]
+    # Deadline of every command, defaults to EXEC_TIMEOUT
+    timeout: float | None = None
+
+
+class LinkStateRequest(BaseModel):
+    src: str
+    dst: str
+    measure_convergence: bool = True
+    convergence_timeout: float = 60  # s
+    poll_interval: float = 0.5  # s
+    # Number of consecutive unchanged polls after the first change after which the routing state is considered converged
+    stable_polls: int = 3
+
+
+class LossBurstRequest(BaseModel):
+    src: str
+    dst: str
+    duration: float  # ms
+    loss_rate: float = 100
+
+
+class DelaySpikeRequest(BaseModel):
+    src: str
+    dst: str
+    delay: float  # ms, added to the current delay of the link
+    duration: float  # ms
@@ -0,0 +1,175 @@
+"""Minimal Prometheus style metrics for the orchestration API.
+
+Implements labelled counters, histograms and callback gauges and renders them in
+the Prometheus text exposition format, so no client library is required.
+"""
+
+import math
+import threading
+
+import config
+
+# Buckets in seconds, docker execs range from a few ms (tc) to seconds (vtysh, frr-reload)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REGISTRY = []
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    """Base class of all metrics, registers itself in REGISTRY."""
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, description: str, labelnames: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Counter(Metric):
+    """A value that only goes up, e.g. the number of requests."""
+
+    metric_type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that is computed by calling `function` whenever the metrics are rendered."""
+
+    metric_type = "gauge"
+
+    def __init__(self, name: str, description: str, function):
+        super().__init__(name, description)
+        self.function = function
+
+    def samples(self):
+        return [f"{self.name} {_format_value(self.function())}"]
+
+
+class Histogram(Metric):
+    """Distribution of observed values (e.g. latencies) in cumulative buckets."""
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            # [count per bucket..., sum, count]
+            data = self.values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+                    break
+            data[-2] += value
+            data[-1] += 1
+
+    def samples(self):
+        with self.lock:
+            values = {key: list(data) for key, data in self.values.items()}
+        lines = []
+        for key, data in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, data):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(data[-2])}")
+            lines.append(f"{self.name}_count{labels} {data[-1]}")
+        return lines
+
+
+def render():
+    """Render all registered metrics in the Prometheus text format."""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+REQUESTS = Counter(
+    "orchestration_api_requests_total",
+    "Number of handled API requests.",
+    ("method", "endpoint", "status"),
+)
+REQUEST_DURATION = Histogram(
+    "orchestration_api_request_duration_seconds",
+    "Latency of API requests.",
+    ("method", "endpoint"),
+)
+CONTAINER_EXEC_DURATION = Histogram(
+    "orchestration_container_exec_duration_seconds",
+    "Latency of commands executed in containers.",
+    ("container",),
+)
+CONTAINER_EXEC_FAILURES = Counter(
+    "orchestration_container_exec_failures_total",
+    "Number of commands executed in containers that failed or returned a non-zero exit code.",
+    ("container",),
+)
+DOCKER_API_CALLS = Counter(
+    "orchestration_docker_api_calls_total",
+    "Number of calls to the Docker API.",
+    ("call",),
+)
+DOCKER_API_ERRORS = Counter(
+    "orchestration_docker_api_errors_total",
+    "Number of calls to the Docker API that raised an error.",
+    ("call",),
+)
+Gauge(
+    "orchestration_event_database_size",
+    "Number of entries in the event database (detached commands).",
+    lambda: len(config.EVENT_DATABASE),
+)
+Gauge(
+    "orchestration_snapshots",
+    "Number of stored configuration snapshots.",
+    lambda: len(config.SNAPSHOTS),
+)
+Gauge(
+    "orchestration_down_links",
+    "Number of links that are currently brought down.",
+    lambda: len(config.DOWN_LINKS),
+)
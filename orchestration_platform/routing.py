@@ -0,0 +1,231 @@
+"""Helpers to turn the JSON output of FRR into a compact routing state.
+
+Everything in here works on already parsed JSON, the commands themselves are
+executed in app_logic.py.
+"""
+
+import ipaddress
+
+
+def normalize_routes(route_json: dict) -> dict:
+    """Normalize the output of `show ip route json` to the routes installed in the FIB.
+
+    Args:
+        route_json: Parsed output of `show ip route json`
+
+    Returns:
+        dict: prefix -> list of next hops {"protocol", "via", "interface"},
+        "via" is None for directly connected prefixes
+    """
+    fib = {}
+    for prefix, entries in route_json.items():
+        next_hops = []
+        for entry in entries:
+            if not entry.get("installed", entry.get("selected", False)):
+                continue
+            for next_hop in entry.get("nexthops", []):
+                if not next_hop.get("fib", next_hop.get("active", False)):
+                    continue
+                next_hops.append(
+                    {
+                        "protocol": entry.get("protocol"),
+                        "via": None if next_hop.get("directlyConnected") else next_hop.get("ip"),
+                        "interface": next_hop.get("interfaceName"),
+                    }
+                )
+        if next_hops:
+            fib[prefix] = next_hops
+    return fib
+
+
+def normalize_ospf_neighbors(ospf_json: dict) -> dict:
+    """Normalize the output of `show ip ospf neighbor json`.
+
+    Args:
+        ospf_json: Parsed output of `show ip ospf neighbor json`
+
+    Returns:
+        dict: neighbor router ID -> list of adjacencies {"state", "interface", "address"}
+    """
+    neighbors = {}
+    for neighbor_id, entries in ospf_json.get("neighbors", {}).items():
+        # Older FRR versions return a single dict instead of a list per neighbor
+        if isinstance(entries, dict):
+            entries = [entries]
+        neighbors[neighbor_id] = [
+            {
+                "state": entry.get("nbrState", entry.get("state")),
+                "interface": entry.get("ifaceName"),
+                "address": entry.get("ifaceAddress", entry.get("address")),
+            }
+            for entry in entries
+        ]
+    return neighbors
+
+
+def normalize_bgp_routes(bgp_json: dict) -> dict:
+    """Normalize the output of `show bgp ipv4 json` to the valid paths per prefix.
+
+    Args:
+        bgp_json: Parsed output of `show bgp ipv4 json`
+
+    Returns:
+        dict: prefix -> list of paths {"as_path", "next_hop", "best"}
+    """
+    routes = {}
+    for prefix, paths in bgp_json.get("routes", {}).items():
+        valid_paths = []
+        for path in paths:
+            if not path.get("valid", False):
+                continue
+            next_hops = path.get("nexthops", [])
+            valid_paths.append(
+                {
+                    "as_path": path.get("path", ""),
+                    "next_hop": next_hops[0].get("ip") if next_hops else None,
+                    "best": bool(path.get("bestpath", False)),
+                }
+            )
+        if valid_paths:
+            routes[prefix] = valid_paths
+    return routes
+
+
+def normalize_interfaces(interface_json: dict) -> dict:
+    """Normalize the output of `show interface json`.
+
+    Args:
+        interface_json: Parsed output of `show interface json`
+
+    Returns:
+        dict: interface name -> {"up", "addresses"} with addresses in CIDR notation
+    """
+    interfaces = {}
+    for name, data in interface_json.items():
+        if not isinstance(data, dict):
+            continue
+        interfaces[name] = {
+            "up": data.get("operationalStatus") == "up",
+            "addresses": [address["address"] for address in data.get("ipAddresses", []) if "address" in address],
+        }
+    return interfaces
+
+
+class PrefixTrie:
+    """Binary radix trie over IPv4 prefixes for longest-prefix matching.
+
+    Every node is a list [child for bit 0, child for bit 1, value], a value of
+    None means that no prefix ends at this node.
+    """
+
+    def __init__(self):
+        self.root = [None, None, None]
+
+    def insert(self, prefix: str, value):
+        """Insert a prefix (e.g. "10.0.0.0/8") with an associated value."""
+        network = ipaddress.ip_network(prefix, strict=False)
+        if network.version != 4:
+            return
+        bits = int(network.network_address)
+        node = self.root
+        for i in range(network.prefixlen):
+            bit = (bits >> (31 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        node[2] = (str(network), value)
+
+    def lookup(self, address: str):
+        """Return (prefix, value) of the longest prefix containing `address` or None."""
+        bits = int(ipaddress.IPv4Address(address))
+        node = self.root
+        match = node[2]
+        for i in range(32):
+            node = node[(bits >> (31 - i)) & 1]
+            if node is None:
+                break
+            if node[2] is not None:
+                match = node[2]
+        return match
+
+
+def build_fibs(routers_state: dict) -> dict:
+    """Build a PrefixTrie of the installed routes of every router.
+
+    Args:
+        routers_state: router -> normalized routing state as returned by /routing_state
+
+    Returns:
+        dict: router -> PrefixTrie with the list of next hops as values
+    """
+    fibs = {}
+    for router, state in routers_state.items():
+        trie = PrefixTrie()
+        for prefix, next_hops in state.get("routes", {}).items():
+            trie.insert(prefix, next_hops)
+        fibs[router] = trie
+    return fibs
+
+
+def build_address_owners(routers_state: dict) -> dict:
+    """Map every interface address of the routers to the router owning it."""
+    owners = {}
+    for router, state in routers_state.items():
+        for interface in state.get("interfaces", {}).values():
+            for address in interface["addresses"]:
+                owners[address.split("/")[0]] = router
+    return owners
+
+
+def resolve_paths(fibs: dict, owners: dict, src: str, dst_ip: str, max_hops: int = 64, max_paths: int = 16) -> list:
+    """Follow the FIBs hop by hop from `src` towards `dst_ip`.
+
+    Equal-cost next hops are all followed, so several paths can be returned.
+
+    Args:
+        fibs: router -> PrefixTrie as returned by build_fibs
+        owners: address -> router as returned by build_address_owners
+        src: Router to start from
+        dst_ip: Destination address
+        max_hops: Maximum path length before giving up
+        max_paths: Maximum number of (ECMP) paths to follow
+
+    Returns:
+        list: Paths as {"hops": [{"router", "interface", "via"}], "status"}, where status is one of
+        "delivered", "no_route", "loop", "left_lab" or "max_hops"
+    """
+    paths = []
+    # Stack of (current router, hops so far) to follow ECMP branches depth first
+    stack = [(src, [])]
+    while stack and len(paths) < max_paths:
+        router, hops = stack.pop()
+        if owners.get(dst_ip) == router:
+            paths.append({"hops": hops + [{"router": router, "interface": None, "via": None}], "status": "delivered"})
+            continue
+        if len(hops) >= max_hops:
+            paths.append({"hops": hops, "status": "max_hops"})
+            continue
+        fib = fibs.get(router)
+        match = fib.lookup(dst_ip) if fib is not None else None
+        if match is None:
+            paths.append({"hops": hops + [{"router": router, "interface": None, "via": None}], "status": "no_route"})
+            continue
+        # Push in reverse so that the first next hop is followed first
+        for next_hop in reversed(match[1]):
+            hop = {"router": router, "interface": next_hop["interface"], "via": next_hop["via"]}
+            if next_hop["via"] is None:
+                # Directly connected, either to the destination router or to a host/end of the lab
+                next_router = owners.get(dst_ip)
+                if next_router is None:
+                    paths.append({"hops": hops + [hop], "status": "delivered"})
+                    continue
+            else:
+                next_router = owners.get(next_hop["via"])
+                if next_router is None:
+                    paths.append({"hops": hops + [hop], "status": "left_lab"})
+                    continue
+            if any(previous["router"] == next_router for previous in hops) or next_router == router:
+                paths.append({"hops": hops + [hop, {"router": next_router, "interface": None, "via": None}], "status": "loop"})
+                continue
+            stack.append((next_router, hops + [hop]))
+    return paths
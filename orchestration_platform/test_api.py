@@ -3,10 +3,24 @@ import random
 import time
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Define the port
 port = 5432
 base_url = f"http://localhost:{port}"
+TIMEOUT = 120  # s, some endpoints (eg. snapshots, convergence measurements) take a while
+
+# Reuse kept-alive connections for all requests instead of opening one per request.
+# Failed connections are retried, GET requests additionally when docker is temporarily unavailable.
+session = requests.Session()
+session.mount(
+    "http://",
+    HTTPAdapter(
+        pool_maxsize=8,
+        max_retries=Retry(total=3, connect=3, backoff_factor=0.1, status_forcelist=[502, 503], allowed_methods=["GET"], raise_on_status=False),
+    ),
+)
 
 RED = "\033[1;31m"
 GREEN = "\033[1;32m"
@@ -16,18 +30,19 @@ RESET = "\033[0m"
 # Define a fixed width for the endpoint string to align the status code
 ENDPOINT_WIDTH = 40 # Adjust this value if longer endpoint names appear or if you want more padding
 
-def _print_formatted_response(method: str, endpoint: str, status_code: int, response_json: dict = None, is_error: bool = False):
+def _print_formatted_response(method: str, endpoint: str, status_code: int, response_json: dict = None, is_error: bool = False, latency: float = None):
     """
-    Helper function to print formatted responses with aligned status codes.
+    Helper function to print formatted responses with aligned status codes and the request latency.
     """
     prefix = f"{method} {endpoint}"
     # Pad the prefix to the desired width
     padded_prefix = f"{prefix:<{ENDPOINT_WIDTH}}"
+    latency_str = f", {latency * 1000:.1f} ms" if latency is not None else ""
 
     if is_error:
-        print(f"{RED}{padded_prefix} code: {status_code}, \n{json.dumps(response_json, indent=2)}{RESET}")
+        print(f"{RED}{padded_prefix} code: {status_code}{latency_str}, \n{json.dumps(response_json, indent=2)}{RESET}")
     else:
-        print(f"{GREEN}{padded_prefix} code: {status_code}{RESET}")
+        print(f"{GREEN}{padded_prefix} code: {status_code}{latency_str}{RESET}")
 
 
 # Function to send a POST request
@@ -35,11 +50,12 @@ def post_request(endpoint, data):
     url = f"{base_url}/{endpoint}"
     headers = {'Content-Type': 'application/json'}
     try:
-        response = requests.post(url, headers=headers, data=json.dumps(data))
+        response = session.post(url, headers=headers, data=json.dumps(data), timeout=TIMEOUT)
+        latency = response.elapsed.total_seconds()
         if response.status_code not in [200, 204]: # 204 No Content is also a success
-            _print_formatted_response("POST", endpoint, response.status_code, response.json(), is_error=True)
+            _print_formatted_response("POST", endpoint, response.status_code, response.json(), is_error=True, latency=latency)
         else:
-            _print_formatted_response("POST", endpoint, response.status_code, is_error=False)
+            _print_formatted_response("POST", endpoint, response.status_code, is_error=False, latency=latency)
         return response
     except requests.exceptions.ConnectionError as e:
         _print_formatted_response("POST", endpoint, 500, {'detail': f'Connection Error: {e}'}, is_error=True)
@@ -50,11 +66,12 @@ def post_request(endpoint, data):
 def get_request(endpoint):
     url = f"{base_url}/{endpoint}"
     try:
-        response = requests.get(url)
+        response = session.get(url, timeout=TIMEOUT)
+        latency = response.elapsed.total_seconds()
         if response.status_code != 200:
-            _print_formatted_response("GET", endpoint, response.status_code, response.json(), is_error=True)
+            _print_formatted_response("GET", endpoint, response.status_code, response.json(), is_error=True, latency=latency)
         else:
-            _print_formatted_response("GET", endpoint, response.status_code, is_error=False)
+            _print_formatted_response("GET", endpoint, response.status_code, is_error=False, latency=latency)
         return response
     except requests.exceptions.ConnectionError as e:
         _print_formatted_response("GET", endpoint, 500, {'detail': f'Connection Error: {e}'}, is_error=True)
@@ -214,12 +231,55 @@ post_request("reset_link", {"src": src_link_test, "dst": dst_link_test})
 print("Link state after full reset:")
 get_request(f"link_state?src={src_link_test}&dst={dst_link_test}")
 
+print(f"\n{BLUE}--- Testing /reset_links (Bulk Reset) ---{RESET}")
+post_request("add_loss", {"src": src_link_test, "dst": dst_link_test, "loss_rate": 2.0})
+post_request("reset_links", {"links": [{"src": src_link_test, "dst": dst_link_test}]})
+get_request(f"link_state?src={src_link_test}&dst={dst_link_test}")
+post_request("reset_links", {})
+
+
+print(f"\n{BLUE}--- Testing /link_down and /link_up (Convergence Timing) ---{RESET}")
+response = post_request("link_down", {"src": src_link_test, "dst": dst_link_test})
+if response.status_code == 200:
+    print(f"Converged after link down: {response.json().get('converged')}, time: {response.json().get('convergence_time')}")
+response = post_request("link_up", {"src": src_link_test, "dst": dst_link_test})
+if response.status_code == 200:
+    print(f"Converged after link up: {response.json().get('converged')}, time: {response.json().get('convergence_time')}")
+
+print(f"\n{BLUE}--- Testing /loss_burst and /delay_spike (Timed Impulses) ---{RESET}")
+response = post_request("loss_burst", {"src": src_link_test, "dst": dst_link_test, "duration": 50})
+if response.status_code == 200:
+    print(f"Loss burst requested: 50 ms, measured: {response.json().get('measured_duration')} ms")
+response = post_request("delay_spike", {"src": src_link_test, "dst": dst_link_test, "delay": 100, "duration": 100})
+if response.status_code == 200:
+    print(f"Delay spike requested: 100 ms, measured: {response.json().get('measured_duration')} ms")
+
 
 print(f"\n{BLUE}--- Testing /execute Endpoint ---{RESET}")
 # Test executing a command on a router
 post_request("execute", {"node": "bb2-1", "router": True, "cmd": "vtysh -c 'show ip route'", "detach": False})
+# Longer than the default deadline of EXEC_TIMEOUT
+post_request("execute", {"node": "bb2-1", "router": True, "cmd": "sleep 35", "detach": False, "timeout": 40})
 # Test executing a command on a host 
 post_request("execute", {"node": "bb1-1", "router": False, "cmd": "ping -c 3 8.8.8.8", "detach": True})
+# Test keeping the output of a detached command
+response = post_request("execute", {"node": "bb1-1", "router": False, "cmd": "ping -c 3 8.8.8.8", "detach": True, "log_output": True})
+if response.status_code == 200:
+    ping_id = response.json()["ID"]
+    time.sleep(3)
+    get_request(f"cmd_output?cmd_id={ping_id}")
+# Test executing commands on several containers at once, the unknown node only fails its own command
+post_request(
+    "execute_batch",
+    {
+        "commands": [
+            {"node": "bb1-1", "router": False, "cmd": "ping -q -c 1 -W 1 8.8.8.8"},
+            {"node": "bb2-1", "router": True, "cmd": "ip -brief addr"},
+            {"node": "does-not-exist", "router": False, "cmd": "true"},
+        ],
+        "timeout": 5,
+    },
+)
 
 
 print(f"\n{BLUE}--- Testing /change_lab Endpoint ---{RESET}")
@@ -232,7 +292,14 @@ get_request("available_routers")
 get_request("router_ips")
 get_request("host_ips")
 get_request("links")
+get_request("lab")
 get_request("events")
+get_request("metrics")
+get_request("routing_state")
+get_request("routing_state?max_age=0")
+get_request("path?src=bb2-1&dst=bb1-5")
+get_request("path?src=bb2-1&dst=bb1-5&dst_type=host")
+get_request("all_paths")
 
 
 print(f"\n{BLUE}--- Final Cleanup: Applying Initial Snapshot ---{RESET}")
@@ -50,7 +50,9 @@ config_defaults = {
     'AUTO_START_WORKERS': True,
     'MATRIX_UPDATE_FREQUENCY': 30,  # seconds
     'ANALYSIS_UPDATE_FREQUENCY': 300,  # seconds
-    'MATRIX_CACHE': '/tmp/cache/matrix.pickle',
+    # Checked AS paths kept by the matrix worker.
+    'MATRIX_PATH_CACHE_SIZE': 100000,
+    'MATRIX_CACHE': '/tmp/cache/matrix.bin',
     'ANALYSIS_CACHE': '/tmp/cache/analysis.db'
 }
 
@@ -1,14 +1,17 @@
+import gzip
+import hashlib
 import math
+from datetime import datetime, timezone
 from typing import Optional
-from flask import Blueprint, current_app, jsonify, request
-from flask import redirect, render_template, url_for
+from flask import Blueprint, Response, current_app, jsonify, request
+from flask import make_response, redirect, render_template, url_for
 from urllib.parse import urlparse
 
 from flask_login import login_required, login_user, current_user
 from .services.login import LoginForm, User, check_user_pwd, get_current_users_group
-from .services import parsers
+from .services import cache, parsers
 from .services.bgp_policy_analyzer import prepare_bgp_analysis
-from .services.matrix import prepare_matrix
+from .services.matrix import matrix_version, prepare_matrix
 from .services.vpn import find_all_ifs
 from .app import basic_auth
 
@@ -21,15 +24,30 @@ def index():
 
 @main_bp.route("/matrix")
 def connectivity_matrix():
-    """Create the connectivity matrix."""
+    """Create the connectivity matrix.
+
+    The page and the raw data only change with the matrix results, so they
+    are rendered once per version of the results and served with an ETag.
+    """
+    raw = 'raw' in request.args
+    page = cache.results.get(
+        ('matrix_page', raw), matrix_version(current_app.config),
+        lambda: prerender(render_matrix(raw)))
+    return serve_prerendered(page)
+
+
+def render_matrix(raw: bool):
+    """Render the matrix page or its raw json data as a response."""
     # Prepare matrix data (or load if using background workers).
     updated, frequency, connectivity, validity = prepare_matrix(current_app.config)
 
-    if 'raw' in request.args:
+    if raw:
         # Only send json data
+        # The results may be read-only views of the matrix cache.
         return jsonify(
             last_updated=updated, update_frequency=frequency,
-            connectivity=connectivity, validity=validity,
+            connectivity={src: dict(dsts) for src, dsts in connectivity.items()},
+            validity={src: dict(dsts) for src, dsts in validity.items()},
         )
 
     # Compute percentages as well.
@@ -51,13 +69,41 @@ def connectivity_matrix():
         failure = math.ceil(failure / total * 100)
         valid = 100 - invalid - failure
 
-    return render_template(
+    return make_response(render_template(
         'matrix.html',
         connectivity=connectivity, validity=validity,
         valid=valid, invalid=invalid, failure=failure,
         last_updated=updated, update_frequency=frequency,
-    )
-    
+    ))
+
+
+def prerender(response):
+    """Keep a rendered response with a gzip variant, ETag and modification time."""
+    body = response.get_data()
+    return {
+        'body': body,
+        'gzip': gzip.compress(body),
+        'mimetype': response.mimetype,
+        'etag': hashlib.sha1(body).hexdigest(),
+        'last_modified': datetime.now(timezone.utc),
+    }
+
+
+def serve_prerendered(page):
+    """Serve a pre-rendered page, answering conditional requests with 304."""
+    use_gzip = request.accept_encodings['gzip'] > 0
+    response = Response(
+        page['gzip'] if use_gzip else page['body'], mimetype=page['mimetype'])
+    if use_gzip:
+        response.content_encoding = 'gzip'
+    response.vary.add('Accept-Encoding')
+    # The variants have different content, so they need different ETags.
+    response.set_etag(page['etag'] + ('-gzip' if use_gzip else ''))
+    response.last_modified = page['last_modified']
+    # Browsers have to revalidate, the page changes with every update.
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 @main_bp.route("/looking-glass")
 @main_bp.route("/looking-glass/<int:group>")
 @main_bp.route("/looking-glass/<int:group>/<router>")
@@ -97,8 +143,11 @@ def looking_glass(
             url_for("main.looking_glass", group=group, router=router))
 
     # Now get data for group. First the actual looking glass.
-    with open(groupdata[router]) as file:
-        filecontent = file.read()
+    looking_glass_file = groupdata[router]
+    filecontent = cache.results.get(
+        ('looking_glass', looking_glass_file),
+        cache.file_signature(looking_glass_file),
+        looking_glass_file.read_text)
 
     # Next the analysis.
     updated, freq, messages = prepare_bgp_analysis(current_app.config, asn=group)
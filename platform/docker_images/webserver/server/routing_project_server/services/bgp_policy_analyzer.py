@@ -7,6 +7,7 @@ import tempfile
 from pathlib import Path
 from itertools import chain
 
+from . import cache
 from .parsers import parse_as_config, parse_as_connections, parse_looking_glass_json
 from .analyzer_helpers import load_config, load_looking_glass
 
@@ -18,7 +19,8 @@ class ASPathError(Exception):
 def prepare_bgp_analysis(config, asn=None, worker=False):
     """Prepare matrix.
 
-    Without background workers, create it from scratch now.
+    Without background workers, create it from scratch now, or reuse the
+    last results if none of the input files changed.
     With background workers, only read result if `worker=False`, and
     only create result if `worker=True`.
     """
@@ -27,35 +29,40 @@ def prepare_bgp_analysis(config, asn=None, worker=False):
     # Don't even load configs, just immediately return results.
     if config["BACKGROUND_WORKERS"] and not worker:
         freq = config['ANALYSIS_UPDATE_FREQUENCY']
-        if not db_file.is_file():
+        version = cache.file_signature(db_file)
+        if version is None:
             last = None
             msgs = None
         elif asn is not None:
-            last, msgs = load_analysis(db_file, asn)
+            last, msgs = cache.results.get(
+                ('analysis', asn), version,
+                lambda: load_analysis(db_file, asn))
         else:
-            last, msgs = load_report(db_file)
+            last, msgs = cache.results.get(
+                ('analysis', None), version, lambda: load_report(db_file))
         return last, freq, msgs
 
+    if not config["BACKGROUND_WORKERS"]:
+        locations = config['LOCATIONS']
+        version = (cache.config_signature(locations),
+                   cache.looking_glass_signature(locations['groups']))
+        return cache.results.get(
+            ('analysis', asn), version,
+            lambda: compute_bgp_analysis(config, asn=asn))
+
     # Now we need configs and compute.
-    as_data = parse_as_config(
-        config['LOCATIONS']['as_config'],
-        router_config_dir=config['LOCATIONS']['config_directory'],
-    )
-    connection_data = parse_as_connections(
-        config['LOCATIONS']['as_connections']
-    )
-    looking_glass_data = parse_looking_glass_json(
-        config['LOCATIONS']['groups']
-    )
+    as_data, connection_data, looking_glass_data = load_data(config)
+
+    # Update db, return nothing
+    os.makedirs(db_file.parent, exist_ok=True)
+    update_db(
+        db_file, as_data, connection_data, looking_glass_data)
+
 
-    if config["BACKGROUND_WORKERS"] and worker:
-        os.makedirs(db_file.parent, exist_ok=True)
-        # Update db, return nothing
-        update_db(
-            db_file, as_data, connection_data, looking_glass_data)
-        return
+def compute_bgp_analysis(config, asn=None):
+    """Compute the analysis on the fly."""
+    as_data, connection_data, looking_glass_data = load_data(config)
 
-    # Compute on the fly
     freq = None
     if asn is not None:
         last, msgs = analyze_bgp(
@@ -66,6 +73,21 @@ def prepare_bgp_analysis(config, asn=None, worker=False):
     return last, freq, msgs
 
 
+def load_data(config):
+    """Load all files required for the analysis."""
+    as_data = parse_as_config(
+        config['LOCATIONS']['as_config'],
+        router_config_dir=config['LOCATIONS']['config_directory'],
+    )
+    connection_data = parse_as_connections(
+        config['LOCATIONS']['as_connections']
+    )
+    looking_glass_data = parse_looking_glass_json(
+        config['LOCATIONS']['groups']
+    )
+    return as_data, connection_data, looking_glass_data
+
+
 # Helpers to get results.
 # =======================
 
@@ -113,8 +135,14 @@ def update_db(db_file, as_data, connection_data, looking_glass_data):
             load_config(connection, as_data, connection_data)
             load_looking_glass(connection, looking_glass_data)
             compute_results(connection)
-            # Copy results to the actual database.
-            shutil.copy(db_tmp.name, db_file)
+            # Copy results next to the actual database and replace it
+            # atomically, readers compare its signature to reuse results.
+            db_file = Path(db_file)
+            with tempfile.NamedTemporaryFile(
+                    dir=db_file.parent, prefix=db_file.name,
+                    delete=False) as db_new:
+                shutil.copyfile(db_tmp.name, db_new.name)
+            os.replace(db_new.name, db_file)
     finally:
         connection.close()
 
@@ -0,0 +1,90 @@
+"""In-process cache of results, invalidated by cheap version tokens.
+
+Every web process (and every worker) keeps the latest result of each
+computation together with a version token, e.g. the signature of the files
+the result was computed from. As long as the token is unchanged, the result
+is reused instead of reading or computing it again.
+"""
+
+import os
+from pathlib import Path
+from typing import Any, Callable, Hashable
+
+
+class VersionedCache:
+    """Keep the latest value per key and the version it was computed for."""
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, key: Hashable, version: Hashable,
+            compute: Callable[[], Any]) -> Any:
+        """Return the value for key, calling `compute` if version changed."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        value = compute()
+        self._entries[key] = (version, value)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+
+def file_signature(filename: os.PathLike):
+    """Return a cheap signature that changes if the file is modified.
+
+    Files are compared by inode as well, so files replaced by a rename are
+    detected even if mtime and size are equal. Missing files are `None`.
+    """
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def files_signature(*filenames: os.PathLike):
+    """Return the signature of multiple files."""
+    return tuple((str(filename), file_signature(filename))
+                 for filename in filenames)
+
+
+def directory_signature(directory: os.PathLike):
+    """Return the signature of all files directly in a directory."""
+    try:
+        with os.scandir(directory) as entries:
+            filenames = sorted(entry.path for entry in entries
+                               if entry.is_file())
+    except OSError:
+        filenames = []
+    return files_signature(*filenames)
+
+
+def config_signature(locations):
+    """Return the signature of the AS config files in `LOCATIONS`.
+
+    The router config files are found in the config directory, so all files
+    in this directory are included.
+    """
+    return (files_signature(locations['as_config'],
+                            locations['as_connections']),
+            directory_signature(locations['config_directory']))
+
+
+def looking_glass_signature(directory: os.PathLike):
+    """Return the signature of all looking glass json files of all groups."""
+    filenames = []
+    try:
+        for groupdir in sorted(Path(directory).iterdir()):
+            if not groupdir.is_dir() or not groupdir.name.startswith('g'):
+                continue
+            for routerdir in sorted(groupdir.iterdir()):
+                filenames.append(routerdir / "looking_glass_json.txt")
+    except OSError:
+        pass
+    return files_signature(*filenames)
+
+
+# Results of the current process.
+results = VersionedCache()
@@ -1,40 +1,66 @@
 """Check whether the path between ASes is correct."""
 
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
+from collections.abc import Mapping
+from datetime import datetime as dt
+import json
+import mmap
 import os
 from pathlib import Path
-import pickle
+import struct
+import tempfile
 from typing import Dict
-from . import parsers
+from . import cache, parsers
 
+# Default number of checked paths cached by `PathChecker`.
+PATH_CACHE_SIZE = 100000  # about 30 MB
 
 
 def prepare_matrix(config, worker=False):
     """Prepare matrix.
 
-    Without background workers, create it from scratch now.
+    Without background workers, create it now, or reuse the last results
+    if none of the input files changed.
     With background workers, only read result if `worker=False`, and
     only create result if `worker=True`.
     """
     cache_file = Path(config["MATRIX_CACHE"])
     if config["BACKGROUND_WORKERS"] and not worker:
-        try:
-            with open(cache_file, 'rb') as file:
-                return pickle.load(file)
-        except FileNotFoundError:
-            return (None, None, {}, {})
-
-    # Load all required files.
-    as_data = parsers.parse_as_config(
-        config['LOCATIONS']['as_config'],
-        router_config_dir=config['LOCATIONS']['config_directory'],
-    )
-    connection_data = parsers.parse_as_connections(
-        config['LOCATIONS']['as_connections']
-    )
-    looking_glass_data = parsers.parse_looking_glass_json(
-        config['LOCATIONS']['groups']
+        return cache.results.get(
+            'matrix', matrix_version(config),
+            lambda: load_matrix_cache(cache_file))
+
+    if config["BACKGROUND_WORKERS"] and worker:
+        results = compute_matrix(config)
+        write_matrix_cache(cache_file, results)
+        return results
+
+    return cache.results.get(
+        'matrix', matrix_version(config), lambda: compute_matrix(config))
+
+
+def matrix_version(config):
+    """Return a token that changes whenever the matrix results change.
+
+    With background workers, this is the signature of the cache file,
+    otherwise the signature of all input files.
+    """
+    if config["BACKGROUND_WORKERS"]:
+        return cache.file_signature(config["MATRIX_CACHE"])
+    locations = config['LOCATIONS']
+    return (
+        cache.config_signature(locations),
+        cache.looking_glass_signature(locations['groups']),
+        cache.files_signature(locations['matrix'], locations['matrix_stats']),
     )
+
+
+def compute_matrix(config):
+    """Compute connectivity and validity."""
+    # Load all required files. The validity is updated incrementally,
+    # only re-parsing looking glass files that changed since the last update.
+    as_data, validity = _validity.update(
+        config['LOCATIONS'], config['MATRIX_PATH_CACHE_SIZE'])
     connectivity_data = parsers.parse_matrix_connectivity(
         config['LOCATIONS']['matrix']
     )
@@ -45,17 +71,9 @@ def prepare_matrix(config, worker=False):
     # Compute results
     connectivity = check_connectivity(
         as_data, connectivity_data)
-    validity = check_validity(
-        as_data, connection_data, looking_glass_data)
-
-    results = (last_updated, update_frequency, connectivity, validity)
 
-    if config["BACKGROUND_WORKERS"] and worker:
-        os.makedirs(cache_file.parent, exist_ok=True)
-        with open(cache_file, "wb") as file:
-            pickle.dump(results, file)
+    return (last_updated, update_frequency, connectivity, validity)
 
-    return results
 
 def check_connectivity(as_data, connectivity_data):
     """Check whether two ASes are reachable with ping."""
@@ -79,6 +97,23 @@ def check_connectivity(as_data, connectivity_data):
 
 def check_validity(as_data, connection_data, looking_glass_data):
     """Check if the paths between ASes are valid."""
+    dic_as = build_as_graph(as_data, connection_data)
+    checker = PathChecker(dic_as)
+
+    # check if another ooutput format is better!
+    results = defaultdict(dict)
+    for asn in dic_as:
+        if dic_as[asn].type == 'AS':
+            as_results = check_as_validity(
+                checker, asn, as_data, looking_glass_data)
+            if as_results:
+                results[asn] = as_results
+
+    return(results)
+
+
+def build_as_graph(as_data, connection_data):
+    """Create the AS objects with their (recursive) relationships."""
     # Prepare AS objects.
     dic_as = {asn: AS(asn, data['type']) for asn, data in as_data.items()}
 
@@ -110,30 +145,117 @@ def check_validity(as_data, connection_data, looking_glass_data):
         _as.compute_customers_rec()
         _as.compute_providers_rec()
         _as.compute_peers_rec()
+        _as.compute_relations()
+
+    return dic_as
 
-    # check if another ooutput format is better!
-    results = defaultdict(dict)
-    for asn in dic_as:
-        if dic_as[asn].type == 'AS':
-            path_to_as = get_path_to_as(asn, as_data, looking_glass_data)
 
-            for asdest in path_to_as:
-                paths_str = ''
-                valid = True
-                for path in path_to_as[asdest]:
-                    if path == '':
-                        path = []
-                    else:
-                        path = list(map(int, path.split(' ')))
-                    if path_checker(dic_as, path):
-                        valid = False
+def check_as_validity(checker, asn, as_data, looking_glass_data):
+    """Check if the paths from one AS to all destinations are valid.
 
-                    paths_str += '-'.join(map(lambda x: str(x), path))+','
+    `checker` is the `PathChecker` of the AS relationship graph.
+    """
+    results = {}
+    path_to_as = get_path_to_as(asn, as_data, looking_glass_data)
+
+    for asdest in path_to_as:
+        valid = True
+        for path in path_to_as[asdest]:
+            if path == '':
+                path = []
+            else:
+                path = list(map(int, path.split(' ')))
+            if checker(path):
+                valid = False
 
-                results[asn][asdest] = valid
-                #results.append((asn, asdest, status, paths_str[:-1]))
+        results[asdest] = valid
 
-    return(results)
+    return results
+
+
+class IncrementalValidity:
+    """Validity results kept between matrix updates.
+
+    The AS relationship graph is only rebuilt if the config files change.
+    Looking glass files are only parsed again if they changed (mtime, size or
+    inode), and the validity is only recomputed for the ASes whose looking
+    glass changed. The state is per process, i.e. kept by the background
+    worker or by every web process without workers.
+    """
+
+    def __init__(self):
+        self.config_signature = None
+        self.as_data = {}
+        self.dic_as = {}
+        self.checker = None
+        # (asn, router) -> (file signature, looking glass data)
+        self.looking_glass = {}
+        # asn -> {destination asn -> valid}
+        self.validity = {}
+
+    def update(self, locations, path_cache_size=PATH_CACHE_SIZE):
+        """Update the validity and return `(as_data, validity)`."""
+        config_signature = cache.config_signature(locations)
+        rebuild = config_signature != self.config_signature
+        if rebuild:
+            as_data = parsers.parse_as_config(
+                locations['as_config'],
+                router_config_dir=locations['config_directory'],
+            )
+            connection_data = parsers.parse_as_connections(
+                locations['as_connections']
+            )
+            dic_as = build_as_graph(as_data, connection_data)
+            # Checked paths are only valid for the same graph.
+            checker = PathChecker(dic_as, path_cache_size)
+        else:
+            as_data, dic_as = self.as_data, self.dic_as
+            checker = self.checker
+
+        # Only parse new or modified looking glass files.
+        # The signature is taken before reading, so a file changed during
+        # reading is read again in the next update.
+        changed = set()
+        looking_glass = {}
+        files = parsers.find_looking_glass_jsonfiles(locations['groups'])
+        for asn, routers in files.items():
+            for router, filename in routers.items():
+                signature = cache.file_signature(filename)
+                cached = self.looking_glass.get((asn, router))
+                if cached is None or cached[0] != signature:
+                    cached = (signature,
+                              parsers.read_looking_glass_json(filename))
+                    changed.add(asn)
+                looking_glass[(asn, router)] = cached
+        # Removed looking glass files change the validity as well.
+        changed.update(asn for asn, _ in
+                       self.looking_glass.keys() - looking_glass.keys())
+
+        looking_glass_data = defaultdict(dict)
+        for (asn, router), (_, data) in looking_glass.items():
+            looking_glass_data[asn][router] = data
+
+        validity = {} if rebuild else dict(self.validity)
+        for asn, _as in dic_as.items():
+            if _as.type != 'AS':
+                continue
+            if rebuild or asn in changed or asn not in validity:
+                validity[asn] = check_as_validity(
+                    checker, asn, as_data, looking_glass_data)
+
+        # Only keep the new state once everything is computed.
+        self.config_signature = config_signature
+        self.as_data, self.dic_as = as_data, dic_as
+        self.checker = checker
+        self.looking_glass = looking_glass
+        self.validity = validity
+
+        return as_data, {asn: results for asn, results in validity.items()
+                         if results}
+
+
+# Kept between updates, see `IncrementalValidity`.
+_validity = IncrementalValidity()
 
 
 class AS:
@@ -147,20 +269,14 @@ class AS:
         self.customers = set()
         self.peers = set()
         self.providers = set()
+        # asn -> 'UP', 'DOWN' or 'FLAT'
+        self.relations = {}
 
     def compute_customers_rec(self):
-        cur_customers = list(self.customers_direct)
-        while len(cur_customers) > 0:
-            c = cur_customers.pop(0)
-            cur_customers.extend(list(c.customers_direct))
-            self.customers.add(c.asn)
+        self.customers = _reachable(self, 'customers_direct')
 
     def compute_providers_rec(self):
-        cur_providers = list(self.providers_direct)
-        while len(cur_providers) > 0:
-            c = cur_providers.pop(0)
-            cur_providers.extend(list(c.providers_direct))
-            self.providers.add(c.asn)
+        self.providers = _reachable(self, 'providers_direct')
 
     # WARNING: must be executed the last, to take peers from IXP into account
     def compute_peers_rec(self):
@@ -172,6 +288,15 @@ class AS:
             elif peer.type == 'AS':
                 self.peers.add(peer.asn)
 
+    def compute_relations(self):
+        """Map every related AS to the direction of a path towards it.
+
+        Providers take precedence over customers, and customers over peers.
+        """
+        self.relations = dict.fromkeys(self.peers, 'FLAT')
+        self.relations.update(dict.fromkeys(self.customers, 'DOWN'))
+        self.relations.update(dict.fromkeys(self.providers, 'UP'))
+
     def __str__(self):
         print('AS {}'.format(self.asn))
         cs = 'Customers: '
@@ -192,6 +317,49 @@ class AS:
         return cs+'\n'+ps+'\n'+pe
 
 
+def _reachable(start, attribute):
+    """Return the ASNs reachable from `start` over one or more direct
+    relationships in `attribute`, e.g. all recursive customers."""
+    reached = set()
+    queue = deque(getattr(start, attribute))
+    while queue:
+        current = queue.popleft()
+        if current.asn in reached:
+            continue
+        reached.add(current.asn)
+        queue.extend(_as for _as in getattr(current, attribute)
+                     if _as.asn not in reached)
+    return reached
+
+
+class PathChecker:
+    """Memoized `path_checker` for one AS relationship graph.
+
+    The same paths are checked for many source ASes and in every update,
+    so results are cached by the normalized path (without repeated ASes).
+    The cache is an LRU cache of at most `maxsize` paths.
+    """
+
+    def __init__(self, dic_as, maxsize=PATH_CACHE_SIZE):
+        self.dic_as = dic_as
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+
+    def __call__(self, aspath):
+        """Return True if the path is wrong, see `path_checker`."""
+        aspath = tuple(dict.fromkeys(aspath))
+        try:
+            wrong = self.cache[aspath]
+        except KeyError:
+            wrong = path_checker(self.dic_as, aspath)
+            self.cache[aspath] = wrong
+            if len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(aspath)
+        return wrong
+
+
 def path_checker(dic_as, aspath):
     """Check if the path is valid."""
     # Ignore repeated ASes, e.g. path prepending.
@@ -201,34 +369,21 @@ def path_checker(dic_as, aspath):
     if len(aspath) <= 1:
         return False
 
-    # Status can be: None (at first), Up, Flat, Down
-    if aspath[1] in dic_as[aspath[0]].providers:
-        status = 'UP'
-    elif aspath[1] in dic_as[aspath[0]].customers:
-        status = 'DOWN'
-    elif aspath[1] in dic_as[aspath[0]].peers:
-        status = 'FLAT'
+    # Status can be: None (at first), UP, FLAT, DOWN
+    status = None
 
     wrong = False
-    for i in range(1, len(aspath)-1):
-        if aspath[i+1] in dic_as[aspath[i]].providers:
-            if status == 'DOWN' or status == 'FLAT':
-                wrong = True
-                break
-            else:
-                status = 'UP'
-        elif aspath[i+1] in dic_as[aspath[i]].customers:
-            status = 'DOWN'
-        elif aspath[i+1] in dic_as[aspath[i]].peers:
-            if status == 'DOWN' or status == 'FLAT':
-                wrong = True
-                break
-            else:
-                status = 'FLAT'
-        else:
+    for i in range(len(aspath)-1):
+        relation = dic_as[aspath[i]].relations.get(aspath[i+1])
+        if relation is None:
             print('Path does not physically exist')
             wrong = True
             break
+        # Going up or across is only allowed before going down or across.
+        if relation != 'DOWN' and status in ('DOWN', 'FLAT'):
+            wrong = True
+            break
+        status = relation
 
     return wrong
 
@@ -269,3 +424,137 @@ def get_path_from_router(router_bgp_data):
             path_to_as[asdest].append(aspath)
 
     return path_to_as
+
+
+# Binary matrix cache.
+# ====================
+#
+# The worker writes the results as one file, which web processes map into
+# memory instead of deserializing it for every request:
+#
+#   header          magic, version, number of ASes, metadata length
+#   metadata        JSON with last update and update frequency
+#   asns            sorted ASNs of all rows and columns (uint32)
+#   connectivity    row flags (uint8, 1 if the AS has a row),
+#                   matrix of uint8 (0 not connected, 1 connected, 2 unknown)
+#   validity        same layout (0 invalid, 1 valid, 2 unknown)
+
+_HEADER = struct.Struct("<4sHII")
+_MAGIC = b"MTRX"
+_VERSION = 1
+_UNKNOWN = 2
+
+def write_matrix_cache(cache_file, results):
+    """Write the matrix results to the binary cache file.
+
+    The file is replaced atomically, so readers never see a partial file.
+    """
+    last_updated, update_frequency, connectivity, validity = results
+    asns = sorted(set(connectivity).union(
+        validity, *connectivity.values(), *validity.values()))
+    index = {asn: i for i, asn in enumerate(asns)}
+    metadata = json.dumps({
+        'last_updated': last_updated.isoformat() if last_updated else None,
+        'update_frequency': update_frequency,
+    }).encode()
+
+    data = bytearray(_HEADER.pack(_MAGIC, _VERSION, len(asns), len(metadata)))
+    data += metadata
+    data += struct.pack(f"<{len(asns)}I", *asns)
+    for matrix in (connectivity, validity):
+        data += bytes(asn in matrix for asn in asns)
+        cells = bytearray([_UNKNOWN]) * (len(asns) * len(asns))
+        for src, dsts in matrix.items():
+            row = index[src] * len(asns)
+            for dst, value in dsts.items():
+                cells[row + index[dst]] = bool(value)
+        data += cells
+
+    cache_file = Path(cache_file)
+    os.makedirs(cache_file.parent, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+            dir=cache_file.parent, prefix=cache_file.name, delete=False) as file:
+        file.write(data)
+    os.replace(file.name, cache_file)
+
+
+def load_matrix_cache(cache_file):
+    """Return the matrix results from the binary cache file.
+
+    Connectivity and validity are read-only views of the mapped file with
+    the interface of the nested dicts computed by `compute_matrix`.
+    """
+    try:
+        with open(cache_file, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return (None, None, {}, {})
+    return _read_matrix_cache(buffer)
+
+
+def _read_matrix_cache(buffer):
+    magic, version, size, metadata_length = _HEADER.unpack_from(buffer)
+    if magic != _MAGIC or version != _VERSION:
+        raise RuntimeError("Unsupported matrix cache format.")
+    offset = _HEADER.size
+    metadata = json.loads(buffer[offset:offset + metadata_length])
+    offset += metadata_length
+    asns = struct.unpack_from(f"<{size}I", buffer, offset)
+    offset += 4 * size
+
+    matrices = []
+    for _ in range(2):
+        matrices.append(_MatrixView(buffer, asns, offset))
+        offset += size + size * size
+
+    last_updated = metadata['last_updated']
+    if last_updated is not None:
+        last_updated = dt.fromisoformat(last_updated)
+    return (last_updated, metadata['update_frequency'], *matrices)
+
+
+class _MatrixView(Mapping):
+    """Read-only view of a matrix in the cache: src asn -> dst asn -> bool."""
+
+    def __init__(self, buffer, asns, offset):
+        self.buffer = buffer
+        self.asns = asns
+        self.index = {asn: i for i, asn in enumerate(asns)}
+        self.rows = buffer[offset:offset + len(asns)]
+        self.offset = offset + len(asns)
+
+    def __getitem__(self, asn):
+        i = self.index[asn]
+        if not self.rows[i]:
+            raise KeyError(asn)
+        start = self.offset + i * len(self.asns)
+        return _RowView(
+            self.buffer[start:start + len(self.asns)], self.asns, self.index)
+
+    def __iter__(self):
+        return (asn for asn, row in zip(self.asns, self.rows) if row)
+
+    def __len__(self):
+        return sum(self.rows)
+
+
+class _RowView(Mapping):
+    """Read-only view of a matrix row: dst asn -> bool."""
+
+    def __init__(self, cells, asns, index):
+        self.cells = cells
+        self.asns = asns
+        self.index = index
+
+    def __getitem__(self, asn):
+        value = self.cells[self.index[asn]]
+        if value == _UNKNOWN:
+            raise KeyError(asn)
+        return bool(value)
+
+    def __iter__(self):
+        return (asn for asn, value in zip(self.asns, self.cells)
+                if value != _UNKNOWN)
+
+    def __len__(self):
+        return len(self.cells) - self.cells.count(_UNKNOWN)
@@ -40,13 +40,9 @@ def find_looking_glass_textfiles(directory: os.PathLike) \
     return results
 
 
-def parse_looking_glass_json(directory: os.PathLike) -> \
-        Dict[int, Dict[str, Dict]]:
-    """Load looking glass json data.
-
-    Dict structure: AS -> Router -> looking-glass data.
-    """
-    # Note: group 1 = AS 1; group/as is used interchangeable.
+def find_looking_glass_jsonfiles(directory: os.PathLike) \
+        -> Dict[int, Dict[str, Path]]:
+    """Find all available looking glass json files."""
     results = {}
     try:
         for groupdir in Path(directory).iterdir():
@@ -62,15 +58,35 @@ def parse_looking_glass_json(directory: os.PathLike) -> \
                 # Check if there is a looking_glass file.
                 looking_glass_file = routerdir / "looking_glass_json.txt"
                 if looking_glass_file.is_file():
-                    groupresults[routerdir.name] = _read_json_safe(
-                        looking_glass_file)
+                    groupresults[routerdir.name] = looking_glass_file
             if groupresults:
                 results[group] = groupresults
     except:
         print("Error when accessing " + directory)
+
     return results
 
 
+def parse_looking_glass_json(directory: os.PathLike) -> \
+        Dict[int, Dict[str, Dict]]:
+    """Load looking glass json data.
+
+    Dict structure: AS -> Router -> looking-glass data.
+    """
+    # Note: group 1 = AS 1; group/as is used interchangeable.
+    return {
+        group: {router: read_looking_glass_json(looking_glass_file)
+                for router, looking_glass_file in groupfiles.items()}
+        for group, groupfiles in
+        find_looking_glass_jsonfiles(directory).items()
+    }
+
+
+def read_looking_glass_json(filename: os.PathLike) -> Dict:
+    """Load the looking glass json data of a single router."""
+    return _read_json_safe(filename)
+
+
 def parse_as_config(filename: os.PathLike,
                     router_config_dir: Optional[os.PathLike] = None) \
         -> Dict[int, Dict]:
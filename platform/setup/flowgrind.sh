@@ -8,6 +8,9 @@ set -o nounset
 
 DIRECTORY="$1"
 DOCKERHUB_USER="${2:-thomahol}"
+# number of flowgrindd daemons per host, listening on consecutive ports from 8000
+# (the chaos monkey needs a free port on the server and all clients of a traffic session, see its --ports option)
+FLOWGRIND_DAEMONS="${FLOWGRIND_DAEMONS:-6}"
 source "${DIRECTORY}"/config/subnet_config.sh
 source "${DIRECTORY}"/setup/_parallel_helper.sh
 
@@ -31,7 +34,7 @@ for ((k=0;k<group_numbers;k++)); do
         property1="${router_i[1]}"
 
         # start flowgrindd
-        for port in {8000..8005}; do
+        for ((port=8000; port<8000+FLOWGRIND_DAEMONS; port++)); do
             docker exec "${group_number}"_"${rname}"host flowgrindd -p "$port"
         done
 